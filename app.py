@@ -1,12 +1,21 @@
-import os, re, io, json, zipfile, shutil, base64, datetime, unicodedata, string
-from dataclasses import dataclass
+import os, re, io, json, multiprocessing, tarfile, posixpath, itertools, shutil, datetime, atexit, random, unicodedata, string, hashlib, threading, tempfile, sqlite3, time, uuid, collections, struct, zlib, bisect, logging
+from urllib.parse import quote
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
 from typing import List, Dict, Any, Optional
-from flask import Flask, request, jsonify, send_from_directory, send_file, abort
+import click
+from flask import Flask, Blueprint, Response, request, jsonify, send_from_directory, send_file, abort, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 from PIL import Image
-from google import genai
-from google.genai import types
+import httpx  # google.genai(수백 ms)는 첫 편집 때 불러온다 — get_model_client
+from upload_worker import encode_original
+try:
+    import fcntl  # 프로세스 간 파일 잠금 (Windows에는 없음)
+except ImportError:
+    fcntl = None
 
 load_dotenv()
 
@@ -15,13 +24,177 @@ DATA_DIR = os.getenv("DATA_DIR", "./data")
 PROJECTS_DIR = os.path.join(DATA_DIR, "projects")
 os.makedirs(PROJECTS_DIR, exist_ok=True)
 
-# Gemini (nano-banana)
-gemini_client = genai.Client()  # GEMINI_API_KEY 자동 인식
+# 파생물(썸네일 등) 캐시 — projects/ 바깥이라 목록에는 잡히지 않음
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+THUMB_CACHE_MAX_BYTES = int(os.getenv("THUMB_CACHE_MAX_MB", "512")) * 1024 * 1024
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+# 이미지 저장/디코드 제한
+PNG_COMPRESS_LEVEL = int(os.getenv("PNG_COMPRESS_LEVEL", "6"))  # 0(빠름/큼) ~ 9(느림/작음)
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(8000 * 8000)))
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS  # 이 두 배를 넘으면 PIL이 DecompressionBombError
+
+# Gemini (nano-banana) — 클라이언트는 첫 편집 때 만든다 (get_model_client)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None  # 로컬 가짜 서버 등으로 바꿀 때 (bench/fake_gemini.py)
+MODEL_HTTP_POOL = int(os.getenv("MODEL_HTTP_POOL", "16"))  # 모델 호출 동시 연결 수 (헤징 포함)
 GEMINI_IMAGE_MODEL = "gemini-2.5-flash-image"  # nano-banana (이미지)
 
-# Flask
-app = Flask(__name__, static_folder="static", static_url_path="/static")
-CORS(app)
+# Flask — 라우트는 블루프린트에 모으고 앱은 create_app()에서 만든다 (파일 맨 아래, import 때는 만들지 않음)
+bp = Blueprint("main", __name__, cli_group=None)
+log = logging.getLogger(__name__)  # = app.logger (Flask 앱 이름이 모듈 이름)
+
+# ---------- 계측 (메트릭/프로파일) ----------
+# 라우트 지연, 처리 중 요청 수, 모델 호출, 이미지 디코드/인코드 등 구간 시간을 메모리에 모아
+# /metrics 에 Prometheus 텍스트 형식으로 내보낸다. (프로세스별, 재시작하면 0부터)
+# 요청에 X-Profile: 1 헤더나 ?_profile=1 을 붙이면 그 요청의 구간별 시간을
+# Server-Timing 헤더로 (JSON 응답이면 "_profile" 필드로도) 돌려준다.
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "1") != "0"  # 0이면 프로파일 요청을 무시
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Metrics:
+    """카운터/게이지/히스토그램 레지스트리. 레이블은 키워드 인자로 준다."""
+
+    def __init__(self):
+        self._meta: Dict[str, tuple] = {}    # 이름 → (종류, 설명, 버킷)
+        self._values: Dict[tuple, float] = {}  # (이름, 레이블) → 값 (counter/gauge)
+        self._hists: Dict[tuple, list] = {}    # (이름, 레이블) → [버킷별 개수..., +Inf 개수, 합]
+        self._lock = threading.Lock()
+
+    def define(self, kind: str, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self._meta[name] = (kind, help_text, buckets)
+
+    def inc(self, name: str, n: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self._meta[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._hists.get(key)
+            if h is None:
+                h = self._hists[key] = [0] * (len(buckets) + 1) + [0.0]
+            h[bisect.bisect_left(buckets, value)] += 1
+            h[-1] += value
+
+    @staticmethod
+    def _num(v) -> str:
+        return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+    @staticmethod
+    def _labels(pairs) -> str:
+        if not pairs:
+            return ""
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> str:
+        with self._lock:
+            values = sorted(self._values.items())
+            hists = sorted((k, list(h)) for k, h in self._hists.items())
+        by_name = collections.defaultdict(list)
+        for (name, labels), v in values:
+            by_name[name].append((labels, v))
+        for (name, labels), h in hists:
+            by_name[name].append((labels, h))
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text, buckets = self._meta.get(name, ("untyped", "", ()))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, v in by_name[name]:
+                if kind != "histogram":
+                    lines.append(f"{name}{self._labels(labels)} {self._num(v)}")
+                    continue
+                cum = 0
+                for le, n in zip([f"{b:g}" for b in buckets] + ["+Inf"], v[:-1]):
+                    cum += n
+                    lines.append(f"{name}_bucket{self._labels(labels + (('le', le),))} {cum}")
+                lines.append(f"{name}_sum{self._labels(labels)} {v[-1]:.6f}")
+                lines.append(f"{name}_count{self._labels(labels)} {cum}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+metrics.define("histogram", "http_request_duration_seconds", "요청 처리 시간 (응답 헤더까지)")
+metrics.define("counter", "http_requests_total", "요청 수")
+metrics.define("gauge", "http_requests_in_flight", "처리 중인 요청 수")
+metrics.define("counter", "http_response_bytes_total", "응답 본문 바이트 (Content-Length 기준)")
+metrics.define("histogram", "app_op_seconds", "구간별 시간 (이미지 디코드/인코드, 인덱스, 파일 스캔 등)")
+metrics.define("histogram", "model_request_seconds", "모델 요청 시간 (재시도/헤징 포함)")
+metrics.define("histogram", "model_attempt_seconds", "모델 호출 한 번의 시간")
+metrics.define("counter", "model_requests_total", "모델 요청 결과별 수")
+metrics.define("counter", "model_input_bytes_total", "모델에 보낸 이미지 바이트")
+metrics.define("histogram", "edit_job_seconds", "편집 작업 실행 시간")
+metrics.define("histogram", "edit_job_wait_seconds", "편집 작업 대기 시간")
+metrics.define("histogram", "upload_encode_seconds", "업로드 원본 처리 시간 (제출~완료)")
+
+_prof = threading.local()  # 프로파일 중인 요청의 span 목록 (요청 스레드 기준)
+
+@contextmanager
+def timed(op: str):
+    """구간 시간 → app_op_seconds{op} + (프로파일 중이면) 현재 요청의 span. 데코레이터로도 쓴다."""
+    spans = getattr(_prof, "spans", None)
+    if spans is not None:
+        depth = _prof.depth
+        _prof.depth += 1
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        metrics.observe("app_op_seconds", dt, op=op)
+        if spans is not None:
+            _prof.depth -= 1
+            spans.append({"op": op, "start_ms": round((t0 - _prof.t0) * 1000, 2),
+                          "ms": round(dt * 1000, 2), "depth": depth})
+
+def profile_requested() -> bool:
+    flag = request.headers.get("X-Profile") or request.args.get("_profile") or ""
+    return PROFILE_REQUESTS and flag.strip().lower() in ("1", "true", "yes", "on")
+
+@bp.before_app_request
+def _metrics_begin():
+    g.t0 = time.perf_counter()
+    metrics.inc("http_requests_in_flight")
+    if profile_requested():
+        _prof.spans, _prof.depth, _prof.t0 = [], 0, g.t0
+    else:
+        _prof.spans = None
+
+@bp.after_app_request
+def _metrics_end(resp):
+    t0 = g.get("t0")
+    if t0 is None:
+        return resp
+    dt = time.perf_counter() - t0
+    route = request.url_rule.rule if request.url_rule else "(unmatched)"
+    metrics.observe("http_request_duration_seconds", dt, method=request.method, route=route)
+    metrics.inc("http_requests_total", method=request.method, route=route, status=resp.status_code)
+    if resp.content_length:
+        metrics.inc("http_response_bytes_total", resp.content_length, route=route)
+    spans = getattr(_prof, "spans", None)
+    if spans is not None:
+        _prof.spans = None
+        spans.sort(key=lambda sp: sp["start_ms"])
+        resp.headers["Server-Timing"] = ", ".join(
+            [f"total;dur={dt * 1000:.1f}"] + [f"{sp['op']};dur={sp['ms']:.1f}" for sp in spans])
+        if resp.mimetype == "application/json" and not resp.direct_passthrough and not resp.is_streamed:
+            body = resp.get_json(silent=True)
+            if isinstance(body, dict):
+                body["_profile"] = {"route": route, "total_ms": round(dt * 1000, 2), "spans": spans}
+                resp.set_data(json.dumps(body, ensure_ascii=False))
+    return resp
+
+@bp.teardown_app_request
+def _metrics_teardown(exc):
+    if g.pop("t0", None) is not None:
+        metrics.inc("http_requests_in_flight", -1)
+    _prof.spans = None
 
 # ---------- 유틸 ----------
 SAFE_CHARS = "-_.() %s%s" % (string.ascii_letters, string.digits)
@@ -40,6 +213,19 @@ def slugify(val: str) -> str:
 def now_iso():
     return datetime.datetime.now().isoformat(timespec="seconds")
 
+def iso_ts(s: str) -> float:
+    """now_iso() 문자열 → 유닉스 시각 (읽을 수 없으면 0)"""
+    try:
+        return datetime.datetime.fromisoformat(s).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+def file_mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
 def ensure_dir(p):
     os.makedirs(p, exist_ok=True)
 
@@ -49,10 +235,22 @@ def read_json(p, default=None):
     with open(p, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def atomic_write(p, data: bytes):
+    """임시 파일에 쓰고 rename — 읽는 쪽은 이전 내용 아니면 새 내용만 본다."""
+    d = os.path.dirname(p)
+    ensure_dir(d)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, p)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
 def write_json(p, obj):
-    ensure_dir(os.path.dirname(p))
-    with open(p, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    atomic_write(p, json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"))
 
 def read_text(p):
     if not os.path.exists(p): return ""
@@ -60,50 +258,13 @@ def read_text(p):
         return f.read()
 
 def write_text(p, text):
-    ensure_dir(os.path.dirname(p))
-    with open(p, "w", encoding="utf-8") as f:
-        f.write(text)
+    atomic_write(p, text.encode("utf-8"))
 
 def append_text(p, line):
     ensure_dir(os.path.dirname(p))
     with open(p, "a", encoding="utf-8") as f:
         f.write(line + "\n")
 
-def list_projects():
-    items = []
-    for slug in sorted(os.listdir(PROJECTS_DIR)):
-        proj_path = os.path.join(PROJECTS_DIR, slug)
-        if not os.path.isdir(proj_path): continue
-        meta = read_json(os.path.join(proj_path, "project.json"), {})
-        illustrations_dir = os.path.join(proj_path, "illustrations")
-        count = 0
-        previews = []
-        if os.path.isdir(illustrations_dir):
-            for label in sorted(os.listdir(illustrations_dir)):
-                lab_dir = os.path.join(illustrations_dir, label)
-                if not os.path.isdir(lab_dir): continue
-                count += 1
-                sel = read_text(os.path.join(lab_dir, "selected.txt")).strip()
-                # ★ "__ORIGINAL__" 처리
-                if sel == "__ORIGINAL__":
-                    if os.path.exists(os.path.join(lab_dir, "original.png")):
-                        previews.append(f"/files/projects/{slug}/illustrations/{label}/original.png")
-                elif sel:
-                    previews.append(f"/files/projects/{slug}/illustrations/{label}/versions/{sel}")
-                else:
-                    # 아직 선택 없으면 original
-                    if os.path.exists(os.path.join(lab_dir, "original.png")):
-                        previews.append(f"/files/projects/{slug}/illustrations/{label}/original.png")
-        items.append({
-            "slug": slug,
-            "name": meta.get("name", slug),
-            "created_at": meta.get("created_at", ""),
-            "updated_at": meta.get("updated_at", ""),
-            "illustration_count": count,
-            "previews": previews,
-        })
-    return items
-
 def project_path(slug):
     return os.path.join(PROJECTS_DIR, slug)
 
@@ -113,6 +274,90 @@ def illustrations_path(slug):
 def chatlogs_path(slug):
     return os.path.join(project_path(slug), "chat_logs")
 
+LOCKS_DIR = os.path.join(DATA_DIR, ".locks")
+_path_locks: Dict[str, list] = {}  # 이름 → [threading.Lock, 쥐었거나 기다리는 스레드 수] — 0이 되면 지운다
+_path_locks_guard = threading.Lock()
+
+@contextmanager
+def file_lock(name: str):
+    """이름 단위 잠금. 같은 프로세스의 스레드끼리는 threading.Lock,
+    다른 프로세스(멀티 워커)끼리는 DATA_DIR/.locks/<name>.lock 파일 잠금(fcntl이 있을 때).
+    이름은 삽화/버전마다 새로 생기므로 아무도 쓰지 않는 잠금은 바로 버린다.
+    (고정 개수로 나눠 쓰면 서로 다른 이름이 한 잠금을 공유해 중첩 잠금에서 스스로 막힐 수 있다)"""
+    with _path_locks_guard:
+        entry = _path_locks.setdefault(name, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            if fcntl is None:
+                yield
+                return
+            ensure_dir(LOCKS_DIR)
+            with open(os.path.join(LOCKS_DIR, name + ".lock"), "a") as lf:
+                fcntl.flock(lf, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lf, fcntl.LOCK_UN)
+    finally:
+        with _path_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _path_locks[name]
+
+def update_project_meta(slug: str, **changes) -> Dict[str, Any]:
+    """project.json 읽기-수정-쓰기(잠금 + 원자적 교체) + updated_at 갱신 + 인덱스 반영."""
+    meta_p = os.path.join(project_path(slug), "project.json")
+    with file_lock(f"project-{slug}"):
+        meta = read_json(meta_p, {})
+        meta["updated_at"] = now_iso()
+        meta.update(changes)
+        write_json(meta_p, meta)
+    with _touch_lock:
+        _touch_pending.pop(slug, None)
+    index_put_project(slug, meta)
+    return meta
+
+# updated_at 갱신 묶기: 편집/선택마다 project.json을 다시 쓰지 않고
+# 인덱스만 즉시 갱신한 뒤 META_FLUSH_SEC마다 한 번 파일에 반영한다.
+META_FLUSH_SEC = float(os.getenv("META_FLUSH_SEC", "5"))
+_touch_pending: Dict[str, str] = {}
+_touch_lock = threading.Lock()
+_touch_flusher: Optional[threading.Thread] = None
+
+def touch_project(slug: str):
+    ts = now_iso()
+    if META_FLUSH_SEC <= 0:
+        update_project_meta(slug)
+        return
+    index_touch_project(slug, ts)
+    global _touch_flusher
+    with _touch_lock:
+        _touch_pending[slug] = ts
+        if _touch_flusher is None:
+            _touch_flusher = threading.Thread(target=_flush_touches_loop, name="meta-flusher", daemon=True)
+            _touch_flusher.start()
+
+def flush_project_touches():
+    with _touch_lock:
+        pending = list(_touch_pending.items())
+    for slug, ts in pending:
+        if os.path.isdir(project_path(slug)):
+            update_project_meta(slug, updated_at=ts)
+        else:
+            with _touch_lock:
+                _touch_pending.pop(slug, None)
+
+def _flush_touches_loop():
+    while True:
+        time.sleep(META_FLUSH_SEC)
+        try:
+            flush_project_touches()
+        except Exception:
+            log.exception("updated_at flush failed")
+
+atexit.register(flush_project_touches)
+
 def next_label(existing: List[str]) -> str:
     # A, B, C... (이미 존재하는 레이블 다음)
     letters = [chr(i) for i in range(ord('A'), ord('Z')+1)]
@@ -128,21 +373,20 @@ def next_label(existing: List[str]) -> str:
                 return cand
         idx += 1
 
-def latest_version_num(label_dir: str) -> int:
-    ver_dir = os.path.join(label_dir, "versions")
-    if not os.path.isdir(ver_dir): return 0
-    maxn = 0
-    for fn in os.listdir(ver_dir):
-        m = re.match(rf"([A-Z]+)-(\d+)\.png$", fn)
-        if m:
-            n = int(m.group(2))
-            if n > maxn: maxn = n
-    return maxn
-
-def save_pil(img: Image.Image, path: str):
-    ensure_dir(os.path.dirname(path))
-    img.save(path, format="PNG")
-
+def save_pil(img: Image.Image, path: str, overwrite: bool = True) -> bool:
+    """PNG로 저장(임시 파일 → 블롭 → 링크). overwrite=False 면 이미 있는 파일은 건드리지 않고 False."""
+    d = os.path.dirname(path)
+    ensure_dir(d)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f, timed("png.encode"):
+            img.save(f, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+        return publish_file(tmp, path, overwrite)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+@timed("image.decode")
 def load_pil(path: str) -> Image.Image:
     return Image.open(path).convert("RGBA")
 
@@ -156,26 +400,1190 @@ def force_same_size(output_img: Image.Image, ref_path: str) -> Image.Image:
         pass
     return output_img
 
+# ---------- 블롭 저장소 ----------
+# 이미지(원본/버전)는 내용 해시로 DATA_DIR/blobs/ab/<sha256>.png 에 한 번만 두고,
+# 프로젝트 쪽 경로(original.png, versions/A-n.png)는 그 블롭의 하드링크다.
+# 경로 구조는 그대로라 읽는 쪽 코드는 바뀌지 않고, 같은 바이트는 디스크에 한 번만 있다.
+# 참조 수 = 링크 수(st_nlink) - 1 — 프로젝트 쪽 링크가 모두 지워진 블롭은 collect_blobs가 지운다.
+BLOBS_DIR = os.path.join(DATA_DIR, "blobs")
+BLOB_GC_GRACE_SEC = 3600  # 고아가 된 지 이만큼 지난 블롭만 (막 만들어져 링크되기 전일 수 있다)
+# 파일 → sha256은 (dev, ino, mtime, size)로 기억한다: 메모리 + 인덱스의 digests 표(재시작해도 다시 읽지 않게).
+# 블롭 링크는 inode가 같으므로 블롭에 넣을 때 계산한 해시가 모든 링크 경로에 그대로 쓰인다.
+_digests: "collections.OrderedDict[tuple, str]" = collections.OrderedDict()  # (dev, ino, mtime, size) → sha256
+_digests_lock = threading.Lock()
+DIGEST_MEMO_MAX = 100_000
+
+def blob_path(digest: str) -> str:
+    return os.path.join(BLOBS_DIR, digest[:2], digest + ".png")
+
+def hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _digest_key(st) -> tuple:
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _memo_digest(key: tuple, digest: str):
+    with _digests_lock:
+        _digests[key] = digest
+        _digests.move_to_end(key)
+        while len(_digests) > DIGEST_MEMO_MAX:
+            _digests.popitem(last=False)
+
+def remember_digest(st, digest: str):
+    key = _digest_key(st)
+    _memo_digest(key, digest)
+    with db() as conn:
+        conn.execute("INSERT OR REPLACE INTO digests(dev, ino, mtime_ns, size, sha256) VALUES (?,?,?,?,?)",
+                     (*key, digest))
+
+def file_digest(path: str, st=None) -> str:
+    """파일 내용의 sha256. 같은 inode(블롭 링크)는 한 번만 읽는다. (재시작 뒤에도 인덱스에서)"""
+    st = st or os.stat(path)
+    key = _digest_key(st)
+    with _digests_lock:
+        hit = _digests.get(key)
+    if hit is not None:
+        return hit
+    row = db().execute("SELECT sha256 FROM digests WHERE dev=? AND ino=? AND mtime_ns=? AND size=?",
+                       key).fetchone()
+    if row:
+        _memo_digest(key, row[0])
+        return row[0]
+    with timed("blob.hash"):
+        hit = hash_file(path)
+    remember_digest(st, hit)
+    return hit
+
+def store_blob(path: str) -> str:
+    """path 내용을 블롭으로 (같은 내용이 이미 있으면 그것을) → 블롭 경로. 하드링크를 못 쓰면 OSError."""
+    digest = hash_file(path)
+    bpath = blob_path(digest)
+    ensure_dir(os.path.dirname(bpath))
+    try:
+        os.link(path, bpath)
+    except FileExistsError:
+        metrics.inc("blob_dedup_total")
+    remember_digest(os.stat(bpath), digest)
+    return bpath
+
+def link_file(src: str, dst: str, overwrite: bool = True) -> bool:
+    """dst를 src의 하드링크로. overwrite=False 면 dst가 있으면 건드리지 않고 False."""
+    if not overwrite:
+        try:
+            os.link(src, dst)  # 대상이 있으면 실패 → 덮어쓰기 없는 원자적 게시
+        except FileExistsError:
+            return False
+        return True
+    tmp = os.path.join(os.path.dirname(dst), f".{uuid.uuid4().hex}.tmp")
+    os.link(src, tmp)
+    try:
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):  # dst가 이미 같은 inode면 rename은 아무것도 하지 않는다
+            os.remove(tmp)
+    return True
+
+def publish_file(tmp: str, dst: str, overwrite: bool = True) -> bool:
+    """다 쓴 임시 파일을 블롭에 넣고 dst에 링크한다. (tmp는 호출한 쪽에서 지운다)"""
+    for _ in range(3):
+        try:
+            src = store_blob(tmp)
+        except OSError:
+            src = tmp  # 하드링크를 못 쓰는 파일시스템 → 블롭 없이 그대로
+        try:
+            return link_file(src, dst, overwrite)
+        except FileNotFoundError:
+            continue  # 고아 블롭을 수거기가 방금 지움 → 다시 넣는다
+    return link_file(tmp, dst, overwrite)
+
+def collect_blobs(now: Optional[float] = None) -> Dict[str, int]:
+    """참조가 없는(링크 수 1) 블롭을 지운다 → {"blobs": 지운 수, "bytes": 줄어든 바이트}"""
+    out = {"blobs": 0, "bytes": 0}
+    if not os.path.isdir(BLOBS_DIR):
+        return out
+    now = now or time.time()
+    for dirpath, _, fns in os.walk(BLOBS_DIR):
+        for fn in fns:
+            p = os.path.join(dirpath, fn)
+            try:
+                st = os.stat(p)
+                # 마지막 링크가 끊긴 시점(ctime)부터 유예
+                if st.st_nlink > 1 or now - st.st_ctime < BLOB_GC_GRACE_SEC:
+                    continue
+                os.remove(p)
+            except OSError:
+                continue
+            out["blobs"] += 1
+            out["bytes"] += st.st_size
+    if out["blobs"]:
+        metrics.inc("blob_collected_total", out["blobs"])
+    return out
+
+def migrate_blobs() -> Dict[str, int]:
+    """기존 data/projects 의 원본/버전 파일을 그 자리에서 블롭 링크로 바꾼다. (여러 번 돌려도 된다)"""
+    out = {"files": 0, "linked": 0, "bytes_saved": 0}
+    for slug in os.listdir(PROJECTS_DIR):
+        illus_dir = illustrations_path(slug)
+        if not os.path.isdir(illus_dir):
+            continue
+        for label in os.listdir(illus_dir):
+            Ldir = os.path.join(illus_dir, label)
+            vdir = os.path.join(Ldir, "versions")
+            paths = [os.path.join(Ldir, "original.png")]
+            if os.path.isdir(vdir):
+                paths += [os.path.join(vdir, fn) for fn in os.listdir(vdir) if fn.endswith(".png")]
+            for p in paths:
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                out["files"] += 1
+                bpath = blob_path(file_digest(p, st))
+                try:
+                    if os.path.samefile(p, bpath):
+                        continue  # 이미 블롭
+                    link_file(bpath, p)  # 같은 내용의 블롭이 있음 → 그것으로 교체
+                    if st.st_nlink == 1:
+                        out["bytes_saved"] += st.st_size
+                except FileNotFoundError:
+                    ensure_dir(os.path.dirname(bpath))
+                    os.link(p, bpath)  # 처음 보는 내용 → 이 파일이 블롭
+                out["linked"] += 1
+    return out
+
+# ---------- 프로젝트 인덱스 (SQLite) ----------
+# 목록/상세/이름 중복 검사를 디스크 순회 없이 처리하기 위한 인덱스.
+# 원본 데이터는 여전히 data/projects/... 이고, 인덱스는 언제든 디스크에서 재생성 가능하다.
+INDEX_PATH = os.path.join(DATA_DIR, "index.sqlite3")
+INDEX_SCHEMA_VERSION = 8  # 스키마가 바뀌면 올린다 → 시작 시 디스크에서 재생성
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    slug        TEXT PRIMARY KEY,
+    name        TEXT NOT NULL,
+    name_norm   TEXT NOT NULL,
+    created_at  TEXT NOT NULL DEFAULT '',
+    updated_at  TEXT NOT NULL DEFAULT '',
+    rev         INTEGER NOT NULL DEFAULT 0,   -- 프로젝트 리비전: 상세 내용이 바뀔 때마다 +1
+    rev_floor   INTEGER NOT NULL DEFAULT 0    -- 디스크에서 다시 읽은 시점의 rev (이보다 오래된 since는 전체 응답)
+);
+CREATE INDEX IF NOT EXISTS projects_name_norm ON projects(name_norm);
+CREATE TABLE IF NOT EXISTS labels (
+    slug         TEXT NOT NULL,
+    label        TEXT NOT NULL,
+    has_original INTEGER NOT NULL DEFAULT 0,
+    selected     TEXT NOT NULL DEFAULT '',
+    has_chat     INTEGER NOT NULL DEFAULT 0,
+    asset_v      TEXT NOT NULL DEFAULT '',
+    last_version INTEGER NOT NULL DEFAULT 0,   -- 마지막으로 할당한 버전 번호
+    rev          INTEGER NOT NULL DEFAULT 0,   -- 이 삽화가 마지막으로 바뀐 프로젝트 rev
+    original_rev INTEGER NOT NULL DEFAULT 0,   -- 원본이 생긴 프로젝트 rev (증분 내보내기)
+    PRIMARY KEY (slug, label)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    slug   TEXT NOT NULL,
+    label  TEXT NOT NULL,
+    n      INTEGER NOT NULL,
+    file   TEXT NOT NULL,
+    rev    INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL DEFAULT 0,   -- 버전을 만든 시각(유닉스) — cold 이동 기준. 재생성 시 채팅 로그의 ts
+    PRIMARY KEY (slug, label, n)
+);
+CREATE TABLE IF NOT EXISTS tombstones (   -- 삭제된 삽화 (since 응답의 removed)
+    slug   TEXT NOT NULL,
+    label  TEXT NOT NULL,
+    rev    INTEGER NOT NULL,
+    PRIMARY KEY (slug, label)
+);
+CREATE TABLE IF NOT EXISTS chat (
+    slug     TEXT NOT NULL,
+    label    TEXT NOT NULL,
+    seq      INTEGER NOT NULL,
+    offset   INTEGER NOT NULL,   -- chat_logs/<label>.jsonl 안의 바이트 위치
+    kind     TEXT NOT NULL,
+    version  TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (slug, label, seq)
+);
+CREATE INDEX IF NOT EXISTS chat_version ON chat(slug, label, version);
+CREATE TABLE IF NOT EXISTS digests (      -- 파일 내용 해시 캐시 (inode 기준, 디스크 재생성과 무관)
+    dev      INTEGER NOT NULL,
+    ino      INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size     INTEGER NOT NULL,
+    sha256   TEXT NOT NULL,
+    PRIMARY KEY (dev, ino)
+);
+"""
+_INDEX_TABLES = ("projects", "labels", "versions", "chat", "tombstones")
+_db_local = threading.local()
+
+def normalize_name(name: str) -> str:
+    return (name or "").strip().lower()
+
+def db() -> sqlite3.Connection:
+    """스레드별 인덱스 커넥션"""
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(INDEX_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _db_local.conn = conn
+    return conn
+
+def init_index():
+    fresh = not os.path.exists(INDEX_PATH)
+    conn = db()
+    ver = conn.execute("PRAGMA user_version").fetchone()[0]
+    if not fresh and ver != INDEX_SCHEMA_VERSION:
+        with conn:
+            for t in _INDEX_TABLES + ("digests",):
+                conn.execute(f"DROP TABLE IF EXISTS {t}")
+        fresh = True
+    conn.executescript(_INDEX_SCHEMA)
+    conn.execute(f"PRAGMA user_version={INDEX_SCHEMA_VERSION}")
+    if fresh:
+        index_rebuild()
+
+LABEL_TOKEN = ".v"  # 삽화 폴더 안의 캐시 토큰 파일
+
+def label_asset_v(label_dir: str) -> str:
+    """삽화 파일 URL에 붙는 캐시 토큰(?v=). 레이블을 만들 때 정한 임의 값(.v) — 삭제 후 같은 이름,
+    같은 바이트로 다시 올려도 달라진다. (원본 mtime은 블롭과 공유되므로 쓰지 않는다) 없으면 만든다."""
+    p = os.path.join(label_dir, LABEL_TOKEN)
+    token = read_text(p).strip()
+    if token or not os.path.isdir(label_dir):
+        return token
+    fd, tmp = tempfile.mkstemp(dir=label_dir, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(uuid.uuid4().hex[:16])
+        link_file(tmp, p, overwrite=False)  # 동시에 만들면 먼저 만든 쪽 값
+    finally:
+        os.remove(tmp)
+    return read_text(p).strip()
+
+def scan_label_versions(label_dir: str, label: str) -> List[int]:
+    ver_dir = os.path.join(label_dir, "versions")
+    if not os.path.isdir(ver_dir):
+        return []
+    nums = set()
+    for fn in os.listdir(ver_dir):
+        m = re.match(rf"{re.escape(label)}-(\d+)\.png$", fn)
+        if m:
+            nums.add(int(m.group(1)))
+    cold_dir = os.path.join(ver_dir, COLD_DIR)
+    if os.path.isdir(cold_dir):
+        for fn in os.listdir(cold_dir):
+            m = re.match(rf"{re.escape(label)}-(\d+)\.(?:png|webp)$", fn)
+            if m:
+                nums.add(int(m.group(1)))
+    return sorted(nums)
+
+@timed("fs.scan_project")
+def index_reload_project(slug: str):
+    """한 프로젝트의 인덱스 행을 디스크 상태로 다시 채운다. (없으면 삭제만)"""
+    conn = db()
+    base = project_path(slug)
+    with conn:
+        for t in _INDEX_TABLES:
+            conn.execute(f"DELETE FROM {t} WHERE slug=?", (slug,))
+        if not os.path.isdir(base):
+            return
+        meta = read_json(os.path.join(base, "project.json"), {})
+        name = meta.get("name", slug)
+        rev = rev_seed()
+        conn.execute(
+            "INSERT INTO projects(slug, name, name_norm, created_at, updated_at, rev, rev_floor) "
+            "VALUES (?,?,?,?,?,?,?)",
+            (slug, name, normalize_name(name), meta.get("created_at", ""), meta.get("updated_at", ""), rev, rev))
+        illus_dir = illustrations_path(slug)
+        if not os.path.isdir(illus_dir):
+            return
+        for label in os.listdir(illus_dir):
+            Ldir = os.path.join(illus_dir, label)
+            if not os.path.isdir(Ldir):
+                continue
+            nums = scan_label_versions(Ldir, label)
+            chat = list(scan_chat_log(chat_log_path(slug, label))) if ensure_chat_jsonl(slug, label) else []
+            created = {e["version"]: iso_ts(e.get("ts", "")) for _, _, e in chat
+                       if e.get("kind") == "MODEL" and e.get("version")}
+            has_original = os.path.exists(os.path.join(Ldir, "original.png"))
+            conn.execute(
+                "INSERT INTO labels(slug, label, has_original, selected, has_chat, asset_v, last_version, rev, "
+                "original_rev) VALUES (?,?,?,?,?,?,?,?,?)",
+                (slug, label,
+                 int(has_original),
+                 read_text(os.path.join(Ldir, "selected.txt")).strip(),
+                 int(os.path.exists(chat_log_path(slug, label))),
+                 label_asset_v(Ldir),
+                 nums[-1] if nums else 0,
+                 rev,
+                 rev if has_original else 0))
+            files = [f"{label}-{n}.png" for n in nums]
+            conn.executemany(
+                "INSERT INTO versions(slug, label, n, file, rev, created) VALUES (?,?,?,?,?,?)",
+                [(slug, label, n, fn, rev, created.get(fn) or file_mtime(os.path.join(Ldir, "versions", fn)))
+                 for n, fn in zip(nums, files)])
+            conn.executemany(
+                "INSERT INTO chat(slug, label, seq, offset, kind, version) VALUES (?,?,?,?,?,?)",
+                [(slug, label, seq, off, e.get("kind", ""), e.get("version", "")) for seq, off, e in chat])
+
+def index_rebuild():
+    """디스크 전체를 훑어 인덱스를 처음부터 다시 만든다."""
+    conn = db()
+    with conn:
+        for t in _INDEX_TABLES:
+            conn.execute(f"DELETE FROM {t}")
+    for slug in os.listdir(PROJECTS_DIR):
+        if os.path.isdir(project_path(slug)):
+            index_reload_project(slug)
+
+def index_name_taken(name: str, exclude_slug: Optional[str] = None) -> bool:
+    row = db().execute(
+        "SELECT 1 FROM projects WHERE name_norm=? AND slug IS NOT ? LIMIT 1",
+        (normalize_name(name), exclude_slug)).fetchone()
+    return row is not None
+
+# ---- 프로젝트 리비전 ----
+# 상세 내용(메타/삽화/버전/선택)이 바뀌는 인덱스 쓰기는 같은 트랜잭션에서 projects.rev를 올리고,
+# 바뀐 행에 그 rev를 적는다. 상세 API는 since=<rev> 이후 바뀐 것만 돌려줄 수 있다.
+# 인덱스를 디스크에서 다시 만들면 rev는 현재 시각(ms)에서 다시 시작한다 → 재생성 후에도 줄어들지 않음.
+def rev_seed() -> int:
+    return int(time.time() * 1000)
+
+def _bump_rev(conn: sqlite3.Connection, slug: str) -> int:
+    """(트랜잭션 안에서) 프로젝트 rev +1 → 새 rev. 프로젝트가 없으면 0."""
+    conn.execute("UPDATE projects SET rev = rev + 1 WHERE slug=?", (slug,))
+    row = conn.execute("SELECT rev FROM projects WHERE slug=?", (slug,)).fetchone()
+    return row[0] if row else 0
+
+def index_put_project(slug: str, meta: Dict[str, Any]):
+    name = meta.get("name", slug)
+    rev = rev_seed()
+    with db() as conn:
+        conn.execute(
+            "INSERT INTO projects(slug, name, name_norm, created_at, updated_at, rev, rev_floor) "
+            "VALUES (?,?,?,?,?,?,?) "
+            "ON CONFLICT(slug) DO UPDATE SET name=excluded.name, name_norm=excluded.name_norm, "
+            "created_at=excluded.created_at, updated_at=excluded.updated_at, rev=projects.rev + 1",
+            (slug, name, normalize_name(name), meta.get("created_at", ""), meta.get("updated_at", ""), rev, rev))
+
+def index_touch_project(slug: str, updated_at: str):
+    with db() as conn:
+        conn.execute("UPDATE projects SET updated_at=?, rev = rev + 1 WHERE slug=?", (updated_at, slug))
+
+def index_project_rev(slug: str) -> Optional[sqlite3.Row]:
+    """(rev, rev_floor) — 프로젝트가 인덱스에 없으면 None"""
+    return db().execute("SELECT rev, rev_floor FROM projects WHERE slug=?", (slug,)).fetchone()
+
+def index_project_meta(slug: str) -> Optional[Dict[str, Any]]:
+    row = db().execute("SELECT name, created_at, updated_at FROM projects WHERE slug=?", (slug,)).fetchone()
+    return dict(row) if row else None
+
+def index_delete_project(slug: str):
+    with db() as conn:
+        for t in _INDEX_TABLES:
+            conn.execute(f"DELETE FROM {t} WHERE slug=?", (slug,))
+
+def index_put_label(slug: str, label: str, has_original: bool, selected: str, has_chat: bool,
+                    asset_v: str = ""):
+    with db() as conn:
+        rev = _bump_rev(conn, slug)
+        conn.execute(
+            "INSERT INTO labels(slug, label, has_original, selected, has_chat, asset_v, rev, original_rev) "
+            "VALUES (?,?,?,?,?,?,?,?) "
+            "ON CONFLICT(slug, label) DO UPDATE SET has_original=excluded.has_original, "
+            "selected=excluded.selected, has_chat=excluded.has_chat, asset_v=excluded.asset_v, rev=excluded.rev, "
+            "original_rev=CASE WHEN excluded.has_original AND NOT labels.has_original "
+            "THEN excluded.rev ELSE labels.original_rev END",
+            (slug, label, int(has_original), selected, int(has_chat), asset_v, rev, rev if has_original else 0))
+        conn.execute("DELETE FROM tombstones WHERE slug=? AND label=?", (slug, label))
+
+def index_delete_label(slug: str, label: str):
+    with db() as conn:
+        rev = _bump_rev(conn, slug)
+        for t in ("labels", "versions", "chat"):
+            conn.execute(f"DELETE FROM {t} WHERE slug=? AND label=?", (slug, label))
+        conn.execute("INSERT OR REPLACE INTO tombstones(slug, label, rev) VALUES (?,?,?)", (slug, label, rev))
+
+def index_set_selected(slug: str, label: str, selected: str):
+    with db() as conn:
+        rev = _bump_rev(conn, slug)
+        conn.execute("UPDATE labels SET selected=?, rev=? WHERE slug=? AND label=?", (selected, rev, slug, label))
+
+def index_allocate_version(slug: str, label: str) -> int:
+    """삽화의 다음 버전 번호를 원자적으로 할당한다. (스레드/프로세스 간 중복 없음)
+    삽화가 인덱스에 없으면 0."""
+    conn = db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("UPDATE labels SET last_version = last_version + 1 WHERE slug=? AND label=?",
+                     (slug, label))
+        row = conn.execute("SELECT last_version FROM labels WHERE slug=? AND label=?",
+                           (slug, label)).fetchone()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return row[0] if row else 0
+
+def index_version_count(slug: str, label: str) -> int:
+    return db().execute("SELECT COUNT(*) FROM versions WHERE slug=? AND label=?", (slug, label)).fetchone()[0]
+
+def index_version_created(slug: str, label: str) -> Dict[str, float]:
+    """버전 파일 → 만든 시각(유닉스)"""
+    return {r["file"]: r["created"] for r in db().execute(
+        "SELECT file, created FROM versions WHERE slug=? AND label=? ORDER BY n", (slug, label))}
+
+def index_latest_version(slug: str, label: str) -> int:
+    """저장이 끝난 버전 중 가장 큰 번호 (없으면 0)"""
+    row = db().execute("SELECT MAX(n) FROM versions WHERE slug=? AND label=?", (slug, label)).fetchone()
+    return row[0] or 0
+
+def index_add_version(slug: str, label: str, n: int):
+    with db() as conn:
+        rev = _bump_rev(conn, slug)
+        conn.execute("INSERT OR REPLACE INTO versions(slug, label, n, file, rev, created) VALUES (?,?,?,?,?,?)",
+                     (slug, label, n, f"{label}-{n}.png", rev, time.time()))
+        conn.execute("UPDATE labels SET rev=? WHERE slug=? AND label=?", (rev, slug, label))
+
+@timed("index.query")
+def index_labels(slug: str) -> List[sqlite3.Row]:
+    return db().execute("SELECT * FROM labels WHERE slug=? ORDER BY label", (slug,)).fetchall()
+
+@timed("index.query")
+def index_versions(slug: str, label: Optional[str] = None, since: int = 0) -> Dict[str, List[str]]:
+    """삽화별 버전 파일 목록 (label을 주면 그 삽화만, since를 주면 그 rev 이후 추가된 것만)"""
+    sql, args = "SELECT label, file FROM versions WHERE slug=? AND rev>?", [slug, since]
+    if label is not None:
+        sql += " AND label=?"
+        args.append(label)
+    out: Dict[str, List[str]] = {}
+    for r in db().execute(sql + " ORDER BY label, n", args):
+        out.setdefault(r["label"], []).append(r["file"])
+    return out
+
+@timed("index.query")
+def index_labels_since(slug: str, since: int):
+    """since 이후 바뀐 삽화 행과 삭제된 삽화 이름"""
+    conn = db()
+    changed = conn.execute("SELECT * FROM labels WHERE slug=? AND rev>? ORDER BY label", (slug, since)).fetchall()
+    removed = [r[0] for r in conn.execute(
+        "SELECT label FROM tombstones WHERE slug=? AND rev>? ORDER BY label", (slug, since))]
+    return changed, removed
+
+def label_urls(slug: str, row) -> Dict[str, str]:
+    """인덱스의 labels 행 → original_url / selected / selected_url (캐시 토큰 ?v= 포함)"""
+    label = row["label"]
+    sel = row["selected"]
+    v = f"?v={row['asset_v']}" if row["asset_v"] else ""
+    original_url = f"/files/projects/{slug}/illustrations/{label}/original.png{v}" if row["has_original"] else ""
+    # ★ 선택 없음 / "__ORIGINAL__" 은 원본
+    if not sel or sel == "__ORIGINAL__":
+        return {"original_url": original_url, "selected": "__ORIGINAL__", "selected_url": original_url}
+    return {"original_url": original_url, "selected": sel,
+            "selected_url": f"/files/projects/{slug}/illustrations/{label}/versions/{sel}{v}"}
+
+@timed("index.list_projects")
+def list_projects(limit: Optional[int] = None, offset: int = 0):
+    conn = db()
+    rows = conn.execute(
+        "SELECT * FROM projects ORDER BY slug LIMIT ? OFFSET ?",
+        (limit if limit is not None else -1, offset)).fetchall()
+    slugs = [r["slug"] for r in rows]
+    labels_by_slug: Dict[str, List[sqlite3.Row]] = {s: [] for s in slugs}
+    if slugs:
+        q = ",".join("?" * len(slugs))
+        for r in conn.execute(f"SELECT * FROM labels WHERE slug IN ({q}) ORDER BY slug, label", slugs):
+            labels_by_slug[r["slug"]].append(r)
+    items = []
+    for r in rows:
+        slug = r["slug"]
+        previews = [u for u in (label_urls(slug, L)["selected_url"] for L in labels_by_slug[slug]) if u]
+        items.append({
+            "slug": slug,
+            "name": r["name"],
+            "created_at": r["created_at"],
+            "updated_at": r["updated_at"],
+            "illustration_count": len(labels_by_slug[slug]),
+            "previews": previews,
+            "preview_thumbs": [thumb_url(u) for u in previews],
+        })
+    return items
+
+def count_projects() -> int:
+    return db().execute("SELECT COUNT(*) FROM projects").fetchone()[0]
+
+# ---------- 채팅 로그 (JSONL) ----------
+# chat_logs/<label>.jsonl — 한 줄에 한 항목, seq는 1부터 증가.
+#   {"seq": 3, "ts": "...", "kind": "USER", "base": "/projects/.../original.png", "prompt": "..."}
+#   {"seq": 4, "ts": "...", "kind": "MODEL", "out": "/projects/.../versions/A-1.png", "version": "A-1.png", "req": 3}
+# kind: INIT | USER | MODEL | MODEL:TEXT | SELECT
+# 각 항목의 바이트 위치는 인덱스(chat 테이블)에 있어 since/버전 조회 시 파일 전체를 읽지 않는다.
+CHAT_PAGE_MAX = 500
+_LEGACY_CHAT_RE = re.compile(r"^\[([^\]]+)\]\s\[(USER|MODEL|INIT|SELECT|MODEL:TEXT)\]\s?(.*)$")
+def chat_log_path(slug: str, label: str) -> str:
+    return os.path.join(chatlogs_path(slug), f"{label}.jsonl")
+
+def parse_legacy_chat(text: str) -> List[Dict[str, Any]]:
+    """기존 '[ts] [TAG] ...' 텍스트 로그 → 항목 목록. 헤더 없는 줄은 직전 항목(여러 줄 프롬프트)에 이어붙인다."""
+    entries: List[Dict[str, Any]] = []
+    for line in text.splitlines():
+        m = _LEGACY_CHAT_RE.match(line)
+        if not m:
+            if entries:
+                e = entries[-1]
+                key = "prompt" if e["kind"] == "USER" else "text"
+                e[key] = e.get(key, "") + "\n" + line
+            continue
+        ts, kind, rest = m.groups()
+        e: Dict[str, Any] = {"ts": ts, "kind": kind}
+        if kind == "USER":
+            mm = re.match(r"base=(\S+)\s(?:prompt=)?(.*)$", rest)
+            e["base"], e["prompt"] = (mm.group(1), mm.group(2)) if mm else ("", rest)
+        elif kind == "MODEL":
+            mm = re.match(r"out=(\S+)\s*$", rest)
+            if mm:
+                e["out"] = mm.group(1)
+                e["version"] = mm.group(1).rsplit("/", 1)[-1]
+            else:
+                e["text"] = rest
+        elif kind == "SELECT":
+            e["version"] = rest.split(" ", 1)[0]
+        else:
+            e["text"] = rest
+        entries.append(e)
+    for i, e in enumerate(entries, start=1):
+        e["seq"] = i
+        for key in ("prompt", "text"):
+            if key in e:
+                e[key] = e[key].strip()
+    return entries
+
+def ensure_chat_jsonl(slug: str, label: str) -> bool:
+    """JSONL 로그가 있으면 True. 예전 .txt 로그만 있으면 변환(.txt는 .txt.bak으로 보관) 후 True."""
+    path = chat_log_path(slug, label)
+    if os.path.exists(path):
+        return True
+    legacy = os.path.join(chatlogs_path(slug), f"{label}.txt")
+    if not os.path.exists(legacy):
+        return False
+    entries = parse_legacy_chat(read_text(legacy))
+    fd, tmp = tempfile.mkstemp(dir=chatlogs_path(slug), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    os.replace(legacy, legacy + ".bak")
+    return True
+
+def open_chat_log(slug: str, label: str) -> bool:
+    """요청 처리 중 호출: 예전 .txt 로그만 있으면 변환하고 인덱스 위치도 채운다."""
+    if os.path.exists(chat_log_path(slug, label)):
+        return True
+    if not ensure_chat_jsonl(slug, label):
+        return False
+    with db() as conn:
+        conn.execute("DELETE FROM chat WHERE slug=? AND label=?", (slug, label))
+        conn.executemany(
+            "INSERT INTO chat(slug, label, seq, offset, kind, version) VALUES (?,?,?,?,?,?)",
+            [(slug, label, seq, off, e.get("kind", ""), e.get("version", ""))
+             for seq, off, e in scan_chat_log(chat_log_path(slug, label))])
+        conn.execute("UPDATE labels SET has_chat=1 WHERE slug=? AND label=?", (slug, label))
+    return True
+
+def scan_chat_log(path: str):
+    """(seq, 바이트 위치, 항목) — 인덱스 재생성용"""
+    if not os.path.exists(path):
+        return
+    offset = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            if raw.strip():
+                e = json.loads(raw)
+                yield e["seq"], offset, e
+            offset += len(raw)
+
+def append_chat(slug: str, label: str, kind: str, **fields) -> Dict[str, Any]:
+    """채팅 로그에 한 항목 추가 + 인덱스에 위치 기록.
+    seq 할당과 줄 추가는 file_lock 안에서 — 여러 워커 프로세스가 같은 로그에 써도 seq가 겹치지 않는다."""
+    path = chat_log_path(slug, label)
+    ensure_dir(os.path.dirname(path))
+    with file_lock(f"chat-{slug}-{label}"):
+        open_chat_log(slug, label)
+        conn = db()
+        last = conn.execute("SELECT MAX(seq) FROM chat WHERE slug=? AND label=?", (slug, label)).fetchone()[0]
+        entry = {"seq": (last or 0) + 1, "ts": now_iso(), "kind": kind, **fields}
+        with open(path, "ab") as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        with conn:
+            conn.execute(
+                "INSERT INTO chat(slug, label, seq, offset, kind, version) VALUES (?,?,?,?,?,?)",
+                (slug, label, entry["seq"], offset, kind, fields.get("version", "")))  # 겹치면 조용히 덮지 않고 실패
+            rev = _bump_rev(conn, slug)  # 로그도 삽화의 변경 — 증분 내보내기/상세 since에 잡힌다
+            conn.execute("UPDATE labels SET has_chat=1, rev=? WHERE slug=? AND label=?", (rev, slug, label))
+    return entry
+
+@timed("chat.read")
+def read_chat(slug: str, label: str, since: int = 0, limit: int = 200) -> List[Dict[str, Any]]:
+    """seq > since 인 항목을 최대 limit개. 인덱스의 바이트 위치로 바로 seek 한다."""
+    row = db().execute(
+        "SELECT offset FROM chat WHERE slug=? AND label=? AND seq>? ORDER BY seq LIMIT 1",
+        (slug, label, since)).fetchone()
+    if row is None:
+        return []
+    out = []
+    with open(chat_log_path(slug, label), "rb") as f:
+        f.seek(row["offset"])
+        for raw in f:
+            if len(out) >= limit:
+                break
+            if raw.strip():
+                out.append(json.loads(raw))
+    return out
+
+def chat_seq_for_version(slug: str, label: str, version: str) -> Optional[int]:
+    """해당 버전을 만든 요청(USER) 항목의 seq — 찾지 못하면 MODEL 항목의 seq"""
+    if not version.endswith(".png"):
+        version += ".png"
+    conn = db()
+    row = conn.execute(
+        "SELECT seq FROM chat WHERE slug=? AND label=? AND version=? AND kind='MODEL' ORDER BY seq LIMIT 1",
+        (slug, label, version)).fetchone()
+    if row is None:
+        return None
+    user = conn.execute(
+        "SELECT MAX(seq) FROM chat WHERE slug=? AND label=? AND kind='USER' AND seq<?",
+        (slug, label, row["seq"])).fetchone()[0]
+    return user or row["seq"]
+
+# ---------- 디스크 LRU 캐시 ----------
+class DiskLRUCache:
+    """키 → 파일 형태의 디스크 캐시.
+    총 용량이 max_bytes를 넘으면 가장 오래 사용한(mtime 기준) 항목부터 지운다.
+    조회 시 mtime을 갱신하므로 mtime이 곧 최근 사용 시각이다."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total = None  # 첫 사용 시 디스크를 한 번 훑어 계산
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str, ext: str = "") -> str:
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def get(self, key: str, ext: str = "") -> Optional[str]:
+        p = self.path_for(key, ext)
+        try:
+            os.utime(p)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return p
+
+    def put(self, key: str, data: bytes, ext: str = "") -> str:
+        p = self.path_for(key, ext)
+        ensure_dir(os.path.dirname(p))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(p), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, p)
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            else:
+                self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+        return p
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            return {"hits": self.hits, "misses": self.misses,
+                    "bytes": self._total, "max_bytes": self.max_bytes}
+
+    def _entries(self):
+        for dirpath, _, fns in os.walk(self.root):
+            for fn in fns:
+                if fn.endswith(".tmp"):
+                    continue
+                p = os.path.join(dirpath, fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                yield p, st.st_mtime, st.st_size
+
+    def _scan_total(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def _evict(self):
+        # 한 번 지울 때 90%까지 내려 eviction이 매 put마다 반복되지 않게 한다
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(e[2] for e in entries)
+        for p, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+        self._total = total
+
+# ---------- 썸네일 ----------
+# 허용 크기(긴 변 px). 요청 값은 이 중 가장 가까운 큰 값으로 맞춰 캐시 키 폭증을 막는다.
+THUMB_SIZES = (160, 320, 512, 768, 1024)
+THUMB_DEFAULT_SIZE = 320
+THUMB_FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+}
+thumb_cache = DiskLRUCache(os.path.join(CACHE_DIR, "thumbs"), THUMB_CACHE_MAX_BYTES)
+
+def snap_thumb_size(size: Optional[int]) -> int:
+    if not size:
+        return THUMB_DEFAULT_SIZE
+    for s in THUMB_SIZES:
+        if size <= s:
+            return s
+    return THUMB_SIZES[-1]
+
+def thumb_url(file_url: str, size: int = THUMB_DEFAULT_SIZE) -> str:
+    """/files/... URL → 같은 파일의 축소본 /thumbs/... URL (?v= 토큰은 유지)"""
+    if not file_url or not file_url.startswith("/files/"):
+        return ""
+    path, _, query = file_url[len("/files/"):].partition("?")
+    return f"/thumbs/{path}?w={size}" + (f"&{query}" if query else "")
+
+@timed("thumb.render")
+def make_thumbnail(src_path: str, size: int, fmt: str) -> bytes:
+    pil_format = THUMB_FORMATS[fmt][0]
+    with Image.open(src_path) as im:
+        im.draft("RGB", (size, size))  # JPEG 원본이면 디코드 단계에서 바로 축소
+        im = im.convert("RGBA")
+        im.thumbnail((size, size), Image.LANCZOS, reducing_gap=2.0)
+        if pil_format == "JPEG":
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            bg.paste(im, mask=im.getchannel("A"))
+            im = bg
+        buf = io.BytesIO()
+        im.save(buf, format=pil_format, quality=80, method=4)
+        return buf.getvalue()
+
+# ---------- 오래된 버전 보관(cold) ----------
+# 최종본(selected.txt)이 아니고 COLD_AFTER_DAYS보다 오래된 versions/A-n.png 는
+# versions/.cold/A-n.webp(무손실 — 더 작아지지 않으면 PNG 그대로)로 옮기고,
+# 가장 큰 썸네일 크기의 미리보기(.cold/A-n.preview.webp)만 남긴다.
+# /files 요청이 오면 그 자리에서 versions/ 로 되돌리고(restore), /thumbs 는 미리보기로 답한다.
+COLD_AFTER_DAYS = float(os.getenv("COLD_AFTER_DAYS", "30"))
+COLD_COMPACT_INTERVAL_SEC = float(os.getenv("COLD_COMPACT_INTERVAL_SEC", "3600"))  # 0이면 자동 정리 끔
+COLD_DIR = ".cold"
+COLD_PREVIEW_SIZE = THUMB_SIZES[-1]
+COLD_MARKER = os.path.join(DATA_DIR, ".cold-last-run")  # 여러 워커 중 한 곳만 주기마다 정리
+
+_cold_compactor: Optional[threading.Thread] = None
+_cold_lock = threading.Lock()
+
+def cold_paths(hot_path: str) -> tuple:
+    """versions/A-3.png → (.cold/A-3.webp, .cold/A-3.png, .cold/A-3.preview.webp)"""
+    vdir, fn = os.path.split(hot_path)
+    stem = fn[:-len(".png")]
+    cdir = os.path.join(vdir, COLD_DIR)
+    return (os.path.join(cdir, stem + ".webp"), os.path.join(cdir, fn),
+            os.path.join(cdir, stem + ".preview.webp"))
+
+def cold_lock_name(hot_path: str) -> str:
+    # .../projects/<slug>/illustrations/<label>/versions/A-3.png → cold-<slug>-<label>
+    Ldir = os.path.dirname(os.path.dirname(hot_path))
+    slug = os.path.basename(os.path.dirname(os.path.dirname(Ldir)))
+    return f"cold-{slug}-{os.path.basename(Ldir)}"
+
+def is_version_file(path: str) -> bool:
+    return path.endswith(".png") and os.path.basename(os.path.dirname(path)) == "versions"
+
+def cold_preview(hot_path: str) -> Optional[str]:
+    """cold로 옮겨진 버전이면 미리보기 경로, 아니면 None"""
+    if not is_version_file(hot_path):
+        return None
+    preview = cold_paths(hot_path)[2]
+    return preview if os.path.exists(preview) else None
+
+def restore_cold(hot_path: str) -> bool:
+    """버전 파일이 versions/ 에 있게 한다. (cold면 되돌림) 있거나 되돌렸으면 True."""
+    if os.path.exists(hot_path):
+        return True
+    if not is_version_file(hot_path):
+        return False
+    webp, png, preview = cold_paths(hot_path)
+    if not (os.path.exists(webp) or os.path.exists(png)):
+        return False
+    with file_lock(cold_lock_name(hot_path)), timed("cold.restore"):
+        if not os.path.exists(hot_path):
+            if os.path.exists(png):
+                os.rename(png, hot_path)
+            elif os.path.exists(webp):
+                with Image.open(webp) as im:
+                    save_pil(im, hot_path)
+            else:
+                return False
+            metrics.inc("cold_restores_total")
+        for p in (webp, png, preview):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+    return True
+
+def compact_version(hot_path: str) -> int:
+    """버전 하나를 cold로 → 줄어든 바이트 수"""
+    webp, png, preview = cold_paths(hot_path)
+    size = os.path.getsize(hot_path)
+    with Image.open(hot_path) as im:
+        im.load()
+        buf = io.BytesIO()
+        im.save(buf, format="WEBP", lossless=True, exact=True, quality=80, method=4)
+        thumb = im.convert("RGBA")
+    thumb.thumbnail((COLD_PREVIEW_SIZE, COLD_PREVIEW_SIZE), Image.LANCZOS, reducing_gap=2.0)
+    pbuf = io.BytesIO()
+    thumb.save(pbuf, format="WEBP", quality=80, method=4)
+    atomic_write(preview, pbuf.getvalue())  # 미리보기 → cold 본 → 원본 삭제 순 (중간에 멈춰도 원본은 남는다)
+    if buf.tell() < size:
+        atomic_write(webp, buf.getvalue())
+        os.remove(hot_path)
+        saved = size - buf.tell()
+    else:
+        os.rename(hot_path, png)
+        saved = 0
+    metrics.inc("cold_compacted_total")
+    return saved - len(pbuf.getvalue())
+
+def compact_label(slug: str, label: str, min_age_sec: float, now: Optional[float] = None) -> Dict[str, int]:
+    Ldir = os.path.join(illustrations_path(slug), label)
+    vdir = os.path.join(Ldir, "versions")
+    out = {"versions": 0, "bytes_saved": 0}
+    if not os.path.isdir(vdir):
+        return out
+    now = now or time.time()
+    with file_lock(f"cold-{slug}-{label}"):
+        selected = read_text(os.path.join(Ldir, "selected.txt")).strip()
+        # 나이는 인덱스의 버전 생성 시각 — 블롭 링크는 inode(mtime/ctime)를 공유하므로 파일 시각은 쓰지 않는다
+        for fn, created in index_version_created(slug, label).items():
+            if fn == selected or now - created < min_age_sec:
+                continue
+            p = os.path.join(vdir, fn)
+            try:
+                out["bytes_saved"] += compact_version(p)
+                out["versions"] += 1
+            except FileNotFoundError:
+                continue  # 이미 cold거나 다른 프로세스가 먼저 옮김/삭제함
+            except Exception:
+                log.exception("cold compaction failed: %s", p)
+    return out
+
+@timed("cold.compact")
+def compact_project(slug: str, min_age_sec: float, now: Optional[float] = None) -> Dict[str, int]:
+    """프로젝트의 오래된 비선택 버전을 cold로 → {"versions": 옮긴 수, "bytes_saved": 줄어든 바이트}"""
+    total = {"versions": 0, "bytes_saved": 0}
+    for row in index_labels(slug):
+        r = compact_label(slug, row["label"], min_age_sec, now)
+        total["versions"] += r["versions"]
+        total["bytes_saved"] += r["bytes_saved"]
+    return total
+
+def compact_all(min_age_sec: float) -> Dict[str, int]:
+    total = {"projects": 0, "versions": 0, "bytes_saved": 0}
+    for slug in os.listdir(PROJECTS_DIR):
+        if not os.path.isdir(project_path(slug)):
+            continue
+        r = compact_project(slug, min_age_sec)
+        total["projects"] += 1
+        total["versions"] += r["versions"]
+        total["bytes_saved"] += r["bytes_saved"]
+    return total
+
+def _cold_compactor_loop():
+    while True:
+        try:
+            with file_lock("cold-compactor"):
+                try:
+                    due = time.time() - os.path.getmtime(COLD_MARKER) >= COLD_COMPACT_INTERVAL_SEC
+                except OSError:
+                    due = True
+                if due:
+                    r = compact_all(COLD_AFTER_DAYS * 86400)
+                    collect_blobs()  # cold로 옮기며 참조가 끊긴 블롭
+                    atomic_write(COLD_MARKER, now_iso().encode("utf-8"))
+                    if r["versions"]:
+                        log.info("cold compaction: %d versions, %d bytes saved", r["versions"], r["bytes_saved"])
+        except Exception:
+            log.exception("cold compaction failed")
+        time.sleep(COLD_COMPACT_INTERVAL_SEC)
+
+def ensure_cold_compactor():
+    global _cold_compactor
+    if COLD_COMPACT_INTERVAL_SEC <= 0 or COLD_AFTER_DAYS <= 0:
+        return
+    with _cold_lock:
+        if _cold_compactor is None:
+            _cold_compactor = threading.Thread(target=_cold_compactor_loop, name="cold-compactor", daemon=True)
+            _cold_compactor.start()
+
+@bp.route("/api/projects/<slug>/compact", methods=["POST"])
+def api_compact_project(slug):
+    """오래된 비선택 버전을 지금 cold로 옮긴다. body: {"min_age_days": 7} (없으면 COLD_AFTER_DAYS)"""
+    if not os.path.isdir(project_path(slug)):
+        return jsonify({"ok": False, "error": "프로젝트가 없습니다."}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        min_age_days = float(data.get("min_age_days", COLD_AFTER_DAYS))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "min_age_days는 숫자여야 합니다."}), 400
+    if min_age_days < 0:
+        return jsonify({"ok": False, "error": "min_age_days는 0 이상이어야 합니다."}), 400
+    return jsonify({"ok": True, **compact_project(slug, min_age_days * 86400)})
+
 # ---------- 파일 서빙 ----------
-@app.route("/files/<path:subpath>")
-def files(subpath):
-    # /files/projects/<slug>/...
+def safe_data_path(subpath: str) -> str:
+    """DATA_DIR 하위 경로로 바꾼다. 벗어나면 abort(403)."""
     safe_root = os.path.abspath(DATA_DIR)
     full = os.path.abspath(os.path.join(DATA_DIR, subpath))
-    if not full.startswith(safe_root):
+    if full != safe_root and not full.startswith(safe_root + os.sep):
         abort(403)
-    if not os.path.exists(full):
+    return full
+
+def resolve_data_path(subpath: str) -> str:
+    """DATA_DIR 하위의 실제 파일 경로. 벗어나거나 없으면 abort. cold 버전은 되돌려서."""
+    full = safe_data_path(subpath)
+    if not restore_cold(full):
         abort(404)
     if os.path.isdir(full):
         abort(404)
-    return send_file(full)
+    return full
+
+# versions/*.png, original.png 은 한 번 쓰면 바뀌지 않는다.
+# 다만 레이블은 삭제 후 재사용될 수 있으므로 ?v= 토큰이 붙은 URL만 immutable로 캐시한다.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+def is_write_once(subpath: str) -> bool:
+    parts = subpath.replace("\\", "/").split("/")
+    return parts[-1] == "original.png" or (len(parts) >= 2 and parts[-2] == "versions")
+
+def strong_etag(full: str, st) -> str:
+    """내용 해시 — 같은 바이트면 경로/프로젝트가 달라도 같은 ETag"""
+    return file_digest(full, st)
+
+def send_cached_file(full: str, etag: str, immutable: bool, mimetype: Optional[str] = None):
+    """ETag/Last-Modified/304/Range 처리 + Cache-Control 정책"""
+    resp = send_file(full, mimetype=mimetype, conditional=True, etag=etag,
+                     last_modified=os.path.getmtime(full))
+    resp.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    return resp
+
+@bp.route("/files/<path:subpath>")
+def files(subpath):
+    # /files/projects/<slug>/...
+    full = resolve_data_path(subpath)
+    immutable = bool(request.args.get("v")) and is_write_once(subpath)
+    return send_cached_file(full, strong_etag(full, os.stat(full)), immutable)
+
+@bp.route("/thumbs/<path:subpath>")
+def thumbs(subpath):
+    # /thumbs/projects/<slug>/...?w=320&fmt=webp → 축소본 (원본 내용 해시 기준 캐시)
+    # cold 버전은 되돌리지 않고 미리보기(가장 큰 썸네일 크기)에서 만든다
+    full = safe_data_path(subpath)
+    full = (not os.path.exists(full) and cold_preview(full)) or resolve_data_path(subpath)
+    size = snap_thumb_size(request.args.get("w", type=int))
+    fmt = (request.args.get("fmt") or "webp").lower()
+    if fmt not in THUMB_FORMATS:
+        abort(400)
+    _, mimetype, ext = THUMB_FORMATS[fmt]
+    # 내용 해시 기준 — 같은 블롭을 가리키는 경로(복제/중복 업로드)는 축소본도 하나
+    key = hashlib.sha1(f"{file_digest(full)}|{size}|{fmt}".encode("utf-8")).hexdigest()
+    cached = thumb_cache.get(key, ext)
+    if cached is None:
+        try:
+            data = make_thumbnail(full, size, fmt)
+        except Exception:
+            abort(415)
+        cached = thumb_cache.put(key, data, ext)
+    immutable = bool(request.args.get("v")) and is_write_once(subpath)
+    return send_cached_file(cached, key, immutable, mimetype=mimetype)
+
+# ---------- 휴지통 ----------
+# 삭제 = DATA_DIR/.trash/<id>/payload 로 이름만 바꾸고(같은 파일시스템 → 즉시) 바로 응답한다.
+# 보관 기간(TRASH_RETENTION_HOURS) 안에는 복구할 수 있고, 지난 항목은 백그라운드 수거기가
+# 초당 TRASH_GC_FILES_PER_SEC개씩만 지워 디스크 I/O를 독차지하지 않게 한다.
+TRASH_DIR = os.path.join(DATA_DIR, ".trash")
+TRASH_RETENTION_SEC = float(os.getenv("TRASH_RETENTION_HOURS", "72")) * 3600
+TRASH_GC_INTERVAL_SEC = float(os.getenv("TRASH_GC_INTERVAL_SEC", "60"))
+TRASH_GC_FILES_PER_SEC = float(os.getenv("TRASH_GC_FILES_PER_SEC", "500"))  # 0이면 제한 없음
+TRASH_GC_CLAIM = ".gc-"  # 수거 중인 항목 (여러 프로세스 중 이름 바꾸기에 성공한 쪽만 지운다)
+
+_trash_collector: Optional[threading.Thread] = None
+_trash_lock = threading.Lock()
+
+def move_to_trash(kind: str, slug: str, src: str, label: str = "", extra: Optional[List[str]] = None) -> str:
+    """src(폴더)를 휴지통으로 옮기고 항목 id를 돌려준다. extra 파일들(채팅 로그 등)은 files/ 아래로."""
+    entry_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    edir = os.path.join(TRASH_DIR, entry_id)
+    ensure_dir(edir)
+    meta = index_project_meta(slug) or {}
+    write_json(os.path.join(edir, "entry.json"), {
+        "id": entry_id, "kind": kind, "slug": slug, "label": label, "name": meta.get("name", slug),
+        "deleted_at": now_iso(), "deleted_ts": time.time(),
+    })
+    os.rename(src, os.path.join(edir, "payload"))
+    for p in extra or []:
+        if os.path.exists(p):
+            ensure_dir(os.path.join(edir, "files"))
+            os.rename(p, os.path.join(edir, "files", os.path.basename(p)))
+    ensure_trash_collector()
+    return entry_id
+
+def trash_entries() -> List[Dict[str, Any]]:
+    out = []
+    if not os.path.isdir(TRASH_DIR):
+        return out
+    for entry_id in os.listdir(TRASH_DIR):
+        if entry_id.startswith("."):
+            continue
+        e = read_json(os.path.join(TRASH_DIR, entry_id, "entry.json"))
+        if not e or not os.path.exists(os.path.join(TRASH_DIR, entry_id, "payload")):
+            continue
+        e["expires_ts"] = e.get("deleted_ts", 0) + TRASH_RETENTION_SEC
+        out.append(e)
+    out.sort(key=lambda e: e.get("deleted_ts", 0), reverse=True)
+    return out
+
+def restore_from_trash(entry_id: str) -> Dict[str, Any]:
+    """휴지통 항목을 원래 자리로. 실패 시 EditError(메시지, 상태 코드)."""
+    edir = os.path.join(TRASH_DIR, os.path.basename(entry_id))
+    e = read_json(os.path.join(edir, "entry.json"))
+    payload = os.path.join(edir, "payload")
+    if not e or entry_id.startswith(".") or not os.path.exists(payload):
+        raise EditError("휴지통 항목이 없습니다.", 404)
+    slug, label = e["slug"], e.get("label", "")
+    with file_lock(f"project-{slug}"):
+        if e["kind"] == "project":
+            if os.path.exists(project_path(slug)) or index_name_taken(e.get("name", slug)):
+                raise EditError("같은 이름의 프로젝트가 이미 있습니다.", 409)
+            dst = project_path(slug)
+        else:
+            if not os.path.isdir(project_path(slug)):
+                raise EditError("프로젝트가 없습니다. 프로젝트를 먼저 복구하세요.", 409)
+            dst = os.path.join(illustrations_path(slug), label)
+            if os.path.exists(dst):
+                raise EditError(f"같은 이름의 삽화({label})가 이미 있습니다.", 409)
+        try:
+            os.rename(payload, dst)
+        except FileNotFoundError:
+            raise EditError("휴지통 항목이 없습니다.", 404)  # 방금 수거됨
+        files_dir = os.path.join(edir, "files")
+        if os.path.isdir(files_dir):
+            ensure_dir(chatlogs_path(slug))
+            for fn in os.listdir(files_dir):
+                os.replace(os.path.join(files_dir, fn), os.path.join(chatlogs_path(slug), fn))
+    shutil.rmtree(edir, ignore_errors=True)
+    index_reload_project(slug)
+    return {"kind": e["kind"], "slug": slug, "label": label}
+
+def _rmtree_throttled(path: str, bucket: "TokenBucket"):
+    for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+        for fn in filenames:
+            bucket.acquire()
+            try:
+                os.remove(os.path.join(dirpath, fn))
+            except OSError:
+                pass
+        try:
+            os.rmdir(dirpath)
+        except OSError:
+            pass
+
+def collect_trash(now: Optional[float] = None) -> int:
+    """보관 기간이 지난 항목을 지운다 → 지운 항목 수. 중단됐던 수거(.gc-*)도 이어서."""
+    if not os.path.isdir(TRASH_DIR):
+        return 0
+    now = now or time.time()
+    bucket = TokenBucket(TRASH_GC_FILES_PER_SEC, int(TRASH_GC_FILES_PER_SEC) or 1)
+    n = 0
+    for name in os.listdir(TRASH_DIR):
+        path = os.path.join(TRASH_DIR, name)
+        if not name.startswith(TRASH_GC_CLAIM):
+            e = read_json(os.path.join(path, "entry.json")) or {}
+            deleted_ts = e.get("deleted_ts") or os.path.getmtime(path)
+            if deleted_ts + TRASH_RETENTION_SEC > now:
+                continue
+            claimed = os.path.join(TRASH_DIR, TRASH_GC_CLAIM + name)
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # 다른 프로세스가 가져갔거나 방금 복구됨
+            path = claimed
+        _rmtree_throttled(path, bucket)
+        n += 1
+    return n
+
+def _trash_collector_loop():
+    while True:
+        try:
+            if collect_trash():
+                collect_blobs()  # 지운 항목이 마지막 참조였던 블롭
+        except Exception:
+            log.exception("trash collection failed")
+        time.sleep(TRASH_GC_INTERVAL_SEC)
+
+def ensure_trash_collector():
+    global _trash_collector
+    with _trash_lock:
+        if _trash_collector is None:
+            _trash_collector = threading.Thread(target=_trash_collector_loop, name="trash-gc", daemon=True)
+            _trash_collector.start()
+
+@bp.route("/api/trash", methods=["GET"])
+def api_trash_list():
+    """휴지통 목록 (?slug= 로 프로젝트별)"""
+    slug = request.args.get("slug")
+    items = [e for e in trash_entries() if not slug or e["slug"] == slug]
+    return jsonify({"ok": True, "retention_hours": TRASH_RETENTION_SEC / 3600, "items": items})
+
+@bp.route("/api/trash/<entry_id>/restore", methods=["POST"])
+def api_trash_restore(entry_id):
+    try:
+        restored = restore_from_trash(entry_id)
+    except EditError as e:
+        return jsonify({"ok": False, "error": e.message}), e.status
+    touch_project(restored["slug"])
+    return jsonify({"ok": True, **restored})
 
 # ---------- 프로젝트 CRUD ----------
-@app.route("/api/projects", methods=["GET"])
+@bp.route("/api/projects", methods=["GET"])
 def api_list_projects():
-    return jsonify({"ok": True, "projects": list_projects()})
-
-@app.route("/api/projects", methods=["POST"])
+    # ?limit=20&offset=40 — limit 생략 시 전체
+    limit = request.args.get("limit", type=int)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    if limit is not None and limit < 0:
+        limit = None
+    return jsonify({"ok": True, "projects": list_projects(limit, offset),
+                    "total": count_projects(), "offset": offset})
+
+@bp.route("/api/projects", methods=["POST"])
 def api_create_project():
     data = request.get_json(force=True)
     name = (data.get("name") or "").strip()
@@ -190,13 +1598,8 @@ def api_create_project():
         return jsonify({"ok": False, "error": "동일한 이름의 프로젝트가 이미 존재합니다."}), 409
 
     # 2) 메타 이름이 같은 프로젝트가 있는지도(대소문자 무시) 거부
-    for existing in os.listdir(PROJECTS_DIR):
-        pdir = os.path.join(PROJECTS_DIR, existing)
-        if not os.path.isdir(pdir): 
-            continue
-        meta = read_json(os.path.join(pdir, "project.json"), {})
-        if (meta.get("name","").strip().lower() == name.lower()):
-            return jsonify({"ok": False, "error": "동일한 이름의 프로젝트가 이미 존재합니다."}), 409
+    if index_name_taken(name):
+        return jsonify({"ok": False, "error": "동일한 이름의 프로젝트가 이미 존재합니다."}), 409
 
     # 생성
     ensure_dir(base)
@@ -208,10 +1611,11 @@ def api_create_project():
     write_json(os.path.join(base, "project.json"), meta)
     ensure_dir(illustrations_path(slug))
     ensure_dir(chatlogs_path(slug))
+    index_put_project(slug, meta)
     return jsonify({"ok": True, "slug": slug})
 
 
-@app.route("/api/projects/<slug>/rename", methods=["POST"])
+@bp.route("/api/projects/<slug>/rename", methods=["POST"])
 def api_rename_project(slug):
     data = request.get_json(force=True)
     new_name = (data.get("name") or "").strip()
@@ -223,77 +1627,255 @@ def api_rename_project(slug):
         return jsonify({"ok": False, "error": "프로젝트가 없습니다."}), 404
 
     # 다른 프로젝트와 이름 중복 체크
-    for existing in os.listdir(PROJECTS_DIR):
-        if existing == slug:
-            continue
-        pdir = os.path.join(PROJECTS_DIR, existing)
-        if not os.path.isdir(pdir):
-            continue
-        meta2 = read_json(os.path.join(pdir, "project.json"), {})
-        if meta2.get("name","").strip().lower() == new_name.lower():
-            return jsonify({"ok": False, "error": "동일한 이름의 프로젝트가 이미 존재합니다."}), 409
-
-    meta_p = os.path.join(base, "project.json")
-    meta = read_json(meta_p, {})
-    meta["name"] = new_name
-    meta["updated_at"] = now_iso()
-    write_json(meta_p, meta)
+    if index_name_taken(new_name, exclude_slug=slug):
+        return jsonify({"ok": False, "error": "동일한 이름의 프로젝트가 이미 존재합니다."}), 409
+
+    update_project_meta(slug, name=new_name)
     return jsonify({"ok": True})
 
 
-@app.route("/api/projects/<slug>", methods=["DELETE"])
+@bp.route("/api/projects/<slug>", methods=["DELETE"])
 def api_delete_project(slug):
     base = project_path(slug)
     if not os.path.isdir(base):
         return jsonify({"ok": False, "error": "프로젝트가 없습니다."}), 404
-    shutil.rmtree(base)
-    return jsonify({"ok": True})
+    # 휴지통으로 옮기기만 — 실제 삭제는 보관 기간이 지난 뒤 백그라운드에서
+    trash_id = move_to_trash("project", slug, base)
+    index_delete_project(slug)
+    return jsonify({"ok": True, "trash_id": trash_id})
+
+def label_item(slug: str, row, vfiles: List[str]) -> Dict[str, Any]:
+    """인덱스의 labels 행 → 상세 응답의 삽화 항목"""
+    label = row["label"]
+    urls = label_urls(slug, row)
+    return {
+        "label": label,
+        "pending": not row["has_original"] and ingest_pending(slug, label),
+        "failed": not row["has_original"] and ingest_failed(slug, label),
+        "original_url": urls["original_url"],
+        "original_thumb_url": thumb_url(urls["original_url"]),
+        "selected": urls["selected"],
+        "selected_url": urls["selected_url"],
+        "selected_thumb_url": thumb_url(urls["selected_url"]),
+        "version_files": vfiles,
+        "version_count": len(vfiles),
+        "asset_v": row["asset_v"],
+        "chat_log_url": f"/files/projects/{slug}/chat_logs/{label}.jsonl" if row["has_chat"] else "",
+        "chat_url": f"/api/projects/{slug}/illustrations/{label}/chat" if row["has_chat"] else ""
+    }
+
+def detail_etag(rev: int) -> str:
+    return f"rev-{rev}"
 
-@app.route("/api/projects/<slug>", methods=["GET"])
+@bp.route("/api/projects/<slug>", methods=["GET"])
 def api_project_detail(slug):
+    """
+    프로젝트 상세. 응답의 rev는 프로젝트 리비전(바뀔 때마다 증가).
+      - ETag = rev → If-None-Match가 같으면 304
+      - ?since=<rev> → 그 뒤로 바뀐 삽화만 (full=false). 바뀐 삽화의 version_files는 새로 추가된 것만,
+        version_count는 전체 개수. 삭제된 삽화는 removed. since가 너무 오래됐으면(인덱스 재생성 등) 전체 응답(full=true)
+    """
     base = project_path(slug)
     if not os.path.isdir(base):
         return jsonify({"ok": False, "error": "프로젝트가 없습니다."}), 404
-    meta = read_json(os.path.join(base, "project.json"), {})
-    illus_dir = illustrations_path(slug)
-    items = []
-    if os.path.isdir(illus_dir):
-        for label in sorted(os.listdir(illus_dir)):
-            Ldir = os.path.join(illus_dir, label)
-            if not os.path.isdir(Ldir): continue
-            sel = read_text(os.path.join(Ldir, "selected.txt")).strip()
-            versions = []
-            ver_dir = os.path.join(Ldir, "versions")
-            if os.path.isdir(ver_dir):
-                for fn in sorted(os.listdir(ver_dir)):
-                    if re.match(rf"{label}-\d+\.png$", fn):
-                        versions.append(fn)
-
-            # ★ selected, selected_url 일관 처리
-            original_url = f"/files/projects/{slug}/illustrations/{label}/original.png" if os.path.exists(os.path.join(Ldir,"original.png")) else ""
-            if not sel:
-                selected = "__ORIGINAL__"
-                selected_url = original_url
-            elif sel == "__ORIGINAL__":
-                selected = "__ORIGINAL__"
-                selected_url = original_url
-            else:
-                selected = sel
-                selected_url = f"/files/projects/{slug}/illustrations/{label}/versions/{sel}"
-
-            items.append({
-                "label": label,
-                "original_url": original_url,
-                "selected": selected,
-                "selected_url": selected_url,
-                "version_files": versions,
-                "version_count": len(versions),
-                "chat_log_url": f"/files/projects/{slug}/chat_logs/{label}.txt" if os.path.exists(os.path.join(chatlogs_path(slug), f"{label}.txt")) else ""
-            })
-    return jsonify({"ok": True, "meta": meta, "illustrations": items})
+    revs = index_project_rev(slug)
+    rev, floor = (revs["rev"], revs["rev_floor"]) if revs else (0, 0)
+    since = request.args.get("since", type=int)
+    meta = index_project_meta(slug) or read_json(os.path.join(base, "project.json"), {})
+
+    if since is not None and revs and floor <= since <= rev:
+        changed, removed = index_labels_since(slug, since)
+        added = index_versions(slug, since=since)
+        items = []
+        for row in changed:
+            item = label_item(slug, row, added.get(row["label"], []))
+            item["version_count"] = index_version_count(slug, row["label"])
+            items.append(item)
+        return jsonify({"ok": True, "rev": rev, "since": since, "full": False, "meta": meta,
+                        "illustrations": items, "removed": removed})
+
+    etag = detail_etag(rev)
+    if revs and request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        return resp
+    versions = index_versions(slug)
+    items = [label_item(slug, row, versions.get(row["label"], [])) for row in index_labels(slug)]
+    resp = jsonify({"ok": True, "rev": rev, "full": True, "meta": meta, "illustrations": items})
+    if revs:
+        resp.set_etag(etag)
+    resp.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+    return resp
+
+@bp.route("/api/projects/<slug>/illustrations/<label>", methods=["GET"])
+def api_illustration_detail(slug, label):
+    """삽화 하나의 상세 (상세 응답의 삽화 항목과 같은 모양)"""
+    row = db().execute("SELECT * FROM labels WHERE slug=? AND label=?", (slug, label)).fetchone()
+    if row is None:
+        return jsonify({"ok": False, "error": "삽화가 없습니다."}), 404
+    revs = index_project_rev(slug)
+    vfiles = index_versions(slug, label=label).get(label, [])
+    return jsonify({"ok": True, "rev": revs["rev"] if revs else 0, "illustration": label_item(slug, row, vfiles)})
+
+# ---------- 업로드 처리 ----------
+# 요청 스레드는 업로드를 삽화 폴더에 풀어두고(spool) 헤더만 검사한 뒤 레이블을 예약해 바로 응답한다.
+# 디코드 + PNG 인코딩은 프로세스 풀에서 — 한 번에 메모리에 올라가는 이미지는 UPLOAD_WORKERS 장뿐.
+# 풀은 spawn으로 만든다: 스레드가 도는 서버에서 fork하면 복사된 잠금 때문에 자식이 멈출 수 있다.
+# 자식은 임시 파일에 인코딩만 하고(upload_worker), 블롭 게시/인덱스는 부모가 한다.
+# 한 업로드는 한 프로세스만 처리한다 — .upload.owner 파일 잠금(flock)을 쥔 쪽. 프로세스가 죽으면 잠금도
+# 풀리고, 남은 .upload는 다음 시작 때(recover_pending_uploads) 다시 처리한다.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", str(min(4, os.cpu_count() or 1))))
+UPLOAD_SPOOL = ".upload"  # 삽화 폴더 안의 처리 대기 원본
+UPLOAD_OWNER = ".upload.owner"  # 처리 중인 프로세스가 잠그고 있는 파일
+UPLOAD_FAILED = ".upload.failed"  # 변환 실패한 원본 (삽화는 남기고 실패로 표시)
+SPOOL_DIR = os.path.join(DATA_DIR, ".spool")  # 검사 전 임시 보관 (같은 파일시스템 → rename으로 이동)
+
+_ingest_pool: Optional[ProcessPoolExecutor] = None
+_ingesting: Dict[tuple, Any] = {}  # 처리 중인 (slug, label) → 잠근 .upload.owner 파일
+_ingest_lock = threading.Lock()
+
+@timed("upload.probe")
+def probe_upload(path: str) -> Optional[str]:
+    """헤더만 읽어 열 수 있는 이미지인지, 해상도 제한 안인지 확인. 문제가 있으면 에러 메시지."""
+    try:
+        with Image.open(path) as im:
+            w, h = im.size
+    except Image.DecompressionBombError:
+        w, h = MAX_IMAGE_PIXELS, 2
+    except Exception:
+        return "이미지 파일을 열 수 없습니다."
+    if w * h > MAX_IMAGE_PIXELS:
+        return f"이미지 해상도가 너무 큽니다. (최대 {MAX_IMAGE_PIXELS:,} 픽셀)"
+    return None
+
+def reserve_label(illus_dir: str, label_cursor: List[str]) -> str:
+    """다음 레이블 폴더를 만들어 예약 — mkdir 성공 = 예약 (동시 업로드끼리 같은 레이블을 잡지 않게)"""
+    while True:
+        L = next_label(label_cursor)
+        label_cursor.append(L)
+        try:
+            os.mkdir(os.path.join(illus_dir, L))
+            return L
+        except FileExistsError:
+            continue
+
+def ingest_pending(slug: str, label: str) -> bool:
+    """업로드 처리 대기/처리 중인지 (읽기만 — 제출은 업로드 요청과 recover_pending_uploads에서)"""
+    return os.path.exists(os.path.join(illustrations_path(slug), label, UPLOAD_SPOOL))
+
+def ingest_failed(slug: str, label: str) -> bool:
+    return os.path.exists(os.path.join(illustrations_path(slug), label, UPLOAD_FAILED))
+
+def claim_ingest(slug: str, label: str) -> bool:
+    """이 업로드를 이 프로세스가 맡는다. 다른 스레드/프로세스가 맡고 있거나 처리할 것이 없으면 False."""
+    Ldir = os.path.join(illustrations_path(slug), label)
+    with _ingest_lock:
+        if (slug, label) in _ingesting:
+            return False
+        try:
+            owner = open(os.path.join(Ldir, UPLOAD_OWNER), "a")
+        except OSError:
+            return False  # 삽화가 삭제됨
+        if fcntl is not None:
+            try:
+                fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                owner.close()
+                return False  # 살아 있는 다른 프로세스가 처리 중
+        # 잠그는 사이 다른 프로세스가 끝냈을 수 있다 (.upload를 먼저 지우고 잠금을 푼다)
+        if not os.path.exists(os.path.join(Ldir, UPLOAD_SPOOL)):
+            try:
+                os.remove(owner.name)
+            except OSError:
+                pass
+            owner.close()
+            return False
+        _ingesting[(slug, label)] = owner
+    return True
+
+def release_ingest(slug: str, label: str):
+    with _ingest_lock:
+        owner = _ingesting.pop((slug, label), None)
+    if owner is None:
+        return
+    try:
+        os.remove(owner.name)
+    except OSError:
+        pass
+    owner.close()  # 잠금 해제
+
+def submit_ingest(slug: str, label: str):
+    global _ingest_pool
+    if not claim_ingest(slug, label):
+        return
+    Ldir = os.path.join(illustrations_path(slug), label)
+    fd, tmp = tempfile.mkstemp(dir=Ldir, prefix=".original-", suffix=".tmp")  # 이번 시도만의 임시 파일
+    os.close(fd)
+    args = (os.path.join(Ldir, UPLOAD_SPOOL), tmp, PNG_COMPRESS_LEVEL, MAX_IMAGE_PIXELS)
+    fut = None
+    with _ingest_lock:
+        for _ in range(2):
+            if _ingest_pool is None:
+                _ingest_pool = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+            try:
+                fut = _ingest_pool.submit(encode_original, *args)
+                break
+            except BrokenProcessPool:  # 워커가 죽었으면(OOM 등) 풀을 새로 만든다
+                _ingest_pool = None
+    if fut is None:
+        fail = Future()
+        fail.set_exception(BrokenProcessPool("upload pool unavailable"))
+        finish_ingest(slug, label, tmp, fail)
+        return
+    started = time.monotonic()
+    fut.add_done_callback(lambda f: finish_ingest(slug, label, tmp, f, started))
+
+def finish_ingest(slug: str, label: str, tmp: str, fut, started: float = 0.0):
+    """(부모 프로세스) 인코딩 결과를 블롭으로 게시하고 original.png로 링크. 실패하면 삽화는 두고 실패로 표시."""
+    Ldir = os.path.join(illustrations_path(slug), label)
+    try:
+        err = fut.exception()
+        if started:
+            metrics.observe("upload_encode_seconds", time.monotonic() - started,
+                            result="error" if err is not None else "ok")
+        if not os.path.isdir(Ldir):
+            return  # 처리 중에 삽화/프로젝트가 삭제됨
+        if err is None:
+            try:
+                publish_file(tmp, os.path.join(Ldir, "original.png"))
+            except OSError as e:
+                err = e
+        if err is not None:
+            log.warning("업로드 처리 실패 %s/%s: %s", slug, label, err)
+            os.replace(os.path.join(Ldir, UPLOAD_SPOOL), os.path.join(Ldir, UPLOAD_FAILED))
+        else:
+            os.remove(os.path.join(Ldir, UPLOAD_SPOOL))
+            append_chat(slug, label, "INIT", text=f"Uploaded original for {label}")
+            index_put_label(slug, label, has_original=True, selected="__ORIGINAL__", has_chat=True,
+                            asset_v=label_asset_v(Ldir))
+        touch_project(slug)
+    except Exception:
+        log.exception("업로드 마무리 실패 %s/%s", slug, label)
+    finally:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        release_ingest(slug, label)
+
+def recover_pending_uploads() -> int:
+    """처리하던 프로세스가 죽어 남은 업로드를 다시 제출한다 (시작 시). 다른 워커가 처리 중인 것은 건너뛴다."""
+    n = 0
+    for row in db().execute("SELECT slug, label FROM labels WHERE has_original=0").fetchall():
+        if ingest_pending(row["slug"], row["label"]):
+            submit_ingest(row["slug"], row["label"])
+            n += 1
+    return n
 
 # ---------- 삽화 업로드/삭제/다운로드 ----------
-@app.route("/api/projects/<slug>/illustrations", methods=["POST"])
+@bp.route("/api/projects/<slug>/illustrations", methods=["POST"])
 def api_add_illustrations(slug):
     base = project_path(slug)
     if not os.path.isdir(base):
@@ -303,82 +1885,656 @@ def api_add_illustrations(slug):
         return jsonify({"ok": False, "error": "이미지 파일이 없습니다."}), 400
 
     illus_dir = illustrations_path(slug)
-    existing = sorted([d for d in os.listdir(illus_dir) if os.path.isdir(os.path.join(illus_dir,d))])
-    created = []
-    label_cursor = existing[:]  # 복사
-    for f in files:
-        # 새 레이블 결정
-        L = next_label(label_cursor)
-        label_cursor.append(L)
-        Ldir = os.path.join(illus_dir, L)
-        ensure_dir(Ldir)
-        # 원본 저장 (png로 통일)
-        img = Image.open(f.stream).convert("RGBA")
-        img.save(os.path.join(Ldir, "original.png"), format="PNG")
-        # 버전 폴더
-        ensure_dir(os.path.join(Ldir, "versions"))
-        # ★ 기본 최종 선택 = 원본
-        write_text(os.path.join(Ldir, "selected.txt"), "__ORIGINAL__")
-        # 채팅 로그 파일 생성
-        ensure_dir(chatlogs_path(slug))
-        append_text(os.path.join(chatlogs_path(slug), f"{L}.txt"),
-                    f"[{now_iso()}] [INIT] Uploaded original for {L}")
-        created.append(L)
-
-    # updated_at
-    meta_p = os.path.join(base, "project.json")
-    meta = read_json(meta_p, {})
-    meta["updated_at"] = now_iso()
-    write_json(meta_p, meta)
-
-    return jsonify({"ok": True, "labels": created})
-
-@app.route("/api/projects/<slug>/illustrations/<label>", methods=["DELETE"])
+    ensure_dir(illus_dir)
+    # 1) 디스크에 풀어두고 헤더 검사 — 하나라도 문제가 있으면 아무것도 만들지 않는다
+    ensure_dir(SPOOL_DIR)
+    spool_dir = tempfile.mkdtemp(dir=SPOOL_DIR)
+    try:
+        spooled = []
+        for i, f in enumerate(files):
+            p = os.path.join(spool_dir, str(i))
+            f.save(p)
+            err = probe_upload(p)
+            if err:
+                return jsonify({"ok": False, "error": f"{f.filename}: {err}"}), 400
+            spooled.append(p)
+
+        existing = sorted([d for d in os.listdir(illus_dir)
+                           if not d.startswith(".") and os.path.isdir(os.path.join(illus_dir, d))])
+        created = []
+        label_cursor = existing[:]  # 복사
+        for p in spooled:
+            L = reserve_label(illus_dir, label_cursor)
+            Ldir = os.path.join(illus_dir, L)
+            asset_v = label_asset_v(Ldir)  # 이 레이블 인스턴스의 토큰
+            # 버전 폴더
+            ensure_dir(os.path.join(Ldir, "versions"))
+            # ★ 기본 최종 선택 = 원본
+            write_text(os.path.join(Ldir, "selected.txt"), "__ORIGINAL__")
+            os.replace(p, os.path.join(Ldir, UPLOAD_SPOOL))
+            index_put_label(slug, L, has_original=False, selected="__ORIGINAL__", has_chat=False, asset_v=asset_v)
+            created.append(L)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    # 2) 원본 PNG 인코딩은 백그라운드 — 끝나면 채팅 INIT + 인덱스 갱신
+    for L in created:
+        submit_ingest(slug, L)
+    touch_project(slug)
+
+    return jsonify({"ok": True, "labels": created, "pending": created})
+
+@bp.route("/api/projects/<slug>/illustrations/<label>", methods=["DELETE"])
 def api_delete_illustration(slug, label):
     Ldir = os.path.join(illustrations_path(slug), label)
     if not os.path.isdir(Ldir):
         return jsonify({"ok": False, "error": "삽화가 없습니다."}), 404
-    # 경고/확인은 프론트에서 alert 처리. 서버는 바로 삭제
-    shutil.rmtree(Ldir)
-    # 로그도 삭제
-    log_p = os.path.join(chatlogs_path(slug), f"{label}.txt")
-    if os.path.exists(log_p):
-        os.remove(log_p)
+    # 경고/확인은 프론트에서 alert 처리. 서버는 휴지통으로 옮김 (로그도 같이)
+    trash_id = move_to_trash("illustration", slug, Ldir, label=label,
+                             extra=[chat_log_path(slug, label), os.path.join(chatlogs_path(slug), f"{label}.txt")])
+    index_delete_label(slug, label)
     # updated_at
-    meta_p = os.path.join(project_path(slug), "project.json")
-    meta = read_json(meta_p, {})
-    meta["updated_at"] = now_iso()
-    write_json(meta_p, meta)
-    return jsonify({"ok": True})
+    touch_project(slug)
+    return jsonify({"ok": True, "trash_id": trash_id})
+
+# ---------- 채팅 로그 조회 ----------
+@bp.route("/api/projects/<slug>/illustrations/<label>/chat", methods=["GET"])
+def api_chat_log(slug, label):
+    """
+    query:
+      - since: 이 seq 이후 항목만 (기본 0 = 처음부터)
+      - limit: 최대 개수 (기본 200)
+      - version: "A-3.png" | "A-3" — 해당 버전을 만든 요청(USER)부터 읽기
+    """
+    if not os.path.isdir(os.path.join(illustrations_path(slug), label)):
+        return jsonify({"ok": False, "error": "삽화가 없습니다."}), 404
+    open_chat_log(slug, label)
+    since = max(request.args.get("since", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 200, type=int), 1), CHAT_PAGE_MAX)
+    version = (request.args.get("version") or "").strip()
+    if version:
+        seq = chat_seq_for_version(slug, label, version)
+        if seq is None:
+            return jsonify({"ok": False, "error": "버전 기록이 없습니다."}), 404
+        since = seq - 1
+    entries = read_chat(slug, label, since, limit + 1)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return jsonify({"ok": True, "entries": entries, "has_more": has_more,
+                    "next_since": entries[-1]["seq"] if entries else since})
+
+# ---------- ZIP 스트리밍 ----------
+ZIP_CHUNK = 256 * 1024
+
+def _dos_datetime(ts: float):
+    d = datetime.datetime.fromtimestamp(ts)
+    if d.year < 1980:
+        d = datetime.datetime(1980, 1, 1)
+    return ((d.year - 1980) << 9) | (d.month << 5) | d.day, (d.hour << 11) | (d.minute << 5) | (d.second // 2)
+
+# ZIP64로 넘어가는 경계 (테스트에서 줄여 ZIP64 경로를 확인한다)
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+
+class StoredZipStream:
+    """
+    (파일 경로, 압축 안의 이름) 목록을 ZIP_STORED 아카이브로 조각조각 흘려보낸다.
+    PNG는 이미 압축되어 있어 deflate는 CPU만 쓰고 크기는 거의 줄지 않는다.
+    아카이브 전체를 메모리에 올리지 않으며, 전체 크기를 미리 계산해 Content-Length를 줄 수 있다.
+    CRC는 보내면서 계산해 파일 뒤 데이터 디스크립터(플래그 bit 3)에 적는다 — 파일은 한 번만 읽는다.
+    4GB 또는 65535개를 넘는 부분은 ZIP64 레코드로 적는다.
+    """
+
+    def __init__(self, entries: List[tuple]):
+        self.entries = []
+        for src, arcname in entries:
+            try:
+                st = os.stat(src)
+            except OSError:
+                continue
+            self.entries.append((src, arcname.encode("utf-8"), st.st_size, st.st_mtime))
+        self.size = sum(len(chunk) if isinstance(chunk, bytes) else chunk for chunk in self._records(None))
+
+    @staticmethod
+    def _local(name, flags, tm, date, big):
+        if big:  # 크기는 디스크립터(8바이트)에, 헤더에는 ZIP64 표시만
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            return struct.pack("<IHHHHHIIIHH", 0x04034b50, 45, flags, 0, tm, date,
+                               0, 0xFFFFFFFF, 0xFFFFFFFF, len(name), len(extra)) + name + extra
+        return struct.pack("<IHHHHHIIIHH", 0x04034b50, 20, flags, 0, tm, date,
+                           0, 0, 0, len(name), 0) + name
+
+    @staticmethod
+    def _central(name, flags, tm, date, crc, size, offset):
+        if size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT:
+            extra = struct.pack("<HHQQQ", 0x0001, 24, size, size, offset)
+            return struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, 45, 45, flags, 0, tm, date,
+                               crc, 0xFFFFFFFF, 0xFFFFFFFF, len(name), len(extra), 0, 0, 0, 0,
+                               0xFFFFFFFF) + name + extra
+        return struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, 20, 20, flags, 0, tm, date,
+                           crc, size, size, len(name), 0, 0, 0, 0, 0, offset) + name
+
+    @staticmethod
+    def _end(count, cd_size, cd_offset):
+        if count < ZIP_MAX_ENTRIES and cd_size < ZIP64_LIMIT and cd_offset < ZIP64_LIMIT:
+            return struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, count, count, cd_size, cd_offset, 0)
+        end64 = struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset)
+        locator = struct.pack("<IIQI", 0x07064b50, 0, cd_offset + cd_size, 1)
+        return end64 + locator + struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, 0xFFFF, 0xFFFF,
+                                             0xFFFFFFFF, 0xFFFFFFFF, 0)
+
+    def _records(self, read):
+        """read가 None이면 본문 자리에 길이(int)만 — size 계산과 실제 전송이 같은 배치를 쓴다"""
+        offset = 0
+        central = []
+        for src, name, size, mtime in self.entries:
+            date, tm = _dos_datetime(mtime)
+            flags = 0x08 | (0x800 if not name.isascii() else 0)  # 데이터 디스크립터, UTF-8 파일명
+            big = size >= ZIP64_LIMIT
+            header = self._local(name, flags, tm, date, big)
+            yield header
+            if read is None:
+                crc = 0
+                yield size
+            else:
+                crc = yield from read(src, size)
+            if big:
+                yield struct.pack("<IIQQ", 0x08074b50, crc, size, size)
+            else:
+                yield struct.pack("<IIII", 0x08074b50, crc, size, size)
+            central.append(self._central(name, flags, tm, date, crc, size, offset))
+            offset += len(header) + size + (24 if big else 16)
+        cd = b"".join(central)
+        yield cd
+        yield self._end(len(self.entries), len(cd), offset)
+
+    @staticmethod
+    def _read(src, size):
+        crc, left = 0, size
+        with open(src, "rb") as f:
+            while left > 0:
+                chunk = f.read(min(ZIP_CHUNK, left))
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                left -= len(chunk)
+                yield chunk
+        if left:
+            # 스트리밍 도중 파일이 줄어들었다 — 길이가 어긋난 아카이브를 보내지 않고 끊는다
+            raise IOError(f"{src} changed while streaming")
+        return crc
+
+    def __iter__(self):
+        return self._records(self._read)
+
+def content_disposition(download_name: str, fallback: str = "download.zip") -> str:
+    ascii_name = unicodedata.normalize("NFKD", download_name).encode("ascii", "ignore").decode("ascii")
+    stem = ascii_name.rpartition(".")[0] if "." in ascii_name else ascii_name
+    if not stem.strip(" ._-"):
+        ascii_name = fallback  # 한글만 있는 이름 → " .zip"이 아니라 기본 이름
+    ascii_name = ascii_name.replace('"', "").replace("\\", "")
+    return f'attachment; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(download_name)}'
+
+def zip_response(entries: List[tuple], download_name: str) -> Response:
+    stream = StoredZipStream(entries)
+    resp = Response(iter(stream), mimetype="application/zip", direct_passthrough=True)
+    resp.headers["Content-Length"] = str(stream.size)
+    resp.headers["Content-Disposition"] = content_disposition(download_name)
+    return resp
+
+def selected_files(slug: str) -> List[tuple]:
+    """삽화별 최종본: (label, 파일 경로, 선택 값) — 라벨 순"""
+    out = []
+    illus_dir = illustrations_path(slug)
+    for row in index_labels(slug):
+        label, sel = row["label"], row["selected"]
+        if not row["has_original"]:
+            continue  # 업로드 처리 중
+        if not sel or sel == "__ORIGINAL__":
+            src = os.path.join(illus_dir, label, "original.png")
+        else:
+            src = os.path.join(illus_dir, label, "versions", sel)
+            restore_cold(src)  # 선택 직후 정리되었거나 예전 데이터
+        out.append((label, src, sel))
+    return out
 
-@app.route("/api/projects/<slug>/download_selected", methods=["GET"])
+@bp.route("/api/projects/<slug>/download_selected", methods=["GET"])
 def api_download_selected(slug):
     base = project_path(slug)
     if not os.path.isdir(base):
         return jsonify({"ok": False, "error": "프로젝트가 없습니다."}), 404
 
-    mem = io.BytesIO()
-    with zipfile.ZipFile(mem, "w", zipfile.ZIP_DEFLATED) as zf:
-        illus_dir = illustrations_path(slug)
-        if os.path.isdir(illus_dir):
-            for label in sorted(os.listdir(illus_dir)):
-                Ldir = os.path.join(illus_dir, label)
-                if not os.path.isdir(Ldir): continue
-                sel = read_text(os.path.join(Ldir, "selected.txt")).strip()
-                if not sel or sel == "__ORIGINAL__":
-                    src = os.path.join(Ldir, "original.png")
-                    arcname = f"{label}.png"
+    entries = []
+    for label, src, sel in selected_files(slug):
+        if not sel or sel == "__ORIGINAL__":
+            arcname = f"{label}.png"
+        else:
+            arcname = sel  # 또는 f"{label}.png"로 통일하려면 변경
+        entries.append((src, arcname))
+    return zip_response(entries, f"{slug}_selected.zip")
+
+# ---------- 프로젝트 복제 / 내보내기 / 가져오기 ----------
+# 복제: 이미지(png/webp)는 하드링크(블롭 공유), 제자리에서 바뀌는 텍스트(채팅 로그/selected.txt/project.json)만 복사.
+# 내보내기: 프로젝트 폴더 전체(원본/모든 버전/cold/채팅 로그/선택/project.json)를 tar로 조각조각 흘려보낸다.
+#   since=<프로젝트 rev>이면 인덱스 기준으로 그 뒤 바뀐 파일만. 맨 앞 export.json에 현재 삽화 목록이 있어
+#   받는 쪽은 목록에 없는 삽화를 휴지통으로 옮긴다. 다음 since는 export.json의 rev.
+# 가져오기: 요청 본문(tar, gz 가능)을 앞에서부터 읽으며 파일마다 바로 디스크로(이미지는 블롭으로).
+EXPORT_MANIFEST = "export.json"
+EXPORT_FORMAT = 1
+LINKABLE_EXTS = (".png", ".webp")  # 한 번 쓰면 바뀌지 않는 파일 — 링크로 공유
+IMPORT_ROOTS = ("project.json", "illustrations/", "chat_logs/")
+
+def upload_unfinished(label_dir: str) -> bool:
+    """업로드 처리 중/실패한 삽화 — 원본이 없다"""
+    return any(os.path.exists(os.path.join(label_dir, m)) for m in (UPLOAD_SPOOL, UPLOAD_FAILED))
+
+def project_files(slug: str):
+    """(절대 경로, 프로젝트 기준 상대 경로) — 처리 대기 업로드/임시 파일 제외"""
+    base = project_path(slug)
+    illus_dir = illustrations_path(slug)
+    for dirpath, dirnames, fns in os.walk(base):
+        if dirpath == illus_dir:
+            dirnames[:] = [d for d in dirnames if not upload_unfinished(os.path.join(dirpath, d))]
+        dirnames.sort()
+        for fn in sorted(fns):
+            if fn.endswith(".tmp"):
+                continue
+            p = os.path.join(dirpath, fn)
+            yield p, os.path.relpath(p, base).replace(os.sep, "/")
+
+def project_delta_files(slug: str, since: int):
+    """프로젝트 rev since 뒤로 바뀐 파일 (절대 경로, 상대 경로) — project.json, 바뀐 삽화의
+    선택/캐시 토큰/채팅 로그, 그 뒤 생긴 원본, 그 뒤 만든 버전(cold면 cold 파일).
+    파일 시각은 보지 않는다. (블롭 링크는 inode를 공유해 다른 프로젝트의 링크/해제에도 바뀐다)"""
+    base = project_path(slug)
+    changed, _ = index_labels_since(slug, since)
+    added = index_versions(slug, since=since)
+    paths = [os.path.join(base, "project.json")]
+    for row in changed:
+        label = row["label"]
+        Ldir = os.path.join(illustrations_path(slug), label)
+        if upload_unfinished(Ldir):
+            continue
+        paths += [os.path.join(Ldir, "selected.txt"), os.path.join(Ldir, LABEL_TOKEN), chat_log_path(slug, label)]
+        if row["original_rev"] > since:
+            paths.append(os.path.join(Ldir, "original.png"))
+        for fn in added.get(label, []):
+            hot = os.path.join(Ldir, "versions", fn)
+            paths += [hot] if os.path.exists(hot) else list(cold_paths(hot))
+    for p in paths:
+        if os.path.exists(p):
+            yield p, os.path.relpath(p, base).replace(os.sep, "/")
+
+def rewrite_chat_paths(path: str, old_slug: str, new_slug: str):
+    """채팅 로그의 base/out 경로(/projects/<old>/...)를 새 slug로 — 복제/가져오기 뒤"""
+    if old_slug == new_slug:
+        return
+    old_prefix, new_prefix = f"/projects/{old_slug}/", f"/projects/{new_slug}/"
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, open(path, "rb") as f:
+            for raw in f:
+                if raw.strip():
+                    e = json.loads(raw)
+                    for key in ("base", "out"):
+                        if isinstance(e.get(key), str) and e[key].startswith(old_prefix):
+                            e[key] = new_prefix + e[key][len(old_prefix):]
+                    raw = (json.dumps(e, ensure_ascii=False) + "\n").encode("utf-8")
+                out.write(raw)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def rewrite_project_chat_paths(base: str, old_slug: str, new_slug: str, only: Optional[set] = None):
+    cdir = os.path.join(base, "chat_logs")
+    if not os.path.isdir(cdir):
+        return
+    for fn in os.listdir(cdir):
+        if fn.endswith(".jsonl") and (only is None or fn in only):
+            rewrite_chat_paths(os.path.join(cdir, fn), old_slug, new_slug)
+
+def claim_project_slug(name: str) -> str:
+    """새 프로젝트 이름 → slug. 이미 있으면 EditError(409)"""
+    slug = slugify(name)
+    if os.path.isdir(project_path(slug)) or index_name_taken(name):
+        raise EditError("동일한 이름의 프로젝트가 이미 존재합니다.", 409)
+    return slug
+
+def finish_new_project(stage: str, slug: str, src_slug: str, meta: Dict[str, Any]):
+    """조립한 폴더(stage)를 새 프로젝트로 게시: 채팅 경로 교체 → project.json → rename → 인덱스"""
+    rewrite_project_chat_paths(stage, src_slug, slug)
+    ensure_dir(os.path.join(stage, "illustrations"))
+    ensure_dir(os.path.join(stage, "chat_logs"))
+    write_json(os.path.join(stage, "project.json"), meta)
+    try:
+        os.rename(stage, project_path(slug))
+    except OSError:
+        raise EditError("동일한 이름의 프로젝트가 이미 존재합니다.", 409)  # 그 사이 같은 이름으로 생성됨
+    try:
+        index_reload_project(slug)
+    except Exception:
+        os.rename(project_path(slug), stage)  # 게시 취소 — stage는 호출한 쪽이 지운다
+        index_delete_project(slug)
+        raise
+
+def link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except (FileExistsError, FileNotFoundError):
+        raise
+    except OSError:
+        shutil.copy2(src, dst)  # 하드링크를 못 쓰는 파일시스템
+
+@timed("project.fork")
+def fork_project(src_slug: str, name: str) -> str:
+    """프로젝트 복제 → 새 slug. 이미지 바이트는 복사하지 않는다."""
+    slug = claim_project_slug(name)
+    ensure_dir(SPOOL_DIR)
+    stage = tempfile.mkdtemp(dir=SPOOL_DIR, prefix="fork-")
+    try:
+        for src, rel in project_files(src_slug):
+            dst = os.path.join(stage, rel)
+            ensure_dir(os.path.dirname(dst))
+            try:
+                if src.endswith(LINKABLE_EXTS):
+                    link_or_copy(src, dst)
                 else:
-                    src = os.path.join(Ldir, "versions", sel)
-                    arcname = sel  # 또는 f"{label}.png"로 통일하려면 변경
-                if os.path.exists(src):
-                    zf.write(src, arcname=arcname)
-    mem.seek(0)
-    return send_file(mem, mimetype="application/zip",
-                     as_attachment=True, download_name=f"{slug}_selected.zip")
+                    shutil.copy2(src, dst)
+            except FileNotFoundError:
+                continue  # 복제 중에 cold로 옮겨짐/삭제됨
+        meta = read_json(os.path.join(stage, "project.json"), {}) or {}
+        meta.update(name=name, created_at=now_iso(), updated_at=now_iso(), forked_from=src_slug)
+        finish_new_project(stage, slug, src_slug, meta)
+    finally:
+        shutil.rmtree(stage, ignore_errors=True)
+    return slug
+
+def export_manifest(slug: str, since: int, rev: int) -> Dict[str, Any]:
+    meta = read_json(os.path.join(project_path(slug), "project.json"), {}) or {}
+    versions = index_versions(slug)
+    return {
+        "format": EXPORT_FORMAT, "slug": slug, "name": meta.get("name", slug),
+        "exported_at": now_iso(), "rev": rev, "since": since, "full": not since,
+        "labels": {row["label"]: {"selected": row["selected"], "versions": versions.get(row["label"], [])}
+                   for row in index_labels(slug) if row["has_original"]},
+    }
+
+class TarStream:
+    """
+    (압축 안의 이름, 파일 경로 또는 bytes) 목록을 tar(PAX)로 조각조각 흘려보낸다.
+    파일마다 열고 fstat한 크기만큼만 읽으므로 아카이브도 파일 하나도 통째로 메모리에 올리지 않는다.
+    """
+
+    def __init__(self, members):
+        self.members = members
+
+    @staticmethod
+    def _header(name: str, size: int, mtime: float) -> bytes:
+        ti = tarfile.TarInfo(name)
+        ti.size, ti.mtime, ti.mode = size, int(mtime), 0o644
+        return ti.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+    def __iter__(self):
+        for name, src in self.members:
+            if isinstance(src, bytes):
+                yield self._header(name, len(src), time.time()) + src + b"\0" * (-len(src) % tarfile.BLOCKSIZE)
+                continue
+            try:
+                f = open(src, "rb")
+            except OSError:
+                continue  # 목록을 만든 뒤 cold로 옮겨짐/삭제됨
+            with f:
+                st = os.fstat(f.fileno())
+                yield self._header(name, st.st_size, st.st_mtime)
+                left = st.st_size
+                while left > 0:
+                    chunk = f.read(min(ZIP_CHUNK, left))
+                    if not chunk:
+                        break
+                    left -= len(chunk)
+                    yield chunk
+            if left:
+                raise IOError(f"{src} changed while streaming")
+            yield b"\0" * (-st.st_size % tarfile.BLOCKSIZE)
+        yield b"\0" * (tarfile.BLOCKSIZE * 2)
+
+def safe_member_name(name: str) -> Optional[str]:
+    """tar 항목 이름 → 프로젝트 기준 상대 경로. 밖으로 나가거나 모르는 위치면 None"""
+    rel = posixpath.normpath(name.replace("\\", "/"))
+    if rel.startswith(("/", "../")) or rel in (".", "..") or "/../" in rel:
+        return None
+    if not (rel == IMPORT_ROOTS[0] or rel.startswith(IMPORT_ROOTS[1:])):
+        return None
+    return rel
+
+def import_member(tar, member, dst: str, work: str):
+    """tar 항목 하나를 dst로 — 임시 파일에 흘려 쓰고 이미지는 블롭으로 링크, 나머지는 교체"""
+    ensure_dir(os.path.dirname(dst))
+    fd, tmp = tempfile.mkstemp(dir=work, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(tar.extractfile(member), out, ZIP_CHUNK)
+        os.utime(tmp, (member.mtime, member.mtime))
+        if dst.endswith(".png"):
+            publish_file(tmp, dst)
+        else:
+            os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def validate_import_tree(stage: str):
+    """조립한 가져오기 폴더를 게시 전에 검사 — 잘못된 항목이 있으면 EditError(400)"""
+    for dirpath, _, fns in os.walk(stage):
+        for fn in fns:
+            p = os.path.join(dirpath, fn)
+            rel = os.path.relpath(p, stage).replace(os.sep, "/")
+            try:
+                if fn.endswith(".json"):
+                    with open(p, "rb") as f:
+                        if not isinstance(json.load(f), dict):
+                            raise ValueError("JSON 객체가 아닙니다")
+                elif fn.endswith(".jsonl"):
+                    seen = set()
+                    with open(p, "rb") as f:
+                        for raw in f:
+                            if raw.strip():
+                                e = json.loads(raw)
+                                if not isinstance(e, dict) or not isinstance(e.get("seq"), int) or e["seq"] in seen:
+                                    raise ValueError("seq가 없거나 겹칩니다")
+                                seen.add(e["seq"])
+                elif fn.endswith(LINKABLE_EXTS):
+                    with Image.open(p) as im:
+                        im.verify()
+            except Exception as e:
+                raise EditError(f"가져오기 파일의 {rel} 항목이 올바르지 않습니다. ({e})", 400)
+
+def import_counterparts(dst: str) -> List[str]:
+    """가져온 버전 파일이 대신하는 기존 사본 — hot(versions/A-n.png) ↔ cold(.cold/A-n.*)"""
+    vdir, fn = os.path.split(dst)
+    if os.path.basename(vdir) == COLD_DIR:
+        stem = fn.split(".")[0]
+        hot = os.path.join(os.path.dirname(vdir), stem + ".png")
+        webp, png, _ = cold_paths(hot)
+        return [] if fn.endswith(".preview.webp") else [hot, png if dst == webp else webp]
+    return list(cold_paths(dst)) if is_version_file(dst) else []
+
+def merge_import_tree(stage: str, root: str, backup: str) -> List[tuple]:
+    """stage의 파일을 기존 프로젝트 root로 옮긴다. 덮어쓰거나 대신하게 된 파일은 backup으로.
+    되돌리기용 기록 [(동작, 경로, 백업 경로)]을 돌려준다 — rollback_import"""
+    journal: List[tuple] = []
+    try:
+        for dirpath, dirnames, fns in os.walk(stage):
+            dirnames.sort()
+            ddir = os.path.normpath(os.path.join(root, os.path.relpath(dirpath, stage)))
+            if not os.path.isdir(ddir):
+                os.mkdir(ddir)
+                journal.append(("mkdir", ddir, None))
+            for fn in sorted(fns):
+                dst = os.path.join(ddir, fn)
+                for old in [dst, *import_counterparts(dst)]:
+                    if os.path.exists(old):
+                        bak = os.path.join(backup, str(len(journal)))
+                        os.rename(old, bak)
+                        journal.append(("moved", old, bak))
+                os.rename(os.path.join(dirpath, fn), dst)
+                journal.append(("placed", dst, None))
+    except OSError:
+        rollback_import(journal)
+        raise
+    return journal
+
+def rollback_import(journal: List[tuple]):
+    """merge_import_tree 되돌리기 — 놓은 파일은 지우고 백업은 제자리로"""
+    for op, path, bak in reversed(journal):
+        try:
+            if op == "placed":
+                os.remove(path)
+            elif op == "moved":
+                os.replace(bak, path)
+            else:
+                os.rmdir(path)
+        except OSError:
+            log.exception("import rollback failed: %s %s", op, path)
+
+@timed("project.import")
+def import_project(stream, into: Optional[str] = None, name: str = "") -> Dict[str, Any]:
+    """
+    내보내기 tar를 읽어 새 프로젝트로(into 없음, 전체 내보내기만) 또는 기존 프로젝트 into에 반영.
+    into에 반영할 때는 project.json(이름 등)은 그대로 두고, 목록에 없는 삽화는 휴지통으로 옮긴다.
+    모든 항목을 임시 폴더에 풀어 검사한 뒤에 게시한다. 기존 프로젝트에 반영하다 실패하면
+    덮어쓴 파일을 되돌린다. 실패 시 EditError.
+    """
+    ensure_dir(SPOOL_DIR)
+    work = tempfile.mkdtemp(dir=SPOOL_DIR, prefix="import-")
+    stage = os.path.join(work, "project")
+    ensure_dir(stage)
+    try:
+        try:
+            tar = tarfile.open(fileobj=stream, mode="r|*")
+            first = tar.next()
+            if first is None or first.name != EXPORT_MANIFEST:
+                raise EditError("내보내기 파일이 아닙니다. (export.json 없음)", 400)
+            manifest = json.loads(tar.extractfile(first).read())
+            if manifest.get("format") != EXPORT_FORMAT:
+                raise EditError("지원하지 않는 내보내기 형식입니다.", 400)
+            src_slug = manifest.get("slug", "")
+            if into is None:
+                if not manifest.get("full"):
+                    raise EditError("증분 내보내기는 기존 프로젝트에 가져오세요.", 400)
+                name = name or manifest.get("name") or src_slug
+                slug = claim_project_slug(name)
+            else:
+                slug = into
+            n = 0
+            for member in tar:
+                rel = safe_member_name(member.name)
+                if rel is None or not member.isfile():
+                    continue
+                if into is not None and rel == "project.json":
+                    continue
+                import_member(tar, member, os.path.join(stage, *rel.split("/")), work)
+                n += 1
+            tar.close()
+        except (tarfile.TarError, EOFError, OSError, ValueError) as e:
+            raise EditError(f"가져오기 파일을 읽을 수 없습니다. ({e})", 400)
+        validate_import_tree(stage)
+
+        removed = []
+        if into is None:
+            meta = read_json(os.path.join(stage, "project.json"), {}) or {}
+            meta.update(name=name, updated_at=now_iso())
+            meta.setdefault("created_at", now_iso())
+            try:
+                finish_new_project(stage, slug, src_slug, meta)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                raise EditError(f"가져오기를 반영하지 못했습니다. ({e})", 400)
+        else:
+            rewrite_project_chat_paths(stage, src_slug, slug)
+            backup = os.path.join(work, "backup")
+            ensure_dir(backup)
+            try:
+                journal = merge_import_tree(stage, project_path(slug), backup)
+            except OSError as e:
+                raise EditError(f"가져오기를 반영하지 못했습니다. ({e})", 400)
+            try:
+                index_reload_project(slug)
+            except Exception as e:
+                rollback_import(journal)  # 인덱스는 트랜잭션이 되돌렸다
+                raise EditError(f"가져오기를 반영하지 못했습니다. ({e})", 400)
+            keep = set(manifest.get("labels", {}))
+            illus_dir = illustrations_path(slug)
+            for label in sorted(os.listdir(illus_dir)) if os.path.isdir(illus_dir) else []:
+                Ldir = os.path.join(illus_dir, label)
+                if label in keep or not os.path.isdir(Ldir) or os.path.exists(os.path.join(Ldir, UPLOAD_SPOOL)):
+                    continue
+                move_to_trash("illustration", slug, Ldir, label=label,
+                              extra=[chat_log_path(slug, label), os.path.join(chatlogs_path(slug), f"{label}.txt")])
+                index_delete_label(slug, label)
+                removed.append(label)
+            touch_project(slug)
+        return {"slug": slug, "files": n, "removed": removed}
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+@bp.route("/api/projects/<slug>/fork", methods=["POST"])
+def api_fork_project(slug):
+    """프로젝트 복제. body: {"name": "새 이름"} (없으면 "<이름> 사본")"""
+    if not os.path.isdir(project_path(slug)):
+        return jsonify({"ok": False, "error": "프로젝트가 없습니다."}), 404
+    data = request.get_json(silent=True) or {}
+    name = (data.get("name") or "").strip() or f"{(index_project_meta(slug) or {}).get('name', slug)} 사본"
+    try:
+        new_slug = fork_project(slug, name)
+    except EditError as e:
+        return jsonify({"ok": False, "error": e.message}), e.status
+    return jsonify({"ok": True, "slug": new_slug})
+
+@bp.route("/api/projects/<slug>/export", methods=["GET"])
+def api_export_project(slug):
+    """전체 기록 내보내기(tar). ?since=<rev>(앞선 내보내기 export.json의 rev) 이면 그 뒤 바뀐 파일만.
+    since가 인덱스가 아는 범위 밖이면(인덱스 재생성 등) 전체 내보내기(full=true)"""
+    if not os.path.isdir(project_path(slug)):
+        return jsonify({"ok": False, "error": "프로젝트가 없습니다."}), 404
+    try:
+        since = int(request.args.get("since") or 0)
+    except ValueError:
+        return jsonify({"ok": False, "error": "since는 내보내기 rev(정수)여야 합니다."}), 400
+    revs = index_project_rev(slug)  # 목록을 훑기 전 rev — 훑는 동안 바뀐 것은 다음 증분에 다시 들어간다
+    rev = revs["rev"] if revs else 0
+    if not (since and revs and revs["rev_floor"] <= since <= rev):
+        since = 0
+    manifest = json.dumps(export_manifest(slug, since, rev), ensure_ascii=False, indent=2).encode("utf-8")
+    files = project_delta_files(slug, since) if since else project_files(slug)
+    members = itertools.chain([(EXPORT_MANIFEST, manifest)], ((rel, p) for p, rel in files))
+    resp = Response(iter(TarStream(members)), mimetype="application/x-tar", direct_passthrough=True)
+    suffix = f"-since-{int(since)}" if since else ""
+    resp.headers["Content-Disposition"] = content_disposition(f"{slug}{suffix}.tar", "project.tar")
+    return resp
+
+@bp.route("/api/projects/import", methods=["POST"])
+def api_import_project():
+    """전체 내보내기 tar(요청 본문) → 새 프로젝트. ?name= 로 이름 변경"""
+    try:
+        r = import_project(request.stream, name=(request.args.get("name") or "").strip())
+    except EditError as e:
+        return jsonify({"ok": False, "error": e.message}), e.status
+    return jsonify({"ok": True, **r})
+
+@bp.route("/api/projects/<slug>/import", methods=["POST"])
+def api_import_into_project(slug):
+    """내보내기 tar(전체/증분)를 기존 프로젝트에 반영"""
+    if not os.path.isdir(project_path(slug)):
+        return jsonify({"ok": False, "error": "프로젝트가 없습니다."}), 404
+    try:
+        r = import_project(request.stream, into=slug)
+    except EditError as e:
+        return jsonify({"ok": False, "error": e.message}), e.status
+    return jsonify({"ok": True, **r})
 
 # ---------- 최종 선택(♥) ----------
-@app.route("/api/projects/<slug>/select", methods=["POST"])
+@bp.route("/api/projects/<slug>/select", methods=["POST"])
 def api_select_version(slug):
     data = request.get_json(force=True)
     label = (data.get("label") or "").strip()
@@ -394,129 +2550,1137 @@ def api_select_version(slug):
         if not os.path.exists(os.path.join(Ldir, "original.png")):
             return jsonify({"ok": False, "error": "원본이 없습니다."}), 404
         write_text(os.path.join(Ldir, "selected.txt"), "__ORIGINAL__")
-        append_text(os.path.join(chatlogs_path(slug), f"{label}.txt"),
-                    f"[{now_iso()}] [SELECT] __ORIGINAL__ set as selected")
+        append_chat(slug, label, "SELECT", version="__ORIGINAL__")
+        index_set_selected(slug, label, "__ORIGINAL__")
     else:
         vpath = os.path.join(Ldir, "versions", version)
-        if not os.path.exists(vpath):
+        if not restore_cold(vpath):  # 최종본은 cold에 두지 않는다
             return jsonify({"ok": False, "error": "버전이 없습니다."}), 404
         write_text(os.path.join(Ldir, "selected.txt"), version)
-        append_text(os.path.join(chatlogs_path(slug), f"{label}.txt"),
-                    f"[{now_iso()}] [SELECT] {version} set as selected")
+        append_chat(slug, label, "SELECT", version=version)
+        index_set_selected(slug, label, version)
 
     # updated_at
-    meta_p = os.path.join(project_path(slug), "project.json")
-    meta = read_json(meta_p, {})
-    meta["updated_at"] = now_iso()
-    write_json(meta_p, meta)
+    touch_project(slug)
     return jsonify({"ok": True})
 
 # ---------- 편집(나노 바나나) ----------
-@app.route("/api/projects/<slug>/edit", methods=["POST"])
-def api_edit(slug):
-    """
-    form-data:
-      - label: "A"
-      - prompt: str
-      - base_version: "A-2.png" | "__ORIGINAL__" (optional)
-    모든 생성물은 versions/A-n.png 로 저장.
-    새 이미지가 생성되면 해당 삽화의 최종 선택으로 갱신.
-    채팅 로그(chat_logs/A.txt)에는
-      - [USER] base(썸네일 경로) + prompt 기록
-      - [MODEL] output 버전 파일명 기록
-    """
-    label = (request.form.get("label") or "").strip()
-    prompt = (request.form.get("prompt") or "").strip()
-    base_version = (request.form.get("base_version") or "").strip()
-
-    if not label or not prompt:
-        return jsonify({"ok": False, "error": "label, prompt가 필요합니다."}), 400
+class EditError(Exception):
+    """편집 실패. message는 그대로 사용자에게 보여줄 문구, status는 HTTP 코드."""
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+# 모델 클라이언트 주입 지점 — 테스트/벤치마크에서는 로컬 스텁으로 바꿔 끼운다
+_model_client = None
+_model_client_lock = threading.Lock()
+
+def set_model_client(client):
+    global _model_client
+    _model_client = client
+
+def make_gemini_client():
+    """google.genai 클라이언트. 모든 호출이 하나의 httpx 연결 풀(keep-alive)을 재사용한다."""
+    from google import genai
+    from google.genai import types
+    http = httpx.Client(limits=httpx.Limits(max_connections=MODEL_HTTP_POOL,
+                                            max_keepalive_connections=MODEL_HTTP_POOL))
+    return genai.Client(http_options=types.HttpOptions(base_url=GEMINI_BASE_URL,
+                                                       httpx_client=http))  # GEMINI_API_KEY 자동 인식
+
+def get_model_client():
+    """처음 부를 때 클라이언트를 만든다 — 조회만 하는 서버는 SDK 로드도, API 키도 필요 없다."""
+    global _model_client
+    if _model_client is None:
+        with _model_client_lock:
+            if _model_client is None:
+                _model_client = make_gemini_client()
+    return _model_client
+
+def model_client_state() -> str:
+    if _model_client is not None:
+        return "ready"
+    return "lazy" if os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") else "no_key"
+
+class TokenBucket:
+    """초당 rate개, 최대 burst개까지 몰아 쓸 수 있는 토큰 버킷. rate <= 0 이면 제한 없음."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._ts) * self.rate)
+            self._ts = now
+            self._tokens -= 1  # 먼저 예약하고, 모자란 만큼만 기다린다
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+    def try_acquire(self) -> bool:
+        """토큰이 있으면 쓰고 True, 없으면 기다리지 않고 False"""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._ts) * self.rate)
+            self._ts = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+# 모델 호출 속도 제한 (모든 편집 공통)
+MODEL_RPS = float(os.getenv("MODEL_RPS", "2"))
+MODEL_BURST = int(os.getenv("MODEL_BURST", "5"))
+model_rate_limiter = TokenBucket(MODEL_RPS, MODEL_BURST)
+
+# ---- 모델 호출 안정화 ----
+# 호출마다 마감 시간, 일시적 오류는 지수 백오프로 재시도, 느린 호출은 헤징(같은 요청을 한 번 더),
+# 연속 실패가 쌓이면 서킷을 열어 바로 실패시킨다. → 편집 한 건의 꼬리 지연에 상한을 둔다.
+MODEL_DEADLINE_SEC = float(os.getenv("MODEL_DEADLINE_SEC", "180"))       # 재시도 포함 전체 마감
+MODEL_ATTEMPT_TIMEOUT_SEC = float(os.getenv("MODEL_ATTEMPT_TIMEOUT_SEC", "90"))  # 시도 1회 마감
+MODEL_RETRIES = int(os.getenv("MODEL_RETRIES", "2"))                     # 일시적 오류 재시도 횟수
+MODEL_BACKOFF_SEC = float(os.getenv("MODEL_BACKOFF_SEC", "1"))           # 첫 재시도 대기 (이후 2배씩)
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "95"))  # 이 백분위보다 느리면 헤징, 0이면 끔
+MODEL_HEDGE_MIN_SAMPLES = 20                                             # 지연 표본이 이만큼 쌓여야 헤징
+MODEL_CB_FAILURES = int(os.getenv("MODEL_CB_FAILURES", "5"))             # 연속 실패 몇 번에 서킷을 열지
+MODEL_CB_RESET_SEC = float(os.getenv("MODEL_CB_RESET_SEC", "30"))        # 열린 뒤 시험 호출까지 대기
+
+class ModelTimeout(Exception):
+    """마감 시간 안에 응답이 없음"""
+
+class ModelUnavailable(Exception):
+    """서킷이 열려 있어 호출하지 않음"""
+
+class ModelUpstreamError(Exception):
+    """재시도해도 일시적 오류가 계속됨"""
+
+def is_transient(e: BaseException) -> bool:
+    """다시 시도하면 될 수도 있는 오류인지 (429/5xx, 연결/시간 초과)"""
+    from google.genai import errors as genai_errors
+    if isinstance(e, genai_errors.APIError):
+        return e.code in (408, 429) or (e.code or 0) >= 500
+    return isinstance(e, (httpx.TransportError, TimeoutError))
+
+class CircuitBreaker:
+    """연속 failures번 실패하면 reset_sec 동안 열림(바로 실패).
+    그 뒤 시험 호출 하나만 보내(half_open) 성공하면 닫고, 실패하면 다시 연다."""
+
+    def __init__(self, failures: int, reset_sec: float):
+        self.failures = max(1, failures)
+        self.reset_sec = reset_sec
+        self.state = "closed"  # closed | open | half_open
+        self._fails = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_sec:
+                    return False
+                self.state = "half_open"
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"
+            self._fails = 0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self._fails += 1
+            if self.state == "half_open" or self._fails >= self.failures:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+class ResilientModel:
+    """client.models.generate_content를 마감/재시도/헤징/서킷 브레이커로 감싼다.
+    client는 호출마다 받는다. (set_model_client로 바꿔 끼운 스텁도 그대로 동작)"""
+
+    def __init__(self, limiter: TokenBucket, breaker: CircuitBreaker, workers: int = MODEL_HTTP_POOL):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.counters = collections.Counter()
+        self._latencies = collections.deque(maxlen=200)  # 최근 성공 호출 지연(초)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-call")
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def hedge_delay(self) -> Optional[float]:
+        if MODEL_HEDGE_PERCENTILE <= 0:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < MODEL_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * MODEL_HEDGE_PERCENTILE / 100))]
+
+    def _attempt(self, client, timeout: float, kwargs: Dict[str, Any]):
+        from google.genai import types
+        t0 = time.monotonic()
+        config = types.GenerateContentConfig(http_options=types.HttpOptions(timeout=int(timeout * 1000)))
+        try:
+            resp = client.models.generate_content(config=config, **kwargs)
+        except Exception:
+            metrics.observe("model_attempt_seconds", time.monotonic() - t0, result="error")
+            raise
+        elapsed = time.monotonic() - t0
+        metrics.observe("model_attempt_seconds", elapsed, result="ok")
+        with self._lock:
+            self._latencies.append(elapsed)
+        return resp
+
+    def _hedged(self, client, timeout: float, kwargs: Dict[str, Any]):
+        """한 번의 시도. hedge_delay 안에 응답이 없으면 같은 요청을 하나 더 보내고 먼저 성공한 쪽을 쓴다."""
+        end = time.monotonic() + timeout
+        first = self._pool.submit(self._attempt, client, timeout, kwargs)
+        pending = {first}
+        delay = self.hedge_delay()
+        if delay is not None and delay < timeout:
+            done, _ = wait_futures(pending, timeout=delay)
+            if not done and self.breaker.state == "closed" and self.limiter.try_acquire():
+                self._count("hedges")
+                pending.add(self._pool.submit(self._attempt, client, end - time.monotonic(), kwargs))
+        error = None
+        while pending:
+            done, pending = wait_futures(pending, timeout=max(0.0, end - time.monotonic()),
+                                         return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"no response within {timeout:.0f}s")
+            for f in done:
+                if f.exception() is None:
+                    if f is not first:
+                        self._count("hedge_wins")
+                    return f.result()
+                error = f.exception()
+        raise error
+
+    def generate_content(self, client, **kwargs):
+        t0 = time.monotonic()
+        result = "ok"
+        try:
+            return self._generate_content(client, **kwargs)
+        except ModelTimeout:
+            result = "timeout"
+            raise
+        except ModelUnavailable:
+            result = "rejected"
+            raise
+        except ModelUpstreamError:
+            result = "upstream_error"
+            raise
+        except Exception:
+            result = "client_error"  # 재시도하지 않는 오류 (4xx 등)
+            raise
+        finally:
+            metrics.observe("model_request_seconds", time.monotonic() - t0, result=result)
+            metrics.inc("model_requests_total", result=result)
+
+    def _generate_content(self, client, **kwargs):
+        deadline = time.monotonic() + MODEL_DEADLINE_SEC
+        last_error: Optional[BaseException] = None
+        for attempt in range(MODEL_RETRIES + 1):
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise ModelUnavailable()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.limiter.acquire()
+            self._count("attempts")
+            try:
+                resp = self._hedged(client, min(MODEL_ATTEMPT_TIMEOUT_SEC, remaining), kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    # 요청 자체의 문제(4xx 등) — 서비스는 응답했으므로 장애로 세지 않는다
+                    self.breaker.success()
+                    raise
+                self.breaker.failure()
+                last_error = e
+                if isinstance(e, (httpx.TimeoutException, TimeoutError)):
+                    self._count("timeouts")
+                backoff = MODEL_BACKOFF_SEC * (2 ** attempt) * random.uniform(0.5, 1.0)
+                if attempt < MODEL_RETRIES and time.monotonic() + backoff < deadline:
+                    self._count("retries")
+                    time.sleep(backoff)
+                    continue
+                break
+            self.breaker.success()
+            return resp
+        if last_error is None or isinstance(last_error, (httpx.TimeoutException, TimeoutError)):
+            raise ModelTimeout() from last_error
+        raise ModelUpstreamError(str(last_error)) from last_error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._latencies)
+            counters = dict(self.counters)
+        def pct_ms(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000, 1) if samples else None
+        hedge = self.hedge_delay()
+        return {"breaker": self.breaker.state, "p50_ms": pct_ms(50), "p95_ms": pct_ms(95),
+                "hedge_after_ms": round(hedge * 1000, 1) if hedge is not None else None, **counters}
+
+model_guard = ResilientModel(model_rate_limiter, CircuitBreaker(MODEL_CB_FAILURES, MODEL_CB_RESET_SEC))
+
+# 편집 결과 캐시: (베이스 이미지 바이트, 정규화 프롬프트, 모델) → 모델 출력 바이트
+result_cache = DiskLRUCache(os.path.join(CACHE_DIR, "results"), RESULT_CACHE_MAX_BYTES)
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", prompt or "")).strip()
+
+@timed("edit.hash_base")
+def result_cache_key(base_img_path: str, prompt: str, model: str, crop: Optional[tuple] = None) -> str:
+    h = hashlib.sha256()
+    with open(base_img_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    h.update(b"\0" + normalize_prompt(prompt).encode("utf-8") + b"\0" + model.encode("utf-8"))
+    h.update(b"\0" + model_input_sig().encode("ascii"))  # 입력 준비 설정이 바뀌면 결과도 달라진다
+    if crop:
+        h.update(b"\0crop:" + ",".join(map(str, crop)).encode("ascii"))
+    return h.hexdigest()
+
+# ---- 모델 입력 준비 ----
+# 모델은 어차피 낮은 해상도로 보고 결과는 force_same_size로 베이스 크기에 맞추므로,
+# 긴 변을 MODEL_INPUT_MAX_EDGE로 줄이고 압축해서 보낸다. 같은 베이스는 캐시에서 재사용.
+MODEL_INPUT_MIME = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+MODEL_INPUT_MAX_EDGE = int(os.getenv("MODEL_INPUT_MAX_EDGE", "1536"))  # 0이면 줄이지 않음
+MODEL_INPUT_FORMAT = os.getenv("MODEL_INPUT_FORMAT", "webp").lower()
+if MODEL_INPUT_FORMAT not in MODEL_INPUT_MIME:
+    MODEL_INPUT_FORMAT = "webp"
+MODEL_INPUT_QUALITY = int(os.getenv("MODEL_INPUT_QUALITY", "90"))  # webp/jpeg 품질
+MODEL_INPUT_CACHE_MAX_BYTES = int(os.getenv("MODEL_INPUT_CACHE_MB", "256")) * 1024 * 1024
+
+input_cache = DiskLRUCache(os.path.join(CACHE_DIR, "inputs"), MODEL_INPUT_CACHE_MAX_BYTES)
+
+def model_input_sig() -> str:
+    return f"{MODEL_INPUT_MAX_EDGE}:{MODEL_INPUT_FORMAT}:{MODEL_INPUT_QUALITY}"
+
+def encode_model_input(img: Image.Image) -> bytes:
+    if MODEL_INPUT_MAX_EDGE and max(img.size) > MODEL_INPUT_MAX_EDGE:
+        img = img.copy()
+        img.thumbnail((MODEL_INPUT_MAX_EDGE, MODEL_INPUT_MAX_EDGE), Image.LANCZOS)
+    buf = io.BytesIO()
+    if MODEL_INPUT_FORMAT == "jpeg":
+        # JPEG은 알파가 없으므로 흰 배경에 합성
+        flat = Image.new("RGB", img.size, (255, 255, 255))
+        flat.paste(img, mask=img.getchannel("A"))
+        flat.save(buf, format="JPEG", quality=MODEL_INPUT_QUALITY, optimize=True)
+    elif MODEL_INPUT_FORMAT == "webp":
+        img.save(buf, format="WEBP", quality=MODEL_INPUT_QUALITY, method=4)
+    else:
+        img.save(buf, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return buf.getvalue()
+
+def prepare_model_input(base_img_path: str, crop: Optional[tuple] = None):
+    """베이스 이미지(crop이 있으면 그 영역만) → (모델에 보낼 바이트, mime, 캐시 적중 여부).
+    베이스 파일(경로+mtime+크기)·영역·설정 단위로 캐시."""
+    st = os.stat(base_img_path)
+    key = hashlib.sha1(
+        f"{os.path.abspath(base_img_path)}|{st.st_mtime_ns}|{st.st_size}|{model_input_sig()}|{crop}".encode("utf-8")
+    ).hexdigest()
+    ext = "." + MODEL_INPUT_FORMAT
+    hit = input_cache.get(key, ext)
+    if hit:
+        with open(hit, "rb") as f:
+            return f.read(), MODEL_INPUT_MIME[MODEL_INPUT_FORMAT], True
+    with timed("model.input_encode"):
+        with Image.open(base_img_path) as im:
+            img = im.convert("RGBA")
+        data = encode_model_input(img.crop(crop) if crop else img)
+    input_cache.put(key, data, ext)
+    return data, MODEL_INPUT_MIME[MODEL_INPUT_FORMAT], False
+
+class ModelCallStats:
+    """모델 호출 계측: 보낸 바이트, 입력 준비 시간, 호출(업로드+생성) 시간 누계"""
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes_sent = 0
+        self.prep_sec = 0.0
+        self.call_sec = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, bytes_sent: int, prep_sec: float, call_sec: float):
+        with self._lock:
+            self.calls += 1
+            self.bytes_sent += bytes_sent
+            self.prep_sec += prep_sec
+            self.call_sec += call_sec
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.calls or 1
+            return {"calls": self.calls, "bytes_sent": self.bytes_sent,
+                    "avg_bytes_sent": self.bytes_sent // n,
+                    "avg_prep_ms": round(self.prep_sec * 1000 / n, 1),
+                    "avg_call_ms": round(self.call_sec * 1000 / n, 1),
+                    "input": {"max_edge": MODEL_INPUT_MAX_EDGE, "format": MODEL_INPUT_FORMAT,
+                              "quality": MODEL_INPUT_QUALITY}}
+
+model_call_stats = ModelCallStats()
+
+# ---- 부분(영역) 편집 ----
+# 영역(사각형)이나 마스크가 오면 그 주변만 잘라 모델에 보내고, 결과를 베이스에 원래 해상도로 합성한다.
+# 영역 밖 픽셀은 베이스 그대로(비트 단위 동일).
+REGION_PAD = float(os.getenv("REGION_PAD", "0.25"))  # 모델이 주변 맥락을 보도록 붙이는 여백 (영역 긴 변 대비)
+REGION_PAD_MIN = 32
+_REGION_TOKEN_RE = re.compile(r"^\d+(\.\d+)?%?$")
+
+@dataclass
+class EditRegion:
+    bbox: tuple   # (l, t, r, b) 실제로 바뀌는 영역
+    crop: tuple   # (l, t, r, b) 모델에 보내는 영역 = bbox + 여백
+    mask: Optional[Image.Image] = None  # 베이스 크기 L 마스크 (0이 아닌 곳만 바뀜)
+
+    def as_list(self) -> List[int]:
+        l, t, r, b = self.bbox
+        return [l, t, r - l, b - t]
+
+def parse_region(val) -> Optional[List[str]]:
+    """ "x,y,w,h" — 베이스 이미지 픽셀, 또는 "10%,20%,30%,40%" 처럼 베이스 크기 대비 %"""
+    val = (val or "").strip().strip("[]")
+    if not val:
+        return None
+    parts = [p for p in re.split(r"[,\s]+", val) if p]
+    if len(parts) != 4 or not all(_REGION_TOKEN_RE.match(p) for p in parts):
+        raise EditError("region 형식이 올바르지 않습니다. (x,y,w,h)", 400)
+    return parts
+
+def _region_px(token: str, full: int) -> int:
+    if token.endswith("%"):
+        return int(round(float(token[:-1]) * full / 100))
+    return int(round(float(token)))
+
+def resolve_edit_region(base_img_path: str, region: Optional[List[str]],
+                        mask_bytes: Optional[bytes]) -> EditRegion:
+    with Image.open(base_img_path) as im:
+        W, H = im.size
+    l, t, r, b = 0, 0, W, H
+    if region:
+        x, y = _region_px(region[0], W), _region_px(region[1], H)
+        w, h = _region_px(region[2], W), _region_px(region[3], H)
+        l, t, r, b = max(0, x), max(0, y), min(W, x + w), min(H, y + h)
+    mask = None
+    if mask_bytes:
+        try:
+            with Image.open(io.BytesIO(mask_bytes)) as m:
+                if m.mode in ("RGBA", "LA") and m.getchannel("A").getextrema()[0] < 255:
+                    src = m.getchannel("A")  # 투명도가 있으면 불투명한 곳 = 수정
+                else:
+                    src = m.convert("L")     # 아니면 밝은 곳 = 수정
+        except Exception:
+            raise EditError("mask 이미지를 열 수 없습니다.", 400)
+        if src.size != (W, H):
+            src = src.resize((W, H), Image.NEAREST)
+        # 영역과 마스크가 둘 다 있으면 교집합
+        mask = Image.new("L", (W, H), 0)
+        if r > l and b > t:
+            mask.paste(src.crop((l, t, r, b)), (l, t))
+        mbox = mask.getbbox()
+        l, t, r, b = mbox if mbox else (0, 0, 0, 0)
+    if r <= l or b <= t:
+        raise EditError("수정 영역이 비어 있습니다.", 400)
+    pad = max(REGION_PAD_MIN, int(max(r - l, b - t) * REGION_PAD))
+    crop = (max(0, l - pad), max(0, t - pad), min(W, r + pad), min(H, b + pad))
+    return EditRegion(bbox=(l, t, r, b), crop=crop, mask=mask)
+
+def composite_region(base_img_path: str, out_img: Image.Image, roi: EditRegion) -> Image.Image:
+    """모델 결과(잘라 보낸 영역) → 베이스 크기 이미지. 영역 밖은 베이스 픽셀 그대로."""
+    with Image.open(base_img_path) as im:
+        base = im.convert("RGBA")
+    cl, ct, cr, cb = roi.crop
+    if out_img.size != (cr - cl, cb - ct):
+        out_img = out_img.resize((cr - cl, cb - ct), Image.LANCZOS)
+    if roi.mask is not None:
+        patch = Image.composite(out_img, base.crop(roi.crop), roi.mask.crop(roi.crop))
+        base.paste(patch, (cl, ct))
+    else:
+        l, t, r, b = roi.bbox
+        base.paste(out_img.crop((l - cl, t - ct, r - cl, b - ct)), (l, t))
+    return base
 
+def resolve_edit_base(slug: str, label: str, base_version: str) -> str:
+    """편집 베이스 이미지 경로. 없으면 EditError."""
     Ldir = os.path.join(illustrations_path(slug), label)
     if not os.path.isdir(Ldir):
-        return jsonify({"ok": False, "error": "삽화가 없습니다."}), 404
-
-    # 베이스 이미지 결정
+        raise EditError("삽화가 없습니다.", 404)
+    if not os.path.exists(os.path.join(Ldir, "original.png")) and ingest_pending(slug, label):
+        raise EditError("업로드한 이미지를 처리하는 중입니다. 잠시 후 다시 시도하세요.", 409)
     versions_dir = os.path.join(Ldir, "versions")
-    ensure_dir(versions_dir)
-
     if base_version == "__ORIGINAL__":
         base_img_path = os.path.join(Ldir, "original.png")
         if not os.path.exists(base_img_path):
-            return jsonify({"ok": False, "error": "원본 이미지가 없습니다."}), 404
+            raise EditError("원본 이미지가 없습니다.", 404)
     elif base_version:
-        cand = os.path.join(versions_dir, base_version)
-        if os.path.exists(cand):
-            base_img_path = cand
-        else:
-            return jsonify({"ok": False, "error": "base_version 파일이 없습니다."}), 404
+        base_img_path = os.path.join(versions_dir, base_version)
+        if not restore_cold(base_img_path):
+            raise EditError("base_version 파일이 없습니다.", 404)
     else:
         # 최신 버전 or original
-        n = latest_version_num(Ldir)
+        n = index_latest_version(slug, label)
         if n > 0:
             base_img_path = os.path.join(versions_dir, f"{label}-{n}.png")
+            restore_cold(base_img_path)
         else:
             base_img_path = os.path.join(Ldir, "original.png")
             if not os.path.exists(base_img_path):
-                return jsonify({"ok": False, "error": "원본 이미지가 없습니다."}), 404
+                raise EditError("원본 이미지가 없습니다.", 404)
+    return base_img_path
+
+def run_edit(slug: str, label: str, prompt: str, base_version: str = "", client=None,
+             use_cache: bool = True, region: Optional[List[str]] = None,
+             mask: Optional[bytes] = None, group: str = "") -> Dict[str, Any]:
+    """
+    베이스 이미지 + 프롬프트 → 모델 호출 → versions/A-n.png 저장 → 채팅 로그 기록.
+    같은 베이스/프롬프트/모델 조합은 결과 캐시에서 꺼내 모델을 다시 부르지 않는다.
+    (use_cache=False 면 캐시를 건너뛰고 새로 생성) 캐시 적중이어도 새 버전과 로그는 남긴다.
+    region/mask가 있으면 그 주변만 모델에 보내고 결과를 베이스에 합성한다. (부분 편집)
+    채팅 로그(chat_logs/A.jsonl)에는
+      - USER: base(베이스 이미지 경로) + prompt (+ region [x,y,w,h], mask, group=묶음 id) 기록
+      - MODEL: out(생성 파일 경로) + version (+ region) 기록
+    실패 시 EditError.
+    최신 버전을 베이스로 삼는 편집은 베이스 결정~새 버전 저장을 edit-<slug>-<label> 잠금 안에서 한다.
+    (다른 워커 프로세스가 그 사이에 같은 베이스로 버전을 끼워 넣지 못하게 —
+     base_version을 지정한 편집은 베이스가 바뀌지 않으므로 잠그지 않고 병렬로 돈다)
+    """
+    with (file_lock(f"edit-{slug}-{label}") if not base_version else nullcontext()):
+        return _run_edit(slug, label, prompt, base_version, client, use_cache, region, mask, group)
+
+def _run_edit(slug: str, label: str, prompt: str, base_version: str, client,
+              use_cache: bool, region: Optional[List[str]], mask: Optional[bytes],
+              group: str) -> Dict[str, Any]:
+    base_img_path = resolve_edit_base(slug, label, base_version)
+    Ldir = os.path.join(illustrations_path(slug), label)
+    versions_dir = os.path.join(Ldir, "versions")
+    ensure_dir(versions_dir)
+    try:
+        client = client or get_model_client()
+    except Exception as e:
+        raise EditError(f"모델 클라이언트를 만들 수 없습니다. GEMINI_API_KEY를 확인하세요. ({e})", 503)
 
-    # Gemini 호출 (이미지+프롬프트 → 이미지)
     try:
-        src_img = Image.open(base_img_path).convert("RGBA")
-        resp = gemini_client.models.generate_content(
-            model=GEMINI_IMAGE_MODEL,
-            contents=[src_img, prompt],
-        )
-        # 응답에서 이미지 바이트 추출
+        roi = resolve_edit_region(base_img_path, region, mask) if (region or mask) else None
+        crop = roi.crop if roi else None
+        cache_key = result_cache_key(base_img_path, prompt, GEMINI_IMAGE_MODEL, crop)
         out_bytes = None
-        if resp and getattr(resp, "candidates", None):
-            for part in resp.candidates[0].content.parts:
-                if getattr(part, "inline_data", None):
-                    out_bytes = part.inline_data.data
-                    break
-        if not out_bytes:
-            # 텍스트만 온 경우
-            text = getattr(resp, "text", "") or "이미지 결과가 없습니다."
-            # 로그만 남기고 에러로 반환
-            append_text(os.path.join(chatlogs_path(slug), f"{label}.txt"),
-                        f"[{now_iso()}] [MODEL:TEXT] {text}")
-            return jsonify({"ok": False, "error": text}), 400
-
-        out_img = Image.open(io.BytesIO(out_bytes)).convert("RGBA")
-        # ★ 출력 크기 = 베이스 크기 강제
-        out_img = force_same_size(out_img, base_img_path)
-
-        # 새 버전 번호
-        new_n = latest_version_num(Ldir) + 1
-        out_name = f"{label}-{new_n}.png"
-        out_path = os.path.join(versions_dir, out_name)
-        save_pil(out_img, out_path)
+        if use_cache:
+            hit = result_cache.get(cache_key, ".bin")
+            if hit:
+                with open(hit, "rb") as f:
+                    out_bytes = f.read()
+        cached = out_bytes is not None
+
+        if not cached:
+            # Gemini 호출 (축소·압축한 이미지+프롬프트 → 이미지)
+            from google.genai import types
+            t0 = time.monotonic()
+            in_bytes, in_mime, in_cached = prepare_model_input(base_img_path, crop)
+            prep_sec = time.monotonic() - t0
+            t1 = time.monotonic()
+            resp = model_guard.generate_content(
+                client,
+                model=GEMINI_IMAGE_MODEL,
+                contents=[types.Part.from_bytes(data=in_bytes, mime_type=in_mime), prompt],
+            )
+            call_sec = time.monotonic() - t1
+            model_call_stats.record(len(in_bytes), prep_sec, call_sec)
+            metrics.inc("model_input_bytes_total", len(in_bytes))
+            log.info("model call %s/%s: sent %d bytes (%s%s), prep %.0fms, call %.0fms",
+                            slug, label, len(in_bytes), in_mime, ", cached" if in_cached else "",
+                            prep_sec * 1000, call_sec * 1000)
+            # 응답에서 이미지 바이트 추출
+            if resp and getattr(resp, "candidates", None):
+                for part in resp.candidates[0].content.parts:
+                    if getattr(part, "inline_data", None):
+                        out_bytes = part.inline_data.data
+                        break
+            if not out_bytes:
+                # 텍스트만 온 경우
+                text = getattr(resp, "text", "") or "이미지 결과가 없습니다."
+                # 로그만 남기고 에러로 반환
+                append_chat(slug, label, "MODEL:TEXT", text=text)
+                raise EditError(text, 400)
+            result_cache.put(cache_key, out_bytes, ".bin")
+
+        with timed("image.decode"):
+            try:
+                out_img = Image.open(io.BytesIO(out_bytes)).convert("RGBA")
+            except (OSError, Image.DecompressionBombError):
+                raise EditError("모델이 보낸 이미지를 열 수 없습니다.", 502)
+        with timed("image.composite"):
+            if roi:
+                # 영역 결과를 베이스에 합성 (원래 해상도)
+                out_img = composite_region(base_img_path, out_img, roi)
+            else:
+                # ★ 출력 크기 = 베이스 크기 강제
+                out_img = force_same_size(out_img, base_img_path)
+
+        # 새 버전 번호 — 인덱스에서 원자적으로 할당, 디스크에 이미 있으면(인덱스가 뒤처짐) 다음 번호
+        while True:
+            new_n = index_allocate_version(slug, label)
+            if not new_n:
+                raise EditError("삽화가 없습니다.", 404)
+            out_name = f"{label}-{new_n}.png"
+            out_path = os.path.join(versions_dir, out_name)
+            if save_pil(out_img, out_path, overwrite=False):
+                break
+        index_add_version(slug, label, new_n)
 
         # 로그 기록 (채팅 메시지처럼)
         # 사용자: 베이스/프롬프트
         base_rel = base_img_path.replace(DATA_DIR, "").replace("\\", "/")
-        append_text(os.path.join(chatlogs_path(slug), f"{label}.txt"),
-                    f"[{now_iso()}] [USER] base={base_rel} prompt={prompt}")
+        # 부분 편집이면 영역도 기록
+        region_fields = {"region": roi.as_list()} if roi else {}
+        mask_fields = {"mask": True} if roi and roi.mask is not None else {}
+        group_fields = {"group": group} if group else {}
+        req = append_chat(slug, label, "USER", base=base_rel, prompt=prompt,
+                          **region_fields, **mask_fields, **group_fields)
         # 모델: 생성 파일
         out_rel = out_path.replace(DATA_DIR, "").replace("\\", "/")
-        append_text(os.path.join(chatlogs_path(slug), f"{label}.txt"),
-                    f"[{now_iso()}] [MODEL] out={out_rel}")
+        append_chat(slug, label, "MODEL", out=out_rel, version=out_name, req=req["seq"], **region_fields)
 
         # 프로젝트 갱신
-        meta_p = os.path.join(project_path(slug), "project.json")
-        meta = read_json(meta_p, {})
-        meta["updated_at"] = now_iso()
-        write_json(meta_p, meta)
+        touch_project(slug)
+
+        return {"version": out_name, "image_url": f"/files{out_rel}", "cached": cached}
+    except EditError:
+        raise
+    except ModelTimeout:
+        raise EditError("모델 응답 시간이 초과되었습니다. 잠시 후 다시 시도하세요.", 504)
+    except ModelUnavailable:
+        raise EditError("모델 서비스가 일시적으로 불안정합니다. 잠시 후 다시 시도하세요.", 503)
+    except ModelUpstreamError as e:
+        raise EditError(f"모델 호출에 실패했습니다. ({e})", 502)
+    except Exception:
+        # 입력 오류는 위에서 이미 EditError(400)로 — 여기 오는 것은 서버 쪽 문제. 내부 메시지는 로그에만
+        log.exception("편집 실패 %s/%s", slug, label)
+        raise EditError("편집 중 서버 오류가 발생했습니다.", 500)
+
+# ---------- 편집 작업 큐 ----------
+EDIT_WORKERS = int(os.getenv("EDIT_WORKERS", "8"))
+EDIT_QUEUE_MAX = int(os.getenv("EDIT_QUEUE_MAX", "64"))   # 대기 중 작업 최대 개수
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "6"))  # 일괄 편집 하나가 동시에 쓰는 워커 수
+EDIT_JOB_TTL_SEC = int(os.getenv("EDIT_JOB_TTL_SEC", "3600"))  # 끝난 작업 보관 시간
+EDIT_MAX_CANDIDATES = int(os.getenv("EDIT_MAX_CANDIDATES", "4"))  # 한 요청에서 만들 수 있는 후보 수(n) 상한
+
+JOB_FINAL = ("done", "error")
+
+@dataclass
+class EditJob:
+    id: str
+    slug: str
+    label: str
+    prompt: str
+    base_version: str = ""
+    use_cache: bool = True   # False면 결과 캐시를 건너뛴다
+    region: Optional[List[str]] = None        # 부분 편집 영역 (parse_region)
+    mask: Optional[bytes] = field(default=None, repr=False)  # 부분 편집 마스크 PNG
+    group: str = ""          # 일괄 편집 등 묶음 id
+    status: str = "queued"   # queued | running | done | error
+    result: Optional[Dict[str, Any]] = None
+    error: str = ""
+    error_status: int = 0
+    created_at: float = 0.0
+    finished_at: float = 0.0
+    owner: int = 0           # 작업을 실행하는 프로세스 pid (스냅숏에서 읽은 작업이면 다른 워커)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "slug": self.slug, "label": self.label,
+            "status": self.status, "result": self.result,
+            "error": self.error, "error_status": self.error_status,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.to_dict(), "group": self.group, "owner": self.owner,
+                "created_at": self.created_at, "finished_at": self.finished_at}
+
+# 작업 상태 스냅숏 — 여러 워커 프로세스로 띄우면 상태 조회가 작업을 받은 프로세스가 아닌
+# 다른 프로세스로 갈 수 있으므로, 상태가 바뀔 때마다 DATA_DIR/.jobs/<id>.json 에 남긴다.
+JOBS_DIR = os.path.join(DATA_DIR, ".jobs")
+JOB_POLL_SEC = 0.5  # 다른 프로세스의 작업을 기다릴 때 스냅숏을 다시 읽는 간격
+
+def job_snapshot_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, re.sub(r"[^0-9a-zA-Z_-]", "", job_id) + ".json")
+
+def save_job_snapshot(job: EditJob):
+    try:
+        atomic_write(job_snapshot_path(job.id), json.dumps(job.snapshot(), ensure_ascii=False).encode("utf-8"))
+    except OSError:
+        log.exception("job snapshot write failed %s", job.id)
 
-        return jsonify({
-            "ok": True,
-            "version": out_name,
-            "image_url": f"/files{out_rel}"
-        })
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 400
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # 권한 없음 등 — 살아 있는 것으로 본다
+    return True
+
+def load_job_snapshot(job_id: str) -> Optional[EditJob]:
+    d = read_json(job_snapshot_path(job_id))
+    if not d:
+        return None
+    job = EditJob(id=d["id"], slug=d["slug"], label=d["label"], prompt="", group=d.get("group", ""),
+                  status=d["status"], result=d.get("result"), error=d.get("error", ""),
+                  error_status=d.get("error_status", 0), created_at=d.get("created_at", 0.0),
+                  finished_at=d.get("finished_at", 0.0), owner=d.get("owner", 0))
+    if job.status not in JOB_FINAL and job.owner and not pid_alive(job.owner):
+        job.status, job.error, job.error_status = "error", "서버가 재시작되어 작업이 중단되었습니다.", 503
+    return job
+
+def sweep_job_snapshots(ttl: int = 0):
+    """보관 시간이 지난 스냅숏 삭제 (종료된 프로세스가 남긴 것 포함)"""
+    if not os.path.isdir(JOBS_DIR):
+        return
+    cutoff = time.time() - (ttl or EDIT_JOB_TTL_SEC)
+    for fn in os.listdir(JOBS_DIR):
+        p = os.path.join(JOBS_DIR, fn)
+        try:
+            if os.path.getmtime(p) < cutoff:
+                os.remove(p)
+        except OSError:
+            pass
+
+class QueueFull(Exception):
+    pass
+
+class EditQueue:
+    """
+    편집 작업 큐 + 고정 크기 워커 풀.
+    프로젝트별 대기열을 라운드로빈으로 꺼내, 한 프로젝트가 큐를 독점하지 못하게 한다.
+    베이스를 지정하지 않은(=최신본 기준) 작업은 같은 삽화의 앞선 작업이 모두 끝난 뒤 실행한다.
+    베이스를 지정한 작업은 같은 삽화라도 병렬로 실행한다. (버전 번호는 인덱스에서 원자적으로 할당)
+    묶음(group) 작업은 묶음당 group_cap개까지만 동시에 실행한다.
+    runner(job) → 결과 dict, 실패 시 EditError.
+    """
+
+    def __init__(self, runner, workers: int = EDIT_WORKERS, max_depth: int = EDIT_QUEUE_MAX,
+                 ttl: int = EDIT_JOB_TTL_SEC, group_cap: int = BATCH_CONCURRENCY):
+        self.runner = runner
+        self.workers = workers
+        self.max_depth = max_depth
+        self.ttl = ttl
+        self.group_cap = group_cap
+        self.jobs: Dict[str, EditJob] = {}
+        self.groups: Dict[str, List[str]] = {}  # group id → job id 목록
+        self.changes = 0  # 상태 변화마다 1씩 증가 (SSE 대기용)
+        self._group_running: Dict[str, int] = {}
+        self._pending: Dict[str, "collections.deque[EditJob]"] = {}
+        self._order: "collections.deque[str]" = collections.deque()  # 라운드로빈 순서(slug)
+        self._depth = 0
+        self._busy: "collections.Counter[tuple]" = collections.Counter()  # (slug, label) → 실행 중 개수
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_workers(self):
+        # 첫 제출 시점에 워커를 띄운다 (import만으로 스레드가 생기지 않게)
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"edit-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, job: EditJob) -> EditJob:
+        return self.submit_many([job])[0]
+
+    def submit_many(self, jobs: List[EditJob]) -> List[EditJob]:
+        """전부 넣거나(QueueFull이면) 하나도 넣지 않는다."""
+        with self._cond:
+            if self._depth + len(jobs) > self.max_depth:
+                raise QueueFull()
+        # 스냅숏은 큐에 넣기 전에 — 워커가 먼저 끝내고 쓴 상태를 queued로 덮지 않게
+        for job in jobs:
+            job.created_at = time.time()
+            job.owner = os.getpid()
+            save_job_snapshot(job)
+        groups = {job.group for job in jobs if job.group}
+        for gid in groups:
+            atomic_write(job_snapshot_path("group-" + gid),
+                         json.dumps({"jobs": [j.id for j in jobs if j.group == gid]}).encode("utf-8"))
+        with self._cond:
+            if self._depth + len(jobs) > self.max_depth:
+                raise QueueFull()
+            self._ensure_workers()
+            self._purge()
+            for job in jobs:
+                self.jobs[job.id] = job
+                if job.group:
+                    self.groups.setdefault(job.group, []).append(job.id)
+                if job.slug not in self._pending:
+                    self._pending[job.slug] = collections.deque()
+                    self._order.append(job.slug)
+                self._pending[job.slug].append(job)
+                self._depth += 1
+            self.changes += 1
+            self._cond.notify_all()
+        return jobs
+
+    def has_group(self, group: str) -> bool:
+        with self._cond:
+            if group in self.groups:
+                return True
+        return os.path.exists(job_snapshot_path("group-" + group))
+
+    def is_local_group(self, group: str) -> bool:
+        with self._cond:
+            return group in self.groups
+
+    def group_jobs(self, group: str) -> List[EditJob]:
+        with self._cond:
+            if group in self.groups:
+                return [self.jobs[j] for j in self.groups[group] if j in self.jobs]
+        ids = (read_json(job_snapshot_path("group-" + group)) or {}).get("jobs", [])
+        return [j for j in (self.get(jid) for jid in ids) if j]
+
+    def get(self, job_id: str) -> Optional[EditJob]:
+        """이 프로세스의 작업, 없으면 다른 워커가 남긴 스냅숏"""
+        with self._cond:
+            job = self.jobs.get(job_id)
+        return job or load_job_snapshot(job_id)
+
+    def is_local(self, job: EditJob) -> bool:
+        with self._cond:
+            return self.jobs.get(job.id) is job
+
+    def position(self, job: EditJob) -> int:
+        """같은 프로젝트 대기열에서 앞에 남은 작업 수 (대기 중이 아니면 0)"""
+        with self._cond:
+            q = self._pending.get(job.slug)
+            if not q or job not in q:
+                return 0
+            return list(q).index(job)
+
+    def wait(self, job: EditJob, seen_status: str, timeout: float) -> EditJob:
+        """상태가 seen_status에서 바뀌거나 timeout이 지나면 돌아온다. 다른 워커의 작업이면 스냅숏을 다시 읽는다."""
+        if not self.is_local(job):
+            end = time.monotonic() + timeout
+            while time.monotonic() < end:
+                time.sleep(JOB_POLL_SEC)
+                fresh = load_job_snapshot(job.id)
+                if fresh and fresh.status != seen_status:
+                    return fresh
+            return job
+        with self._cond:
+            self._cond.wait_for(lambda: job.status != seen_status, timeout=timeout)
+        return job
+
+    def wait_change(self, seen: int, timeout: float) -> int:
+        """changes가 seen에서 바뀌거나 timeout이 지나면 현재 changes를 돌려준다."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.changes != seen, timeout=timeout)
+            return self.changes
+
+    def _runnable(self, job: EditJob) -> bool:
+        if not job.base_version and self._busy[(job.slug, job.label)]:
+            return False
+        return not job.group or self._group_running.get(job.group, 0) < self.group_cap
+
+    def _pick(self) -> Optional[EditJob]:
+        # 라운드로빈 순서대로, 지금 실행 가능한 가장 앞 작업
+        for _ in range(len(self._order)):
+            slug = self._order[0]
+            self._order.rotate(-1)
+            q = self._pending[slug]
+            for job in q:
+                if self._runnable(job):
+                    q.remove(job)
+                    if not q:
+                        del self._pending[slug]
+                        self._order.remove(slug)
+                    return job
+        return None
+
+    def _take(self) -> EditJob:
+        with self._cond:
+            job = None
+            while job is None:
+                self._cond.wait_for(lambda: self._depth > 0)
+                job = self._pick()
+                if job is None:
+                    self._cond.wait()
+            self._depth -= 1
+            self._busy[(job.slug, job.label)] += 1
+            if job.group:
+                self._group_running[job.group] = self._group_running.get(job.group, 0) + 1
+            job.status = "running"
+            self.changes += 1
+            self._cond.notify_all()
+        save_job_snapshot(job)
+        return job
+
+    def _work(self):
+        while True:
+            job = self._take()
+            metrics.observe("edit_job_wait_seconds", max(0.0, time.time() - job.created_at))
+            t0 = time.monotonic()
+            result, error, error_status = None, "", 0
+            try:
+                result = self.runner(job)
+            except EditError as e:
+                error, error_status = e.message, e.status
+            except Exception as e:
+                error, error_status = str(e), 500
+            metrics.observe("edit_job_seconds", time.monotonic() - t0, status="error" if error else "done")
+            with self._cond:
+                job.result = result
+                job.error = error
+                job.error_status = error_status
+                job.status = "error" if error else "done"
+                job.finished_at = time.time()
+                self._busy[(job.slug, job.label)] -= 1
+                if not self._busy[(job.slug, job.label)]:
+                    del self._busy[(job.slug, job.label)]
+                if job.group:
+                    self._group_running[job.group] -= 1
+                    if not self._group_running[job.group]:
+                        del self._group_running[job.group]
+                self.changes += 1
+                self._cond.notify_all()
+            save_job_snapshot(job)
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        for jid in [j.id for j in self.jobs.values() if j.status in JOB_FINAL and j.finished_at < cutoff]:
+            del self.jobs[jid]
+            try:
+                os.remove(job_snapshot_path(jid))
+            except OSError:
+                pass
+        for gid in [g for g, ids in self.groups.items() if not any(j in self.jobs for j in ids)]:
+            del self.groups[gid]
+            try:
+                os.remove(job_snapshot_path("group-" + gid))
+            except OSError:
+                pass
+
+edit_queue = EditQueue(lambda job: run_edit(job.slug, job.label, job.prompt, job.base_version,
+                                            use_cache=job.use_cache, region=job.region, mask=job.mask,
+                                            group=job.group))
+
+def form_flag(val) -> bool:
+    return str(val or "").strip().lower() in ("1", "true", "yes", "on")
+
+def sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return head + "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+
+@bp.route("/api/projects/<slug>/edit", methods=["POST"])
+def api_edit(slug):
+    """
+    form-data:
+      - label: "A"
+      - prompt: str
+      - base_version: "A-2.png" | "__ORIGINAL__" (optional)
+      - no_cache: "1" 이면 결과 캐시를 쓰지 않고 새로 생성 (optional)
+      - region: "x,y,w,h" (베이스 픽셀) 또는 "10%,20%,30%,40%" — 이 영역만 수정 (optional)
+      - mask: PNG 파일, 흰색(불투명)인 곳만 수정 (optional, region과 같이 오면 교집합)
+      - n: 후보 수 1~EDIT_MAX_CANDIDATES (optional, 기본 1)
+    작업을 큐에 넣고 즉시 job_id를 돌려준다. (202)
+    결과는 GET /api/jobs/<id> 또는 SSE /api/jobs/<id>/events 로 받는다.
+    n > 1 이면 후보마다 작업을 하나씩 만든 묶음으로 넣고 batch_id/job_ids를 돌려준다.
+    후보들은 같은 베이스(요청 시점의 최신본)에서 동시에 생성되며, 각각 새 버전으로 저장되고
+    끝나는 대로 SSE /api/batches/<id>/events 로 전달된다. 자동으로 최종 선택하지는 않는다.
+    모든 생성물은 versions/A-n.png 로 저장.
+    """
+    label = (request.form.get("label") or "").strip()
+    prompt = (request.form.get("prompt") or "").strip()
+    base_version = (request.form.get("base_version") or "").strip()
+
+    if not label or not prompt:
+        return jsonify({"ok": False, "error": "label, prompt가 필요합니다."}), 400
+
+    n = request.form.get("n", 1, type=int)
+    if not 1 <= n <= EDIT_MAX_CANDIDATES:
+        return jsonify({"ok": False, "error": f"n은 1~{EDIT_MAX_CANDIDATES} 사이여야 합니다."}), 400
+
+    mask_file = request.files.get("mask")
+    mask = mask_file.read() if mask_file else None
+
+    # 베이스/영역이 잘못됐으면 큐에 넣기 전에 바로 거절
+    try:
+        region = parse_region(request.form.get("region"))
+        base_img_path = resolve_edit_base(slug, label, base_version)
+        if region or mask:
+            resolve_edit_region(base_img_path, region, mask)
+    except EditError as e:
+        return jsonify({"ok": False, "error": e.message}), e.status
+
+    if n > 1:
+        # 후보들이 같은 베이스에서 동시에 돌도록 지금의 최신본으로 고정, 매번 새로 생성(캐시 X)
+        if not base_version:
+            base_version = ("__ORIGINAL__" if os.path.basename(base_img_path) == "original.png"
+                            else os.path.basename(base_img_path))
+        group = uuid.uuid4().hex
+        jobs = [EditJob(id=uuid.uuid4().hex, slug=slug, label=label, prompt=prompt, base_version=base_version,
+                        use_cache=False, region=region, mask=mask, group=group) for _ in range(n)]
+        try:
+            edit_queue.submit_many(jobs)
+        except QueueFull:
+            return jsonify({"ok": False, "error": "편집 요청이 많습니다. 잠시 후 다시 시도하세요."}), 429
+        return jsonify({"ok": True, "batch_id": group, "job_ids": [j.id for j in jobs],
+                        "base_version": base_version}), 202
+
+    job = EditJob(id=uuid.uuid4().hex, slug=slug, label=label, prompt=prompt, base_version=base_version,
+                  use_cache=not form_flag(request.form.get("no_cache")), region=region, mask=mask)
+    try:
+        edit_queue.submit(job)
+    except QueueFull:
+        return jsonify({"ok": False, "error": "편집 요청이 많습니다. 잠시 후 다시 시도하세요."}), 429
+    return jsonify({"ok": True, "job_id": job.id, "status": job.status}), 202
+
+@bp.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id):
+    job = edit_queue.get(job_id)
+    if not job:
+        return jsonify({"ok": False, "error": "작업이 없습니다."}), 404
+    d = job.to_dict()
+    d["position"] = edit_queue.position(job)
+    return jsonify({"ok": True, "job": d})
+
+@bp.route("/api/jobs/<job_id>/events", methods=["GET"])
+def api_job_events(job_id):
+    """작업 상태가 바뀔 때마다 SSE로 보내고, 끝나면 스트림을 닫는다."""
+    job = edit_queue.get(job_id)
+    if not job:
+        return jsonify({"ok": False, "error": "작업이 없습니다."}), 404
+
+    def gen():
+        nonlocal job
+        last = None
+        while True:
+            if job.status != last:
+                last = job.status
+                yield sse(job.to_dict())
+                if job.status in JOB_FINAL:
+                    return
+            else:
+                yield ": keep-alive\n\n"
+            job = edit_queue.wait(job, last, timeout=15)
+
+    return Response(gen(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ---------- 일괄 편집 ----------
+def group_summary(group: str) -> Dict[str, Any]:
+    jobs = edit_queue.group_jobs(group)
+    counts = collections.Counter(j.status for j in jobs)
+    return {
+        "id": group,
+        "total": len(jobs),
+        "queued": counts["queued"], "running": counts["running"],
+        "done": counts["done"], "failed": counts["error"],
+        "finished": all(j.status in JOB_FINAL for j in jobs),
+        "items": [j.to_dict() for j in jobs],
+    }
+
+def group_events(group: str):
+    """묶음 안의 작업 상태가 바뀔 때마다 해당 작업을, 모두 끝나면 요약을 보낸다."""
+    sent: Dict[str, str] = {}
+    seen = -1
+    # 다른 워커가 받은 묶음이면 이 프로세스의 변화 알림이 오지 않으므로 스냅숏을 자주 다시 읽는다
+    wait_sec = 15 if edit_queue.is_local_group(group) else JOB_POLL_SEC
+    last_ping = time.monotonic()
+    while True:
+        jobs = edit_queue.group_jobs(group)
+        for j in jobs:
+            if sent.get(j.id) != j.status:
+                sent[j.id] = j.status
+                yield sse(j.to_dict())
+        if all(j.status in JOB_FINAL for j in jobs):
+            summary = group_summary(group)
+            summary.pop("items")
+            yield sse(summary, event="end")
+            return
+        now = edit_queue.wait_change(seen, timeout=wait_sec)
+        if now == seen and time.monotonic() - last_ping >= 15:
+            last_ping = time.monotonic()
+            yield ": keep-alive\n\n"
+        seen = now
+
+@bp.route("/api/projects/<slug>/batch_edit", methods=["POST"])
+def api_batch_edit(slug):
+    """
+    json:
+      - labels: ["A", "B", ...] | "all"
+      - prompt: str
+      - base_versions: {"A": "A-2.png", "B": "__ORIGINAL__"} (optional, 없으면 최신본)
+      - no_cache: true 이면 결과 캐시를 쓰지 않음 (optional)
+    삽화별 편집 작업을 한 묶음(batch)으로 큐에 넣는다. (202)
+    진행 상황은 GET /api/batches/<id> 또는 SSE /api/batches/<id>/events.
+    """
+    data = request.get_json(force=True)
+    prompt = (data.get("prompt") or "").strip()
+    labels = data.get("labels") or []
+    base_versions = data.get("base_versions") or {}
+    use_cache = not form_flag(data.get("no_cache"))
+    if not prompt or not labels:
+        return jsonify({"ok": False, "error": "labels, prompt가 필요합니다."}), 400
+    if not os.path.isdir(project_path(slug)):
+        return jsonify({"ok": False, "error": "프로젝트가 없습니다."}), 404
+    if labels == "all":
+        labels = [r["label"] for r in index_labels(slug)]
+
+    batch_id = uuid.uuid4().hex
+    jobs, rejected = [], {}
+    for label in dict.fromkeys(str(L).strip() for L in labels):
+        base_version = (base_versions.get(label) or "").strip()
+        try:
+            resolve_edit_base(slug, label, base_version)
+        except EditError as e:
+            rejected[label] = e.message
+            continue
+        jobs.append(EditJob(id=uuid.uuid4().hex, slug=slug, label=label, prompt=prompt,
+                            base_version=base_version, use_cache=use_cache, group=batch_id))
+    if not jobs:
+        return jsonify({"ok": False, "error": "편집할 삽화가 없습니다.", "rejected": rejected}), 400
+    try:
+        edit_queue.submit_many(jobs)
+    except QueueFull:
+        return jsonify({"ok": False, "error": "편집 요청이 많습니다. 잠시 후 다시 시도하세요."}), 429
+    return jsonify({"ok": True, "batch_id": batch_id,
+                    "jobs": {j.label: j.id for j in jobs}, "rejected": rejected}), 202
+
+@bp.route("/api/batches/<batch_id>", methods=["GET"])
+def api_batch_status(batch_id):
+    if not edit_queue.has_group(batch_id):
+        return jsonify({"ok": False, "error": "작업이 없습니다."}), 404
+    return jsonify({"ok": True, "batch": group_summary(batch_id)})
+
+@bp.route("/api/batches/<batch_id>/events", methods=["GET"])
+def api_batch_events(batch_id):
+    if not edit_queue.has_group(batch_id):
+        return jsonify({"ok": False, "error": "작업이 없습니다."}), 404
+    return Response(group_events(batch_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
     
-@app.route("/api/projects/<slug>/download_selected_numbered", methods=["GET"])
+@bp.route("/api/projects/<slug>/download_selected_numbered", methods=["GET"])
 def api_download_selected_numbered(slug):
     base = project_path(slug)
     if not os.path.isdir(base):
@@ -526,37 +3690,183 @@ def api_download_selected_numbered(slug):
     proj_name = meta.get("name") or slug
     zip_name = f"{proj_name}.zip"
 
-    files_to_zip = []
-    illus_dir = illustrations_path(slug)
-    if os.path.isdir(illus_dir):
-        for label in sorted(os.listdir(illus_dir)):
-            Ldir = os.path.join(illus_dir, label)
-            if not os.path.isdir(Ldir):
-                continue
-            sel = read_text(os.path.join(Ldir, "selected.txt")).strip()
-            if sel:
-                if sel == "__ORIGINAL__":
-                    src = os.path.join(Ldir, "original.png")
-                else:
-                    src = os.path.join(Ldir, "versions", sel)
-            else:
-                src = os.path.join(Ldir, "original.png")
-            if os.path.exists(src):
-                files_to_zip.append(src)
+    files_to_zip = [src for _, src, _ in selected_files(slug) if os.path.exists(src)]
+    return zip_response([(src, f"{idx}.png") for idx, src in enumerate(files_to_zip, start=1)], zip_name)
+
+
+# ---------- 캐시 상태 ----------
+@bp.route("/api/cache/stats", methods=["GET"])
+def api_cache_stats():
+    return jsonify({"ok": True, "thumbs": thumb_cache.stats(), "results": result_cache.stats(),
+                    "inputs": input_cache.stats(), "model_calls": model_call_stats.stats(),
+                    "model_client": model_guard.stats()})
+
+# ---------- 메트릭 ----------
+metrics.define("counter", "cache_hits_total", "디스크 캐시 적중 수")
+metrics.define("counter", "cache_misses_total", "디스크 캐시 미스 수")
+metrics.define("gauge", "cache_bytes", "디스크 캐시 사용량")
+metrics.define("counter", "model_client_events_total", "모델 클라이언트 이벤트 (시도/재시도/헤징/타임아웃/거부)")
+metrics.define("gauge", "model_breaker_state", "서킷 브레이커 상태 (1=해당 상태)")
+metrics.define("gauge", "edit_queue_depth", "대기 중인 편집 작업 수")
+metrics.define("gauge", "edit_jobs_running", "실행 중인 편집 작업 수")
+metrics.define("gauge", "upload_ingest_pending", "처리 중인 업로드 수")
+metrics.define("gauge", "trash_entries", "휴지통 항목 수 (수거 중 포함)")
+metrics.define("counter", "cold_compacted_total", "cold로 옮긴 버전 수")
+metrics.define("counter", "cold_restores_total", "요청 시 cold에서 되돌린 버전 수")
+metrics.define("counter", "blob_dedup_total", "이미 있는 블롭을 다시 쓴 저장 수")
+metrics.define("counter", "blob_collected_total", "참조가 없어 지운 블롭 수")
+metrics.define("gauge", "process_resident_memory_bytes", "프로세스 RSS")
+
+def collect_runtime_metrics():
+    """스크레이프 시점에 읽는 값들 — 원래 상태를 가진 객체에서 그대로 가져온다."""
+    for name, cache in (("thumbs", thumb_cache), ("results", result_cache), ("inputs", input_cache)):
+        st = cache.stats()
+        metrics.set("cache_hits_total", st["hits"], cache=name)
+        metrics.set("cache_misses_total", st["misses"], cache=name)
+        metrics.set("cache_bytes", st["bytes"], cache=name)
+    with model_guard._lock:
+        counters = dict(model_guard.counters)
+    for event, n in counters.items():
+        metrics.set("model_client_events_total", n, event=event)
+    for state in ("closed", "open", "half_open"):
+        metrics.set("model_breaker_state", int(model_guard.breaker.state == state), state=state)
+    with edit_queue._cond:
+        metrics.set("edit_queue_depth", edit_queue._depth)
+        metrics.set("edit_jobs_running", sum(edit_queue._busy.values()))
+    with _ingest_lock:
+        metrics.set("upload_ingest_pending", len(_ingesting))
+    metrics.set("trash_entries", len(os.listdir(TRASH_DIR)) if os.path.isdir(TRASH_DIR) else 0)
+    try:
+        with open("/proc/self/statm") as f:
+            metrics.set("process_resident_memory_bytes", int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, AttributeError):
+        pass
+
+@bp.route("/metrics", methods=["GET"])
+def api_metrics():
+    collect_runtime_metrics()
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+# ---------- 상태 확인 ----------
+@bp.route("/healthz", methods=["GET"])
+def api_healthz():
+    """프로세스가 살아 있는지만 (liveness)"""
+    return jsonify({"ok": True})
+
+def check_data_dir() -> Optional[str]:
+    """DATA_DIR에 실제로 쓸 수 있는지 — 임시 파일을 만들고 지운다. 문제가 있으면 사유."""
+    try:
+        fd, tmp = tempfile.mkstemp(dir=DATA_DIR, prefix=".ready-", suffix=".tmp")
+        os.close(fd)
+        os.remove(tmp)
+    except OSError as e:
+        return str(e)
+    return None
+
+@bp.route("/readyz", methods=["GET"])
+def api_readyz():
+    """요청을 받을 준비가 됐는지 (readiness) — 데이터 폴더 쓰기, 인덱스 조회.
+    모델 자격 증명은 보지 않는다. (조회 기능은 키 없이도 동작)"""
+    checks: Dict[str, Any] = {}
+    err = check_data_dir()
+    checks["data_dir"] = err or "ok"
+    try:
+        count_projects()
+        checks["index"] = "ok"
+    except sqlite3.Error as e:
+        checks["index"] = str(e)
+    checks["model_client"] = model_client_state()
+    ok = checks["data_dir"] == "ok" and checks["index"] == "ok"
+    return jsonify({"ok": ok, "checks": checks}), 200 if ok else 503
+
+# ---------- 관리 명령 ----------
+@bp.cli.command("rebuild-index")
+def cli_rebuild_index():
+    """디스크(data/projects)에서 인덱스를 다시 만든다.  사용: flask --app app rebuild-index"""
+    index_rebuild()
+    print(f"인덱스 재생성 완료: 프로젝트 {count_projects()}개")
+
+
+@bp.cli.command("migrate-chat-logs")
+def cli_migrate_chat_logs():
+    """예전 chat_logs/<label>.txt 를 JSONL로 변환한다. (원본은 .txt.bak) 사용: flask --app app migrate-chat-logs"""
+    n = 0
+    for slug in os.listdir(PROJECTS_DIR):
+        cdir = chatlogs_path(slug)
+        if not os.path.isdir(cdir):
+            continue
+        for fn in os.listdir(cdir):
+            if fn.endswith(".txt") and ensure_chat_jsonl(slug, fn[:-4]):
+                n += 1
+        index_reload_project(slug)
+    print(f"채팅 로그 변환 완료: {n}개")
 
-    mem = io.BytesIO()
-    with zipfile.ZipFile(mem, "w", zipfile.ZIP_DEFLATED) as zf:
-        for idx, src in enumerate(files_to_zip, start=1):
-            zf.write(src, arcname=f"{idx}.png")
-    mem.seek(0)
-    return send_file(mem, mimetype="application/zip",
-                     as_attachment=True, download_name=zip_name)
+
+@bp.cli.command("compact-versions")
+@click.option("--min-age-days", type=float, default=None, help="이보다 오래된 비선택 버전만 (기본 COLD_AFTER_DAYS)")
+@click.option("--slug", default=None, help="한 프로젝트만")
+def cli_compact_versions(min_age_days, slug):
+    """오래된 비선택 버전을 versions/.cold 로 옮긴다.  사용: flask --app app compact-versions --min-age-days 7"""
+    min_age_sec = (COLD_AFTER_DAYS if min_age_days is None else min_age_days) * 86400
+    r = compact_project(slug, min_age_sec) if slug else compact_all(min_age_sec)
+    print(f"정리 완료: 버전 {r['versions']}개, {r['bytes_saved'] / 1e6:.1f}MB 절약")
+
+
+@bp.cli.command("migrate-blobs")
+def cli_migrate_blobs():
+    """기존 원본/버전 파일을 블롭 저장소(data/blobs) 링크로 바꾼다.  사용: flask --app app migrate-blobs"""
+    r = migrate_blobs()
+    print(f"블롭 변환 완료: 파일 {r['files']}개 중 {r['linked']}개 변환, {r['bytes_saved'] / 1e6:.1f}MB 절약")
 
 
 # ---------- 정적 진입 ----------
-@app.route("/")
+@bp.route("/")
 def index():
     return send_from_directory("static", "index.html")
 
+# ---------- 앱 생성 / 시작 ----------
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") != "0"  # warm_up에서 모델 클라이언트를 미리 만들지
+
+def startup(flask_app: Flask):
+    """앱마다 한 번: 인덱스 확인(필요하면 재생성), 남은 작업 정리. 여러 워커가 동시에 떠도 파일 잠금으로 차례로.
+    시작 상태는 flask_app.extensions["storybook"]에 — 같은 프로세스에서 앱을 또 만들어도 그 앱의 시작을 건너뛰지 않는다."""
+    state = flask_app.extensions.setdefault("storybook", {"started": False})
+    if state["started"]:
+        return
+    if multiprocessing.parent_process() is not None:
+        # 업로드 풀 자식(spawn)이 모듈 맨 위에서 create_app()을 부르는 스크립트를 다시 실행한 경우
+        state["started"] = True
+        return
+    with file_lock("startup"):
+        init_index()
+        sweep_job_snapshots()
+    if os.path.isdir(TRASH_DIR) and os.listdir(TRASH_DIR):
+        ensure_trash_collector()  # 지난 실행에서 남은 휴지통 항목 수거
+    recover_pending_uploads()  # 처리하던 프로세스가 죽어 남은 업로드
+    state.update(started=True, data_dir=os.path.abspath(DATA_DIR))
+
+def warm_up():
+    """워커가 요청을 받기 전에 미리 해 둘 일 — 첫 요청이 떠안지 않게.
+    PIL 플러그인, 인덱스 커넥션, 캐시 용량 계산, 오래된 버전 정리 스레드.
+    API 키가 있으면 모델 클라이언트도 백그라운드로 만든다."""
+    t0 = time.monotonic()
+    Image.init()
+    count_projects()
+    for cache in (thumb_cache, result_cache, input_cache):
+        cache.stats()
+    ensure_cold_compactor()
+    if MODEL_WARMUP and model_client_state() == "lazy":
+        threading.Thread(target=get_model_client, name="model-client-warmup", daemon=True).start()
+    log.info("warm-up %.0fms", (time.monotonic() - t0) * 1000)
+
+def create_app() -> Flask:
+    """앱 팩토리. import만으로는 앱을 만들지 않는다 — serve.py, python app.py, flask --app app(팩토리를 찾아 부름),
+    gunicorn 'app:create_app()' 이 부른다."""
+    flask_app = Flask(__name__, static_folder="static", static_url_path="/static")
+    CORS(flask_app)
+    flask_app.register_blueprint(bp)
+    startup(flask_app)
+    return flask_app
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    create_app().run(host="0.0.0.0", port=8000, debug=True)
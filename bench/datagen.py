@@ -0,0 +1,137 @@
+"""
+벤치마크용 합성 데이터 생성기 — data/projects/... 레이아웃을 그대로 디스크에 만든다.
+
+    python bench/datagen.py /tmp/bench-data --projects 50 --labels 12 --versions 4 --size 1600x1200
+
+인덱스(index.sqlite3)는 만들지 않는다. 앱을 이 DATA_DIR로 띄우면 시작할 때 디스크에서 재생성한다.
+같은 seed면 같은 데이터가 나온다. (이미지는 크기별로 몇 장만 그려 복사해 쓴다)
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import shutil
+import string
+
+from PIL import Image, ImageDraw, ImageFilter
+
+IMAGE_VARIANTS = 6  # 크기별로 실제로 그리는 이미지 수
+
+
+def parse_size(val: str):
+    w, h = val.lower().split("x")
+    return int(w), int(h)
+
+
+def synth_png(size, rng: random.Random) -> bytes:
+    """삽화 비슷한 PNG — 그라데이션 배경 + 도형 + 약한 노이즈 (실제 삽화와 비슷한 압축률)"""
+    w, h = size
+    c1 = [rng.randint(0, 255) for _ in range(3)]
+    c2 = [rng.randint(0, 255) for _ in range(3)]
+    grad = Image.linear_gradient("L").resize((w, h))
+    img = Image.composite(Image.new("RGB", (w, h), tuple(c1)), Image.new("RGB", (w, h), tuple(c2)), grad)
+    draw = ImageDraw.Draw(img)
+    for _ in range(24):
+        x0, y0 = rng.randrange(w), rng.randrange(h)
+        x1, y1 = x0 + rng.randrange(w // 3 + 1), y0 + rng.randrange(h // 3 + 1)
+        fill = tuple(rng.randint(0, 255) for _ in range(3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)((x0, y0, x1, y1), fill=fill)
+    img = img.filter(ImageFilter.GaussianBlur(1))
+    noise = Image.effect_noise((w, h), 12).convert("RGB")
+    img = Image.blend(img, noise, 0.08).convert("RGBA")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def label_name(i: int) -> str:
+    """0 → A, 25 → Z, 26 → AA ... (앱의 next_label 순서와 같다)"""
+    s = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        s = string.ascii_uppercase[r] + s
+    return s
+
+
+def generate(data_dir: str, projects: int = 20, labels: int = 10, versions: int = 3,
+             sizes=((1600, 1200),), seed: int = 1) -> dict:
+    """data_dir/projects 아래에 projects × labels × versions 구조를 만든다. 기존 내용은 지운다."""
+    rng = random.Random(seed)
+    root = os.path.join(data_dir, "projects")
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+    index_path = os.path.join(data_dir, "index.sqlite3")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(index_path + suffix):
+            os.remove(index_path + suffix)
+    os.makedirs(root, exist_ok=True)
+
+    pool = {size: [synth_png(size, rng) for _ in range(IMAGE_VARIANTS)] for size in sizes}
+    t0 = datetime.datetime(2025, 1, 1, 9, 0, 0)
+    total_bytes = 0
+    for p in range(projects):
+        slug = f"bench-{p:04d}"
+        base = os.path.join(root, slug)
+        os.makedirs(os.path.join(base, "illustrations"))
+        os.makedirs(os.path.join(base, "chat_logs"))
+        created = t0 + datetime.timedelta(hours=p)
+        with open(os.path.join(base, "project.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": f"벤치 프로젝트 {p:04d}",
+                       "created_at": created.isoformat(timespec="seconds"),
+                       "updated_at": (created + datetime.timedelta(minutes=30)).isoformat(timespec="seconds")},
+                      f, ensure_ascii=False, indent=2)
+        for li in range(labels):
+            L = label_name(li)
+            Ldir = os.path.join(base, "illustrations", L)
+            os.makedirs(os.path.join(Ldir, "versions"))
+            size = sizes[(p + li) % len(sizes)]
+            imgs = pool[size]
+            with open(os.path.join(Ldir, "original.png"), "wb") as f:
+                f.write(imgs[rng.randrange(len(imgs))])
+            total_bytes += len(imgs[0])
+            ts = created
+            chat = [{"seq": 1, "ts": ts.isoformat(timespec="seconds"), "kind": "INIT",
+                     "text": f"Uploaded original for {L}"}]
+            prev = f"/projects/{slug}/illustrations/{L}/original.png"
+            for n in range(1, versions + 1):
+                name = f"{L}-{n}.png"
+                with open(os.path.join(Ldir, "versions", name), "wb") as f:
+                    f.write(imgs[rng.randrange(len(imgs))])
+                total_bytes += len(imgs[0])
+                ts += datetime.timedelta(minutes=1)
+                out = f"/projects/{slug}/illustrations/{L}/versions/{name}"
+                seq = len(chat) + 1
+                chat.append({"seq": seq, "ts": ts.isoformat(timespec="seconds"), "kind": "USER",
+                             "base": prev, "prompt": f"수정 요청 {n}"})
+                chat.append({"seq": seq + 1, "ts": ts.isoformat(timespec="seconds"), "kind": "MODEL",
+                             "out": out, "version": name, "req": seq})
+                prev = out
+            selected = f"{L}-{rng.randint(1, versions)}.png" if versions and rng.random() < 0.7 else "__ORIGINAL__"
+            with open(os.path.join(Ldir, "selected.txt"), "w", encoding="utf-8") as f:
+                f.write(selected)
+            with open(os.path.join(base, "chat_logs", f"{L}.jsonl"), "w", encoding="utf-8") as f:
+                for e in chat:
+                    f.write(json.dumps(e, ensure_ascii=False) + "\n")
+    return {"projects": projects, "labels": labels, "versions": versions,
+            "sizes": ["%dx%d" % s for s in sizes], "seed": seed, "image_bytes": total_bytes}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="벤치마크용 합성 데이터 생성")
+    ap.add_argument("data_dir")
+    ap.add_argument("--projects", type=int, default=20)
+    ap.add_argument("--labels", type=int, default=10)
+    ap.add_argument("--versions", type=int, default=3)
+    ap.add_argument("--size", action="append", type=parse_size, help="WxH, 여러 번 주면 섞어서 사용")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    info = generate(args.data_dir, args.projects, args.labels, args.versions,
+                    tuple(args.size or [(1600, 1200)]), args.seed)
+    print(json.dumps(info, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
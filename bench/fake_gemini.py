@@ -0,0 +1,163 @@
+"""
+로컬 가짜 Gemini 서버 — 지연/오류를 주입해서 모델 클라이언트(재시도/헤징/서킷 브레이커)를 시험한다.
+
+사용:
+    python bench/fake_gemini.py --port 8765 --latency 0.8 --tail 0.05 --tail-latency 8 --error-rate 0.1
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=dummy python app.py
+
+generateContent 요청을 받으면 입력 이미지를 단색으로 칠한 PNG를 돌려준다.
+오류/지연 설정은 실행 중에도 POST /_config (json) 로 바꿀 수 있다.
+"""
+import argparse
+import base64
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+_GENERATE_RE = re.compile(r"^/[^/]+/models/([^/:]+):generateContent$")
+
+
+class FakeConfig:
+    def __init__(self, latency=0.5, jitter=0.1, tail=0.0, tail_latency=5.0,
+                 error_rate=0.0, error_codes=(500, 503, 429), outage=False):
+        self.latency = latency            # 기본 응답 시간(초)
+        self.jitter = jitter              # ± 흔들림(초)
+        self.tail = tail                  # 느린 응답 비율 (0~1)
+        self.tail_latency = tail_latency  # 느린 응답의 응답 시간(초)
+        self.error_rate = error_rate      # 오류 응답 비율 (0~1)
+        self.error_codes = list(error_codes)
+        self.outage = outage              # True면 모든 요청에 503
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def update(self, **changes):
+        with self._lock:
+            for k, v in changes.items():
+                if hasattr(self, k) and not k.startswith("_"):
+                    setattr(self, k, v)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: v for k, v in vars(self).items() if not k.startswith("_")}
+
+
+def output_png(req_body: dict) -> bytes:
+    """입력 이미지와 같은 크기의 단색 PNG (입력이 없으면 512x512)"""
+    size = (512, 512)
+    for content in req_body.get("contents", []):
+        for part in content.get("parts", []):
+            blob = part.get("inlineData") or part.get("inline_data")
+            if blob and blob.get("data"):
+                try:
+                    with Image.open(io.BytesIO(base64.b64decode(blob["data"]))) as im:
+                        size = im.size
+                except Exception:
+                    pass
+    buf = io.BytesIO()
+    Image.new("RGBA", size, (random.randint(0, 255), 120, 200, 255)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def make_handler(cfg: FakeConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive — 클라이언트 연결 재사용 확인용
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, code: int, obj: dict):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 클라이언트가 먼저 끊음 (마감 초과/헤징에서 진 요청)
+
+        def do_GET(self):
+            if self.path == "/_stats":
+                return self._send_json(200, cfg.snapshot())
+            self._send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            if self.path == "/_config":
+                cfg.update(**json.loads(raw or b"{}"))
+                return self._send_json(200, cfg.snapshot())
+
+            m = _GENERATE_RE.match(self.path.split("?")[0])
+            if not m:
+                return self._send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+
+            with cfg._lock:
+                cfg.requests += 1
+                slow = random.random() < cfg.tail
+                fail = cfg.outage or random.random() < cfg.error_rate
+                code = 503 if cfg.outage else random.choice(cfg.error_codes or [500])
+                if fail:
+                    cfg.errors += 1
+            delay = cfg.tail_latency if slow else max(0.0, cfg.latency + random.uniform(-cfg.jitter, cfg.jitter))
+            time.sleep(delay)
+            if fail:
+                return self._send_json(code, {"error": {"code": code, "message": "injected error",
+                                                        "status": "UNAVAILABLE"}})
+
+            png = output_png(json.loads(raw or b"{}"))
+            self._send_json(200, {
+                "candidates": [{
+                    "content": {"role": "model", "parts": [
+                        {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(png).decode("ascii")}}
+                    ]},
+                    "finishReason": "STOP",
+                }],
+                "modelVersion": m.group(1),
+            })
+
+    return Handler
+
+
+def serve(port: int = 8765, host: str = "127.0.0.1", **config) -> ThreadingHTTPServer:
+    """백그라운드 스레드로 띄운다. (벤치마크/스크립트에서 사용) 끝낼 때 server.shutdown()"""
+    cfg = FakeConfig(**config)
+    server = ThreadingHTTPServer((host, port), make_handler(cfg))
+    server.daemon_threads = True
+    server.config = cfg
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="가짜 Gemini 서버 (지연/오류 주입)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.5, help="기본 응답 시간(초)")
+    ap.add_argument("--jitter", type=float, default=0.1)
+    ap.add_argument("--tail", type=float, default=0.0, help="느린 응답 비율 0~1")
+    ap.add_argument("--tail-latency", type=float, default=5.0, help="느린 응답의 응답 시간(초)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="오류 응답 비율 0~1")
+    ap.add_argument("--outage", action="store_true", help="모든 요청에 503")
+    args = ap.parse_args()
+
+    cfg = FakeConfig(latency=args.latency, jitter=args.jitter, tail=args.tail,
+                     tail_latency=args.tail_latency, error_rate=args.error_rate, outage=args.outage)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(cfg))
+    server.daemon_threads = True
+    print(f"fake gemini on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+벤치마크 실행기 — 합성 데이터 + 모델 스텁으로 서버 성능을 잰다.
+
+    python bench/run.py --projects 30 --labels 10 --versions 3 --size 1600x1200 --out bench-before.json
+    (코드 변경 후)
+    python bench/run.py --projects 30 --labels 10 --versions 3 --size 1600x1200 --out bench-after.json \\
+                        --compare bench-before.json
+
+임시 DATA_DIR에 데이터를 만들고, 앱을 같은 프로세스 안의 스레드 HTTP 서버로 띄운 뒤
+시나리오별로 요청을 보내 지연 백분위/처리량/최대 메모리를 JSON으로 남긴다.
+메모리(peak_rss_mb)는 부하를 거는 쪽까지 포함한 프로세스 RSS다. (업로드 워커 프로세스는 제외)
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import datagen  # noqa: E402
+from stub_model import StubClient  # noqa: E402
+
+SCENARIOS = ["list", "list_page", "detail", "files", "thumbs", "download_selected",
+             "download_numbered", "edit_single", "edit_concurrent", "upload"]
+
+
+# ---------- 측정 ----------
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource  # /proc이 없으면 지금까지의 최대값으로 대신
+        ru = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return ru if sys.platform == "darwin" else ru * 1024
+
+
+class PeakRSS:
+    """시나리오 동안 RSS를 주기적으로 재서 최대값을 잡는다."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = rss_bytes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+def percentile(sorted_vals, p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, int(round(p / 100 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def run_scenario(fn, requests: int, concurrency: int):
+    """fn(i) → (성공 여부, 받은 바이트)를 requests번, concurrency개 스레드로 실행"""
+    def one(i):
+        t = time.perf_counter()
+        try:
+            ok, nbytes = fn(i)
+        except Exception:
+            ok, nbytes = False, 0
+        return time.perf_counter() - t, ok, nbytes
+
+    with PeakRSS() as mem:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as ex:
+            results = list(ex.map(one, range(requests)))
+        wall = time.perf_counter() - t0
+    lat = sorted(r[0] * 1000 for r in results)
+    total_bytes = sum(r[2] for r in results)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for r in results if not r[1]),
+        "mean_ms": round(sum(lat) / len(lat), 2) if lat else 0.0,
+        "p50_ms": round(percentile(lat, 50), 2),
+        "p90_ms": round(percentile(lat, 90), 2),
+        "p99_ms": round(percentile(lat, 99), 2),
+        "max_ms": round(lat[-1], 2) if lat else 0.0,
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "mb_per_s": round(total_bytes / wall / 1e6, 2) if wall else 0.0,
+        "wall_s": round(wall, 3),
+        "peak_rss_mb": round(mem.peak / 1e6, 1),
+    }
+
+
+# ---------- HTTP ----------
+class Client:
+    def __init__(self, host: str, port: int, timeout: float = 300):
+        self.host, self.port, self.timeout = host, port, timeout
+
+    def request(self, method: str, path: str, body: bytes = None, headers=None):
+        """→ (status, 본문 바이트 수, 본문) — 본문은 1MB 이하일 때만 보관"""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            resp = conn.getresponse()
+            n, keep = 0, []
+            while True:
+                chunk = resp.read(1 << 16)
+                if not chunk:
+                    break
+                n += len(chunk)
+                if n <= 1 << 20:
+                    keep.append(chunk)
+            return resp.status, n, b"".join(keep) if n <= 1 << 20 else b""
+        finally:
+            conn.close()
+
+    def get_json(self, path: str):
+        status, _, body = self.request("GET", path)
+        return status, json.loads(body or b"{}")
+
+    def wait_job(self, job_id: str) -> bool:
+        """SSE로 작업 완료까지 기다린다."""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request("GET", f"/api/jobs/{job_id}/events")
+            resp = conn.getresponse()
+            for raw in resp:
+                line = raw.decode("utf-8").strip()
+                if line.startswith("data:"):
+                    job = json.loads(line[5:])
+                    if job.get("status") in ("done", "error"):
+                        return job["status"] == "done"
+            return False
+        finally:
+            conn.close()
+
+
+def multipart(fields: dict, files: list):
+    """fields {이름: 값}, files [(필드명, 파일명, 바이트)] → (본문, Content-Type)"""
+    boundary = uuid.uuid4().hex
+    out = []
+    for k, v in fields.items():
+        out.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode("utf-8"))
+    for field, fname, data in files:
+        out.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{fname}"\r\n'
+                   f'Content-Type: image/png\r\n\r\n'.encode("utf-8") + data + b"\r\n")
+    out.append(f"--{boundary}--\r\n".encode("ascii"))
+    return b"".join(out), f"multipart/form-data; boundary={boundary}"
+
+
+# ---------- 시나리오 ----------
+def build_scenarios(cli: Client, data: dict, args):
+    slugs = data["slugs"]
+    labels = data["labels"]
+    rng = random.Random(args.seed)
+    pick = lambda: (rng.choice(slugs), rng.choice(labels))  # noqa: E731
+    read_n, edit_n, upload_n = args.requests, args.edit_requests, args.upload_requests
+
+    def ok_get(path):
+        status, n, _ = cli.request("GET", path)
+        return status == 200, n
+
+    def s_list(i):
+        return ok_get("/api/projects")
+
+    def s_list_page(i):
+        return ok_get(f"/api/projects?limit=20&offset={rng.randrange(max(1, len(slugs)))}")
+
+    def s_detail(i):
+        return ok_get(f"/api/projects/{rng.choice(slugs)}")
+
+    def version_path(slug, label):
+        n = rng.randint(1, args.versions) if args.versions else 0
+        tail = f"versions/{label}-{n}.png" if n else "original.png"
+        return f"projects/{slug}/illustrations/{label}/{tail}"
+
+    def s_files(i):
+        return ok_get("/files/" + version_path(*pick()))
+
+    def s_thumbs(i):
+        return ok_get("/thumbs/" + version_path(*pick()) + "?w=320")
+
+    def s_download_selected(i):
+        return ok_get(f"/api/projects/{rng.choice(slugs)}/download_selected")
+
+    def s_download_numbered(i):
+        return ok_get(f"/api/projects/{rng.choice(slugs)}/download_selected_numbered")
+
+    def edit(slug, label):
+        body, ctype = multipart({"label": label, "prompt": f"bench {uuid.uuid4().hex[:8]}", "no_cache": "1"}, [])
+        status, _, resp = cli.request("POST", f"/api/projects/{slug}/edit", body, {"Content-Type": ctype})
+        if status != 202:
+            return False, 0
+        return cli.wait_job(json.loads(resp)["job_id"]), 0
+
+    pairs = [(s, L) for s in slugs for L in labels]
+    rng.shuffle(pairs)
+
+    def s_edit_single(i):
+        return edit(*pick())
+
+    def s_edit_concurrent(i):
+        return edit(*pairs[i % len(pairs)])  # 서로 다른 삽화 → 큐에서 병렬 실행
+
+    upload_imgs = [datagen.synth_png(args.sizes[k % len(args.sizes)], rng) for k in range(args.upload_files)]
+
+    def s_upload(i):
+        # 새 프로젝트에 업로드 → 원본 처리(백그라운드)가 끝나 pending이 없어질 때까지
+        slug = f"bench-upload-{i:04d}-{uuid.uuid4().hex[:6]}"
+        status, _, resp = cli.request("POST", "/api/projects", json.dumps({"name": slug}).encode("utf-8"),
+                                      {"Content-Type": "application/json"})
+        if status != 200:
+            return False, 0
+        slug = json.loads(resp)["slug"]
+        body, ctype = multipart({}, [("images", f"{k}.png", b) for k, b in enumerate(upload_imgs)])
+        status, _, _ = cli.request("POST", f"/api/projects/{slug}/illustrations", body, {"Content-Type": ctype})
+        if status != 200:
+            return False, 0
+        while True:
+            status, detail = cli.get_json(f"/api/projects/{slug}")
+            if status != 200:
+                return False, 0
+            if not any(it.get("pending") for it in detail.get("illustrations", [])):
+                return True, len(body)
+            time.sleep(0.02)
+
+    return {
+        "list": (s_list, read_n, args.concurrency),
+        "list_page": (s_list_page, read_n, args.concurrency),
+        "detail": (s_detail, read_n, args.concurrency),
+        "files": (s_files, read_n, args.concurrency),
+        "thumbs": (s_thumbs, read_n, args.concurrency),
+        "download_selected": (s_download_selected, max(1, read_n // 10), args.concurrency),
+        "download_numbered": (s_download_numbered, max(1, read_n // 10), args.concurrency),
+        "edit_single": (s_edit_single, edit_n, 1),
+        "edit_concurrent": (s_edit_concurrent, edit_n, args.edit_concurrency),
+        "upload": (s_upload, upload_n, 1),
+    }
+
+
+# ---------- 비교 ----------
+def compare(base: dict, cur: dict):
+    print(f"\n{'scenario':20} {'p50 ms':>22} {'p99 ms':>22} {'rps':>22}")
+    for name, now in cur["scenarios"].items():
+        old = base.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        cells = []
+        for key in ("p50_ms", "p99_ms", "throughput_rps"):
+            a, b = old[key], now[key]
+            delta = f"{(b - a) / a * 100:+.0f}%" if a else "n/a"
+            cells.append(f"{a:>8} → {b:<8} {delta:>4}")
+        print(f"{name:20} " + " ".join(f"{c:>22}" for c in cells))
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ""
+
+
+def main():
+    ap = argparse.ArgumentParser(description="서버 벤치마크 (합성 데이터 + 모델 스텁)")
+    ap.add_argument("--projects", type=int, default=20)
+    ap.add_argument("--labels", type=int, default=8)
+    ap.add_argument("--versions", type=int, default=3)
+    ap.add_argument("--size", action="append", type=datagen.parse_size, dest="sizes",
+                    help="이미지 크기 WxH (여러 번 주면 섞어서 사용, 기본 1600x1200)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help="쉼표로 구분, 기본 전부")
+    ap.add_argument("--requests", type=int, default=200, help="읽기 시나리오당 요청 수 (다운로드는 1/10)")
+    ap.add_argument("--concurrency", type=int, default=8, help="읽기 시나리오 동시 요청 수")
+    ap.add_argument("--edit-requests", type=int, default=16)
+    ap.add_argument("--edit-concurrency", type=int, default=8)
+    ap.add_argument("--upload-requests", type=int, default=4)
+    ap.add_argument("--upload-files", type=int, default=8, help="업로드 한 번에 보내는 이미지 수")
+    ap.add_argument("--model", choices=["stub", "fake-http"], default="stub",
+                    help="stub = 프로세스 안 스텁, fake-http = bench/fake_gemini.py 서버 + 실제 SDK 경로")
+    ap.add_argument("--model-latency", type=float, default=0.5)
+    ap.add_argument("--model-jitter", type=float, default=0.05)
+    ap.add_argument("--data-dir", help="지정하면 그 위치에 데이터 생성 (기본: 임시 폴더, 끝나면 삭제)")
+    ap.add_argument("--keep", action="store_true", help="임시 데이터 폴더를 지우지 않음")
+    ap.add_argument("--out", help="결과 JSON 경로 (기본: 표준 출력)")
+    ap.add_argument("--compare", help="이전 결과 JSON과 비교해서 출력")
+    args = ap.parse_args()
+    args.sizes = args.sizes or [(1600, 1200)]
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in names if s not in SCENARIOS]
+    if unknown:
+        ap.error(f"알 수 없는 시나리오: {', '.join(unknown)}")
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="bench-data-")
+    print(f"데이터 생성: {data_dir}", file=sys.stderr)
+    info = datagen.generate(data_dir, args.projects, args.labels, args.versions, tuple(args.sizes), args.seed)
+
+    # app은 import 시점에 환경 변수를 읽는다
+    os.environ["DATA_DIR"] = data_dir
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ.setdefault("MODEL_RPS", "0")  # 스텁 상대로는 속도 제한 없이
+    fake = None
+    if args.model == "fake-http":
+        import fake_gemini
+        fake = fake_gemini.serve(0, latency=args.model_latency, jitter=args.model_jitter)
+        os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{fake.server_port}"
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    t_import = time.perf_counter()
+    import app as app_module  # noqa: E402
+    flask_app = app_module.create_app()  # 인덱스 재생성 포함
+    index_build_s = time.perf_counter() - t_import
+    if args.model == "stub":
+        app_module.set_model_client(StubClient(args.model_latency, args.model_jitter, seed=args.seed))
+
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cli = Client("127.0.0.1", server.server_port)
+
+    data = {"slugs": [f"bench-{p:04d}" for p in range(args.projects)],
+            "labels": [datagen.label_name(i) for i in range(args.labels)]}
+    scenarios = build_scenarios(cli, data, args)
+    results = {}
+    try:
+        for name in names:
+            fn, n, conc = scenarios[name]
+            print(f"  {name} ({n} req, 동시 {conc}) ...", file=sys.stderr)
+            results[name] = run_scenario(fn, n, conc)
+    finally:
+        server.shutdown()
+        if fake:
+            fake.shutdown()
+        app_module.flush_project_touches()
+        if not args.data_dir and not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": args.model,
+            "model_latency_s": args.model_latency,
+            "data": info,
+            "index_build_s": round(index_build_s, 3),
+        },
+        "scenarios": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"결과: {args.out}", file=sys.stderr)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+벤치마크용 모델 스텁 — gemini_client 자리에 끼워 쓴다. (app.set_model_client)
+
+네트워크 없이 지연만 흉내 내고, 입력 이미지와 같은 크기(또는 지정 크기)의 PNG를 돌려준다.
+HTTP 경로(SDK/연결 풀/재시도)까지 재려면 bench/fake_gemini.py + GEMINI_BASE_URL을 쓴다.
+"""
+import io
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from PIL import Image
+
+
+class StubModels:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, out_size=None, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.out_size = out_size  # None이면 입력 이미지 크기
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._png_cache = {}
+
+    def _input_size(self, contents):
+        for part in contents:
+            blob = getattr(part, "inline_data", None)
+            if blob is not None and blob.data:
+                with Image.open(io.BytesIO(blob.data)) as im:
+                    return im.size
+            if isinstance(part, Image.Image):
+                return part.size
+        return (512, 512)
+
+    def _png(self, size) -> bytes:
+        with self._lock:
+            hit = self._png_cache.get(size)
+        if hit is None:
+            buf = io.BytesIO()
+            Image.new("RGBA", size, (40, 120, 200, 255)).save(buf, format="PNG")
+            hit = buf.getvalue()
+            with self._lock:
+                self._png_cache[size] = hit
+        return hit
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        time.sleep(delay)
+        data = self._png(self.out_size or self._input_size(contents))
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=data, mime_type="image/png"), text=None)
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))], text="")
+
+
+class StubClient:
+    """genai.Client 흉내 — client.models.generate_content(...) 만 있으면 된다."""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, out_size=None, seed: int = 1):
+        self.models = StubModels(latency, jitter, out_size, seed)
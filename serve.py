@@ -0,0 +1,85 @@
+"""
+운영용 실행 — WSGI 서버로 app을 띄운다. (개발 중에는 기존처럼 python app.py: 디버그 + 자동 재시작)
+
+    python serve.py                              # 기본: 0.0.0.0:8000, 워커 min(4, CPU)개 × 스레드 16개
+    python serve.py --workers 4 --threads 16 --port 8000
+    SERVE_WORKERS=2 SERVE_THREADS=32 python serve.py
+
+gunicorn이 있으면(리눅스/맥) 프로세스 여러 개 × 스레드(gthread), 없으면 waitress(한 프로세스, 스레드만 — 윈도우 가능).
+각 워커는 요청을 받기 전에 app.warm_up()을 한 번 돌린다.
+편집 큐/속도 제한(EDIT_WORKERS, MODEL_RPS 등)과 캐시 적중 통계는 프로세스마다 따로다.
+"""
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def load_app():
+    import app as application
+    flask_app = application.create_app()  # 인덱스 확인/남은 작업 정리
+    application.warm_up()
+    return flask_app
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class App(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", args.timeout)
+            self.cfg.set("graceful_timeout", 30)
+            self.cfg.set("keepalive", 5)
+            if args.access_log:
+                self.cfg.set("accesslog", "-")
+
+        def load(self):
+            return load_app()  # preload 없이 워커 프로세스마다 (포크 전에 스레드/DB 연결을 만들지 않게)
+
+    App().run()
+
+
+def run_waitress(args):
+    from waitress import serve
+    if args.workers > 1:
+        print("waitress는 한 프로세스로만 실행합니다. (--workers 무시, 스레드만 사용)", file=sys.stderr)
+    serve(load_app(), host=args.host, port=args.port, threads=args.threads,
+          channel_timeout=args.timeout)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="운영용 서버 실행")
+    ap.add_argument("--host", default=os.getenv("SERVE_HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", str(min(4, os.cpu_count() or 1)))),
+                    help="프로세스 수 (gunicorn)")
+    ap.add_argument("--threads", type=int, default=int(os.getenv("SERVE_THREADS", "16")),
+                    help="프로세스당 요청 스레드 수 (SSE 연결도 하나씩 차지)")
+    ap.add_argument("--timeout", type=int, default=int(os.getenv("SERVE_TIMEOUT", "120")),
+                    help="응답 없는 워커/연결을 정리하기까지의 시간(초)")
+    ap.add_argument("--server", choices=["auto", "gunicorn", "waitress"], default=os.getenv("SERVE_SERVER", "auto"))
+    ap.add_argument("--access-log", action="store_true", help="요청 로그 출력 (gunicorn)")
+    args = ap.parse_args()
+
+    server = args.server
+    if server == "auto":
+        try:
+            import gunicorn  # noqa: F401
+            server = "gunicorn"
+        except ImportError:
+            server = "waitress"
+    if server == "gunicorn":
+        run_gunicorn(args)
+    else:
+        run_waitress(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,16 @@ const app = $("#app");
 let state = {
   view: "projects",   // "projects" | "editor"
   projects: [],
-  current: null,      // { slug, meta, illustrations: [...] }
+  current: null,      // { slug, meta, rev, illustrations: [...] }
   currentLabel: null, // "A", ...
   editBaseVersion: null, // "__ORIGINAL__" | "A-2.png" | null
+  editRegion: null,      // { src, x, y, w, h } 부분 수정 영역 (베이스 이미지 대비 0~1)
   generating: false,
   detailImage: null,
-  chatCache: {},       // { "<slug>|<label>": [{baseUrl,prompt,outUrl,outFile}] }
-  chatInitTs: {}
+  chatCache: {},       // { "<slug>|<label>|<asset_v>": [{baseUrl,prompt,outUrl,outFile}] }
+  chatInitTs: {},
+  chatSeq: {},         // { key: 마지막으로 받은 seq } → 다음엔 since=seq 이후만 요청
+  chatPending: {}      // { key: { USER seq: MODEL 응답을 아직 못 받은 요청 } }
 };
 
 async function jget(url){ const r=await fetch(url); return r.json(); }
@@ -22,6 +25,43 @@ async function jpost(url, body){
 async function jpostForm(url, form){ const r=await fetch(url,{method:"POST",body:form}); return r.json(); }
 async function jdel(url){ const r=await fetch(url,{method:"DELETE"}); return r.json(); }
 
+// 편집 작업(job) 완료 대기: SSE 우선, 끊기면 폴링
+function waitJob(jobId){
+  const done = j => ({ ok: j.status==="done", error: j.error, ...(j.result||{}) });
+  return new Promise(resolve=>{
+    const poll = async ()=>{
+      while(true){
+        const r = await jget(`/api/jobs/${jobId}`);
+        if(!r.ok) return resolve(r);
+        if(r.job.status==="done" || r.job.status==="error") return resolve(done(r.job));
+        await new Promise(t=>setTimeout(t, 1000));
+      }
+    };
+    if(!window.EventSource) return poll();
+    const es = new EventSource(`/api/jobs/${jobId}/events`);
+    es.onmessage = ev=>{
+      const j = JSON.parse(ev.data);
+      if(j.status==="done" || j.status==="error"){ es.close(); resolve(done(j)); }
+    };
+    es.onerror = ()=>{ es.close(); poll(); };
+  });
+}
+
+// /files/... → /thumbs/...?w= (목록/채팅/그리드는 축소본, 상세보기·다운로드는 원본)
+function thumbUrl(url, w=320){
+  if(!url || !url.startsWith("/files/")) return url||"";
+  const [path, query] = url.slice("/files/".length).split("?");
+  return `/thumbs/${path}?w=${w}` + (query ? `&${query}` : "");
+}
+
+// 삽화 파일 URL에 캐시 토큰(?v=) 부여 → 브라우저가 재검증 없이 캐시를 쓴다
+function assetUrl(url, ill){
+  return (url && ill && ill.asset_v && !url.includes("?")) ? `${url}?v=${ill.asset_v}` : (url||"");
+}
+function versionUrl(slug, ill, file){
+  return assetUrl(`/files/projects/${slug}/illustrations/${ill.label}/versions/${file}`, ill);
+}
+
 function escapeHtml(s){ return (s||"").replace(/[&<>"']/g, c=>({"&":"&amp;","<":"&lt;","&gt;":"&gt;","\"":"&quot;","'":"&#39;"}[c])); }
 
 function scrollChatMsgToTop(msgEl){
@@ -104,7 +144,7 @@ function renderProjects(){
         </div>
       </div>
       <div class="preview-row">
-        ${p.previews.map(u=>`<div class="preview"><img data-detail="${u}" src="${u}"/></div>`).join("")}
+        ${p.previews.map((u,i)=>`<div class="preview"><img data-detail="${u}" src="${(p.preview_thumbs||[])[i]||thumbUrl(u)}" loading="lazy"/></div>`).join("")}
       </div>
     `;
     list.appendChild(div);
@@ -143,7 +183,7 @@ function renderProjects(){
 async function openEditor(slug){
   const res = await jget(`/api/projects/${slug}`);
   if(!res.ok) return alert(res.error||"에러");
-  state.current = { slug, meta: res.meta, illustrations: res.illustrations };
+  state.current = { slug, meta: res.meta, rev: res.rev, illustrations: res.illustrations };
   state.currentLabel = res.illustrations[0]?.label || null;
   state.view="editor"; state.editBaseVersion=null; state.generating=false;
 
@@ -169,10 +209,14 @@ async function openEditor(slug){
           <div class="composer-input">
             <textarea id="prompt" placeholder="수정 사항을 적어주세요. (Enter=전송, Shift+Enter=줄바꿈)"></textarea>
           </div>
+          <select id="cand-n" class="cand-n" title="한 번에 만들 후보 수">
+            <option value="1">1장</option><option value="2">2장</option>
+            <option value="3">3장</option><option value="4">4장</option>
+          </select>
           <button class="btn primary" id="btn-send">수정 요청</button>
         </div>
 
-        <div class="gen-overlay" id="gen-overlay" style="display:none"><div class="spinner"></div> 이미지 생성 중...</div>
+        <div class="gen-overlay" id="gen-overlay" style="display:none"><div class="spinner"></div> <span id="gen-text">이미지 생성 중...</span></div>
       </div>
 
       <div class="right-col">
@@ -183,6 +227,7 @@ async function openEditor(slug){
               <label class="btn">삽화 추가
                 <input id="add-files" type="file" multiple accept="image/*" style="display:none"/>
               </label>
+              <button class="btn" id="btn-batch" title="입력한 수정 사항을 모든 삽화에 적용">전체 삽화에 적용</button>
               <button class="btn danger" id="btn-del-illus">삽화 삭제</button>
             </div>
           </div>
@@ -222,6 +267,7 @@ async function openEditor(slug){
     if(e.key==="Enter" && !e.shiftKey){ e.preventDefault(); $("#btn-send").click(); }
   });
   $("#btn-send").onclick = onSendPrompt;
+  $("#btn-batch").onclick = onBatchPrompt;
 
   // 모달 닫기
   $("#modal-close").onclick = closeDetail;
@@ -236,6 +282,7 @@ async function openEditor(slug){
   await refreshChatDataForCurrent();
   await paintPanelsForCurrent();
   scrollChatToBottom();
+  watchPendingUploads();
 }
 
 function paintProjectHeader(){
@@ -244,22 +291,29 @@ function paintProjectHeader(){
 }
 
 // ======================== Data (chat log) ========================
+// 레이블은 삭제 후 재사용될 수 있어 asset_v까지 키에 넣는다
+function chatKey(slug, ill){ return `${slug}|${ill.label}|${ill.asset_v||""}`; }
+
 async function refreshChatDataForCurrent(){
   const proj = state.current;
   const ill = proj.illustrations.find(i=>i.label===state.currentLabel);
   if(!ill) return;
-  const key = `${proj.slug}|${ill.label}`;
-  if(ill.chat_log_url){
-    try{
-      const txt = await (await fetch(ill.chat_log_url)).text();
-      const { items, initTs } = parseChatLog(txt, proj.slug, ill.label);
-      state.chatCache[key]  = items;
-      state.chatInitTs[key] = initTs || null;
-    }catch(e){ state.chatCache[key] = []; state.chatInitTs[key] = null; }
-  }else{
-    state.chatCache[key] = [];
-    state.chatInitTs[key] = null;
+  const key = chatKey(proj.slug, ill);
+  if(!(key in state.chatSeq)){
+    state.chatCache[key] = []; state.chatInitTs[key] = null;
+    state.chatSeq[key] = 0; state.chatPending[key] = {};
   }
+  if(!ill.chat_url) return;
+  try{
+    // 새 항목만 이어받기 (페이지 단위)
+    while(true){
+      const r = await jget(`${ill.chat_url}?since=${state.chatSeq[key]}`);
+      if(!r.ok) break;
+      applyChatEntries(key, r.entries);
+      state.chatSeq[key] = r.next_since;
+      if(!r.has_more) break;
+    }
+  }catch(e){ /* 다음 새로고침 때 이어서 받음 */ }
 }
 
 function formatTs(ts){
@@ -270,68 +324,39 @@ function formatTs(ts){
   return `${d.getFullYear()}-${pad(d.getMonth()+1)}-${pad(d.getDate())} ${pad(d.getHours())}:${pad(d.getMinutes())}`;
 }
 
-function parseChatLog(text, slug, label){
-  const lines = text.split(/\r?\n/);
-  const items = [];
-  let cur = null;
-  let initTs = null;
-
-  const headerRE = /^\[([^\]]+)\]\s\[(USER|MODEL|INIT|SELECT|MODEL:TEXT)\]/;
-  const isHeader = (s) => headerRE.test(s || "");
-
-  for (let i = 0; i < lines.length; i++){
-    const line = lines[i];
-    if (!line) continue;
-
-    const h = line.match(headerRE);
-    const ts = h ? h[1] : null;
-    const kind = h ? h[2] : null;
-
-    if (kind === "INIT"){
-      // 최초 업로드 시각 저장 (여러 번 있을 수 있지만 첫 번째를 사용)
-      if (!initTs) initTs = ts || null;
-      continue;
-    }
-
-    if (kind === "USER"){
-      const base = line.match(/base=([^\s]+)\s/);
-      let promptPart = "";
-      const idx = line.indexOf("prompt=");
-      if (idx >= 0) promptPart = line.slice(idx + "prompt=".length);
-
-      // 다음 헤더 전까지 멀티라인 프롬프트 이어붙이기
-      let j = i + 1;
-      while (j < lines.length && !isHeader(lines[j])) {
-        promptPart += (promptPart ? "\n" : "") + lines[j];
-        j++;
-      }
-      i = j - 1;
-
-      cur = {
-        userTs: ts || null,
+function applyChatEntries(key, entries){
+  const items = state.chatCache[key];
+  const pending = state.chatPending[key];
+  for(const e of entries){
+    if(e.kind === "INIT"){
+      // 최초 업로드 시각 (여러 번 있을 수 있지만 첫 번째를 사용)
+      if(!state.chatInitTs[key]) state.chatInitTs[key] = e.ts || null;
+    }else if(e.kind === "USER"){
+      pending._last = e.seq;
+      pending[e.seq] = {
+        userTs: e.ts || null,
         modelTs: null,
-        baseUrl: base ? `/files${base[1]}` : "",
-        prompt: (promptPart || "").trim(),
+        baseUrl: e.base ? `/files${e.base}` : "",
+        prompt: (e.prompt || "").trim(),
+        region: e.region || null,   // 부분 수정 영역 [x,y,w,h]
+        mask: !!e.mask,
+        group: e.group || "",       // 같은 요청에서 나온 후보들
+
         outUrl: "",
         outFile: ""
       };
-      continue;
-    }
-
-    if (kind === "MODEL" && line.includes("out=") && cur){
-      const out = line.match(/out=([^\s]+)\s*$/);
-      if (out) {
-        cur.outUrl  = `/files${out[1]}`;
-        cur.outFile = cur.outUrl.split("/").pop() || "";
-        cur.modelTs = ts || null;
-        items.push(cur);
-        cur = null;
-      }
-      continue;
+    }else if(e.kind === "MODEL" && e.out){
+      // req = 이 결과를 만든 USER 항목의 seq (예전 로그에는 없음 → 직전 USER)
+      const reqSeq = e.req ?? pending._last;
+      const cur = pending[reqSeq];
+      if(!cur) continue;
+      cur.outUrl  = `/files${e.out}`;
+      cur.outFile = e.version || cur.outUrl.split("/").pop() || "";
+      cur.modelTs = e.ts || null;
+      items.push(cur);
+      delete pending[reqSeq];
     }
   }
-
-  return { items, initTs };
 }
 
 
@@ -356,7 +381,7 @@ function currentIllustration(){
 }
 
 function buildChatHTML(ill, slug){
-  const key = `${state.current.slug}|${ill.label}`;
+  const key = chatKey(state.current.slug, ill);
   const items = state.chatCache[key] || [];
   const initTs = state.chatInitTs[key] || null;
   let html = "";
@@ -369,7 +394,7 @@ function buildChatHTML(ill, slug){
       <div class="chat-msg assistant" id="msg-${id}">
         <div class="bubble">
           <div class="msg-img ${isSel?'is-selected':''}" data-version="${id}">
-            <img data-detail="${ill.original_url}" data-name="${id}.png" src="${ill.original_url}" alt="original"/>
+            <img data-detail="${ill.original_url}" data-name="${id}.png" src="${thumbUrl(ill.original_url, 1024)}" alt="original"/>
             <div class="badge">${id}</div>
             <div class="badge heart">♥</div>
             <div class="action-heart" data-select="__ORIGINAL__" data-select-label="${ill.label}">♥</div>
@@ -384,18 +409,22 @@ function buildChatHTML(ill, slug){
   }
 
   // --- Generated sequences ---
+  let prevGroup = "";
   items.forEach(it=>{
     const file = it.outFile;
     const name = file.replace(".png","");
     const isSel = (file===ill.selected);
     const usedBase = deriveVersionLabelFromBase(it.baseUrl, ill.label);
+    const baseUrl = assetUrl(it.baseUrl, ill), outUrl = assetUrl(it.outUrl, ill);
+    // 같은 요청의 후보들은 요청(베이스/프롬프트)을 한 번만 보여준다
+    const sameRequest = it.group && it.group===prevGroup;
+    prevGroup = it.group;
 
-    // [USER] base thumbnail (128px)
-    html += `
+    if(!sameRequest) html += `
       <div class="chat-msg user" id="msg-${name}-req-base">
         <div class="bubble">
           <div class="mini-img" style="position:relative;display:inline-block;">
-            <img class="base-thumb" src="${it.baseUrl}" alt="${usedBase}" data-chat-jump="${usedBase}"/>
+            <img class="base-thumb" src="${thumbUrl(baseUrl, 320)}" alt="${usedBase}" data-chat-jump="${usedBase}" loading="lazy"/>
             <div class="badge" style="position:absolute;top:8px;left:8px">${usedBase}</div>
           </div>
           <div class="meta-stamp">${formatTs(it.userTs)}</div>
@@ -404,10 +433,11 @@ function buildChatHTML(ill, slug){
     `;
 
     // [USER] prompt
-    html += `
+    if(!sameRequest) html += `
       <div class="chat-msg user" id="msg-${name}-req">
         <div class="bubble">
           <div style="white-space:pre-wrap">${escapeHtml(it.prompt||"")}</div>
+          ${it.region ? `<div class="meta-stamp">부분 수정: (${it.region[0]}, ${it.region[1]}) ${it.region[2]}×${it.region[3]}${it.mask?" · 마스크":""}</div>` : ""}
           <div class="meta-stamp">${formatTs(it.userTs)}</div>
         </div>
       </div>
@@ -418,7 +448,7 @@ function buildChatHTML(ill, slug){
       <div class="chat-msg assistant" id="msg-${name}">
         <div class="bubble">
           <div class="msg-img ${isSel?'is-selected':''}" data-version="${name}">
-            <img data-detail="${it.outUrl}" data-name="${file}" src="${it.outUrl}"/>
+            <img data-detail="${outUrl}" data-name="${file}" src="${thumbUrl(outUrl, 1024)}" loading="lazy"/>
             <div class="badge">${name}</div>
             <div class="badge heart">♥</div>
             <div class="action-heart" data-select="${file}" data-select-label="${ill.label}">♥</div>
@@ -468,7 +498,7 @@ function buildHistoryHTML(ill, slug){
   let cells = "";
   const cellTmpl = (label, name, url, isSel) => `
     <div class="cell ${isSel?'is-selected':''}" data-version="${name}">
-      <img data-detail="${url}" data-name="${name}.png" src="${url}"/>
+      <img data-detail="${url}" data-name="${name}.png" src="${thumbUrl(url, 512)}" loading="lazy"/>
       <div class="heart">♥</div>
       <div class="heart-btn" data-select="${name.endsWith('-0')?'__ORIGINAL__':name+'.png'}" data-select-label="${label}">♥</div>
       <div class="overlay">
@@ -485,7 +515,7 @@ function buildHistoryHTML(ill, slug){
   }
 
   (ill.version_files||[]).forEach(v=>{
-    const url = `/files/projects/${slug}/illustrations/${ill.label}/versions/${v}`;
+    const url = versionUrl(slug, ill, v);
     const isSel = (v===ill.selected);
     const name = v.replace(".png","");
     cells += cellTmpl(ill.label, name, url, isSel);
@@ -516,7 +546,15 @@ function paintHistory(){
 function paintIllusStrip(){
   const row = $("#illus-row");
   row.innerHTML = state.current.illustrations.map(it=>{
-    const thumb = it.selected_url || it.original_url || "";
+    if(it.pending || it.failed){
+      return `
+        <div class="illus-card pending ${it.label===state.currentLabel?"active":""}">
+          <div class="illus-pending" data-pick-illus="${it.label}">${it.failed ? "업로드 실패 — 삭제 후 다시 올려주세요" : "처리 중..."}</div>
+          <div class="label">${it.label}</div>
+        </div>
+      `;
+    }
+    const thumb = it.selected_thumb_url || it.original_thumb_url || thumbUrl(it.selected_url || it.original_url);
     const count = (it.original_url?1:0)+(it.version_count||0);
     return `
       <div class="illus-card ${it.label===state.currentLabel?"active":""}">
@@ -547,7 +585,7 @@ function getCurrentBaseSrc(ill, slug){
   if (state.editBaseVersion) {
     return state.editBaseVersion === "__ORIGINAL__"
       ? (ill.original_url || "")
-      : `/files/projects/${slug}/illustrations/${ill.label}/versions/${state.editBaseVersion}`;
+      : versionUrl(slug, ill, state.editBaseVersion);
   }
 
   // 2) 그렇지 않으면 최신 생성본(가장 마지막 버전 파일명) → 없으면 original
@@ -560,7 +598,7 @@ function getCurrentBaseSrc(ill, slug){
   });
   if (list.length > 0) {
     const last = list[list.length - 1]; // ex) "A-4.png"
-    return `/files/projects/${slug}/illustrations/${ill.label}/versions/${last}`;
+    return versionUrl(slug, ill, last);
   }
   return ill.original_url || "";
 }
@@ -593,19 +631,69 @@ function paintComposerBase(){
   }
 
   wrap.innerHTML = `
-    <div style="position:relative;display:inline-block;">
-      <img src="${src}" alt="base-preview"/>
+    <div class="region-wrap" style="position:relative;display:inline-block;">
+      <img src="${thumbUrl(src, 320)}" alt="base-preview" title="드래그해서 수정할 영역 지정"/>
       <div class="badge">${labelText}</div>
     </div>
   `;
+  attachRegionPicker(wrap.querySelector(".region-wrap"), src);
+  paintRegionBox(wrap.querySelector(".region-wrap"));
+}
+
+// 베이스 미리보기에서 드래그로 수정 영역 지정 (이미지 대비 비율 → 서버에는 % 로 전달)
+function currentRegion(){
+  const ill = currentIllustration(); const r = state.editRegion;
+  if(!ill || !r) return null;
+  const src = getCurrentBaseSrc(ill, state.current.slug) || ill.original_url || "";
+  return r.src === src ? r : null;
+}
+
+function attachRegionPicker(box, src){
+  const img = box.querySelector("img");
+  img.draggable = false;
+  img.onmousedown = e=>{
+    e.preventDefault();
+    const rect = img.getBoundingClientRect();
+    const at = ev=>({
+      x: Math.min(Math.max((ev.clientX-rect.left)/rect.width, 0), 1),
+      y: Math.min(Math.max((ev.clientY-rect.top)/rect.height, 0), 1)
+    });
+    const s = at(e);
+    const move = ev=>{
+      const p = at(ev);
+      state.editRegion = { src, x:Math.min(s.x,p.x), y:Math.min(s.y,p.y), w:Math.abs(p.x-s.x), h:Math.abs(p.y-s.y) };
+      paintRegionBox(box);
+    };
+    const up = ()=>{
+      document.removeEventListener("mousemove", move);
+      document.removeEventListener("mouseup", up);
+      const r = state.editRegion;
+      if(r && r.src===src && (r.w < 0.02 || r.h < 0.02)) state.editRegion = null; // 클릭만 한 경우 = 해제
+      paintRegionBox(box);
+    };
+    document.addEventListener("mousemove", move);
+    document.addEventListener("mouseup", up);
+  };
+}
+
+function paintRegionBox(box){
+  box.querySelectorAll(".region-box,.region-clear").forEach(el=>el.remove());
+  const r = currentRegion(); if(!r) return;
+  box.insertAdjacentHTML("beforeend", `
+    <div class="region-box" style="left:${r.x*100}%;top:${r.y*100}%;width:${r.w*100}%;height:${r.h*100}%"></div>
+    <div class="region-clear" title="영역 해제">✕</div>
+  `);
+  box.querySelector(".region-clear").onclick = ()=>{ state.editRegion = null; paintRegionBox(box); };
 }
 
 // ======================== Actions ========================
-function showGenerating(on){
+function showGenerating(on, text){
   state.generating = !!on;
   const ov = $("#gen-overlay"); if(ov) ov.style.display = on ? "flex" : "none";
+  const tx = $("#gen-text"); if(tx) tx.textContent = text || "이미지 생성 중...";
   const ta = $("#prompt"); if(ta) ta.disabled = !!on;
   const btn = $("#btn-send"); if(btn) btn.disabled = !!on;
+  const bb = $("#btn-batch"); if(bb) bb.disabled = !!on;
 }
 
 async function onAddFiles(e){
@@ -616,12 +704,38 @@ async function onAddFiles(e){
   const r = await jpostForm(`/api/projects/${state.current.slug}/illustrations`, form);
   if(!r.ok) return alert(r.error||"에러");
 
-  const res = await jget(`/api/projects/${state.current.slug}`);
-  if(res.ok){ state.current.illustrations = res.illustrations; }
-  if(!state.currentLabel && res.illustrations[0]) state.currentLabel = res.illustrations[0].label;
+  await refreshProject();
+  if(!state.currentLabel && state.current.illustrations[0]) state.currentLabel = state.current.illustrations[0].label;
 
   await refreshChatDataForCurrent();
   paintPanelsForCurrent();
+  watchPendingUploads();
+}
+
+// 업로드한 원본은 서버에서 백그라운드로 처리된다 → 끝날 때까지 상세 정보를 주기적으로 다시 읽기
+async function watchPendingUploads(){
+  if(state.pendingWatch) return;
+  state.pendingWatch = true;
+  try{
+    while(state.view==="editor" && state.current && state.current.illustrations.some(i=>i.pending)){
+      await new Promise(r=>setTimeout(r, 1000));
+      const slug = state.current?.slug;
+      if(!slug) break;
+      const res = await refreshProject();
+      if(!res) break;
+      if(!state.current.illustrations.some(i=>i.label===state.currentLabel)){
+        state.currentLabel = state.current.illustrations[0]?.label || null;
+      }
+      if(state.current.illustrations.some(i=>i.pending)){
+        paintIllusStrip();
+      }else{
+        await refreshChatDataForCurrent();
+        paintPanelsForCurrent();
+      }
+    }
+  }finally{
+    state.pendingWatch = false;
+  }
 }
 
 async function onDeleteIllustration(){
@@ -630,8 +744,7 @@ async function onDeleteIllustration(){
   const r = await jdel(`/api/projects/${state.current.slug}/illustrations/${ill.label}`);
   if(!r.ok) return alert(r.error||"에러");
 
-  const res = await jget(`/api/projects/${state.current.slug}`);
-  if(res.ok){ state.current.illustrations = res.illustrations; }
+  await refreshProject();
   state.currentLabel = state.current.illustrations[0]?.label || null;
 
   await refreshChatDataForCurrent();
@@ -651,25 +764,69 @@ async function onSendPrompt(){
   if(state.editBaseVersion!==null && state.editBaseVersion!=="") {
     form.append("base_version", state.editBaseVersion); // ← 1회성 기반 버전
   }
-
-  showGenerating(true);
-  const r = await jpostForm(`/api/projects/${state.current.slug}/edit`, form);
+  const region = currentRegion();
+  if(region){
+    const pct = v=>`${(v*100).toFixed(2)}%`;
+    form.append("region", [region.x, region.y, region.w, region.h].map(pct).join(","));
+  }
+  const n = Number($("#cand-n")?.value || 1);
+  if(n > 1) form.append("n", n);
+
+  showGenerating(true, n > 1 ? `후보 생성 중... (0/${n})` : undefined);
+  let r = await jpostForm(`/api/projects/${state.current.slug}/edit`, form);
+  if(r.ok && r.batch_id){
+    // 후보는 끝나는 대로 하나씩 화면에 반영
+    const summary = await waitBatch(r.batch_id, async (b, job)=>{
+      showGenerating(true, `후보 생성 중... (${b.done+b.failed}/${n})`);
+      if(job && job.status==="done") await syncIllustration(ill.label);
+    });
+    r = summary.done ? { ok: true } : { ok: false, error: summary.error || "후보 생성에 실패했습니다." };
+  }else if(r.ok && r.job_id){
+    r = await waitJob(r.job_id);
+  }
   showGenerating(false);
 
   if(!r.ok){ alert(r.error||"에러"); return; }
 
   // ✅ 여기서 바로 1회성 리셋 (이후부터는 최신본 기준)
   state.editBaseVersion = null;
+  state.editRegion = null;
+
+  await syncIllustration(ill.label);
+}
 
-  // 최신 프로젝트/삽화 메타 동기화
-  const res = await jget(`/api/projects/${state.current.slug}`);
-  if(res.ok){
-    state.current.meta = res.meta;
-    const updated = res.illustrations.find(x=>x.label===ill.label);
-    const arr = state.current.illustrations;
-    const idx = arr.findIndex(x=>x.label===ill.label);
-    if(idx>=0 && updated) arr[idx]=updated;
+// 프로젝트 상세를 서버와 맞춘다 — 마지막으로 받은 rev 이후 바뀐 삽화만 받아 합친다 (since)
+async function refreshProject(){
+  const cur = state.current; if(!cur) return null;
+  const slug = cur.slug;
+  const res = await jget(`/api/projects/${slug}` + (cur.rev ? `?since=${cur.rev}` : ""));
+  if(!res.ok || state.current!==cur) return null;
+  cur.meta = res.meta;
+  if(res.full){
+    cur.illustrations = res.illustrations;
+  }else{
+    const removed = new Set(res.removed||[]);
+    const arr = cur.illustrations.filter(i=>!removed.has(i.label));
+    res.illustrations.forEach(u=>{
+      const idx = arr.findIndex(i=>i.label===u.label);
+      if(idx<0){ arr.push(u); return; }
+      // 바뀐 삽화의 version_files는 새로 추가된 것만 온다 (같은 삽화면 기존 목록에 이어 붙임)
+      const prev = arr[idx].asset_v===u.asset_v ? arr[idx].version_files : [];
+      const files = Array.from(new Set(prev.concat(u.version_files)));
+      files.sort((a,b)=>Number(a.split("-").pop().replace(".png",""))-Number(b.split("-").pop().replace(".png","")));
+      arr[idx] = { ...u, version_files: files };
+    });
+    arr.sort((a,b)=>a.label<b.label ? -1 : a.label>b.label ? 1 : 0);
+    cur.illustrations = arr;
   }
+  cur.rev = res.rev;
+  return res;
+}
+
+// 삽화 하나의 메타/채팅을 서버와 맞추고 다시 그린다
+async function syncIllustration(label){
+  // 최신 프로젝트/삽화 메타 동기화 (바뀐 것만)
+  await refreshProject();
 
   // 채팅/기록 재로딩 & UI 업데이트
   await refreshChatDataForCurrent();
@@ -677,11 +834,65 @@ async function onSendPrompt(){
   paintChat();
   paintHistory();
   paintIllusStrip();
-  paintComposerBase();   // ← 이미 editBaseVersion이 null이므로 “최신본 기준”으로 표시
+  paintComposerBase();   // ← editBaseVersion이 null이면 “최신본 기준”으로 표시
 
   scrollChatToBottom();  // 새 결과 보이도록
 }
 
+// ---- 일괄 편집: 같은 프롬프트를 모든 삽화에 ----
+function waitBatch(batchId, onProgress){
+  // onProgress(요약, 상태가 바뀐 작업) — 순서대로 한 번에 하나씩 호출
+  return new Promise(resolve=>{
+    const poll = async ()=>{
+      const seenPoll = {};
+      while(true){
+        const r = await jget(`/api/batches/${batchId}`);
+        if(!r.ok) return resolve(r);
+        const changed = (r.batch.items||[]).filter(j=>seenPoll[j.id]!==j.status);
+        changed.forEach(j=>{ seenPoll[j.id] = j.status; });
+        if(changed.length){ for(const j of changed) await onProgress(r.batch, j); }
+        else await onProgress(r.batch);
+        if(r.batch.finished) return resolve(r.batch);
+        await new Promise(t=>setTimeout(t, 1500));
+      }
+    };
+    if(!window.EventSource) return poll();
+    const es = new EventSource(`/api/batches/${batchId}/events`);
+    const seen = {};
+    let chain = Promise.resolve();
+    es.onmessage = ev=>{
+      const j = JSON.parse(ev.data); seen[j.id] = j.status;
+      const vals = Object.values(seen);
+      const b = { total: vals.length, done: vals.filter(v=>v==="done").length, failed: vals.filter(v=>v==="error").length };
+      chain = chain.then(()=>onProgress(b, j));
+    };
+    es.addEventListener("end", ev=>{ es.close(); chain.then(()=>resolve(JSON.parse(ev.data))); });
+    es.onerror = ()=>{ es.close(); chain.then(poll); };
+  });
+}
+async function onBatchPrompt(){
+  if(!state.current.illustrations.length) return alert("삽화를 먼저 추가하세요.");
+  const text = $("#prompt").value.trim(); if(!text) return alert("수정 사항을 입력하세요.");
+  if(state.generating) return;
+  if(!confirm(`모든 삽화(${state.current.illustrations.length}개)에 적용할까요?`)) return;
+
+  $("#prompt").value = "";
+  showGenerating(true, "일괄 수정 요청 중...");
+  const r = await jpost(`/api/projects/${state.current.slug}/batch_edit`, { labels: "all", prompt: text });
+  if(!r.ok){ showGenerating(false); alert(r.error||"에러"); return; }
+  const summary = await waitBatch(r.batch_id, b=>{
+    showGenerating(true, `일괄 수정 중... (${b.done+b.failed}/${b.total})`);
+  });
+  showGenerating(false);
+  if(summary.failed) alert(`${summary.failed}개 삽화 수정에 실패했습니다.`);
+
+  await refreshProject();
+  await refreshChatDataForCurrent();
+  paintProjectHeader();
+  paintPanelsForCurrent();
+  scrollChatToBottom();
+}
+
 // ---- 선택(♥) — 깜빡임 없이 클래스만 토글 ----
 function attachSelectHandler(el, slug){
   el.onclick = async (e)=>{
@@ -701,7 +912,8 @@ function attachSelectHandler(el, slug){
     if(ill){
       ill.selected = version;
       ill.selected_url = (version==="__ORIGINAL__") ? ill.original_url
-        : `/files/projects/${slug}/illustrations/${label}/versions/${version}`;
+        : versionUrl(slug, ill, version);
+      ill.selected_thumb_url = thumbUrl(ill.selected_url);
     }
 
     updateSelectionUINoFlicker(label, prevId, nextId);
@@ -731,7 +943,7 @@ function updateSelectionUINoFlicker(label, prevId, nextId){
   const ill = state.current.illustrations.find(i=>i.label===label);
   if(ill && ill.selected_url){
     const th = document.querySelector(`.illus-row img[data-pick-illus="${CSS.escape(label)}"]`);
-    if(th) th.src = ill.selected_url;
+    if(th) th.src = thumbUrl(ill.selected_url);
   }
 }
 
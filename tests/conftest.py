@@ -0,0 +1,75 @@
+"""
+테스트 공통 — app은 import 할 때 DATA_DIR을 읽으므로, 임시 폴더로 먼저 잡아 두고 불러온다.
+모델은 bench/stub_model.py(네트워크 없음) 또는 bench/fake_gemini.py(로컬 HTTP)로 바꿔 끼운다.
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import pytest
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix="storybook-test-")
+os.environ["DATA_DIR"] = DATA_DIR
+os.environ["MODEL_WARMUP"] = "0"
+os.environ["COLD_COMPACT_INTERVAL_SEC"] = "0"
+os.environ["TRASH_GC_FILES_PER_SEC"] = "0"
+sys.path.insert(0, ROOT)
+
+import app as storybook  # noqa: E402
+
+flask_app = storybook.create_app()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+def noise_png(size=(64, 48), seed=0) -> bytes:
+    """픽셀마다 값이 다른 PNG — 영역 밖 픽셀이 그대로인지 비교할 때 쓴다"""
+    img = Image.frombytes("RGB", size, bytes((i * 7 + seed) % 251 for i in range(size[0] * size[1] * 3)))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def client():
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def make_project(client):
+    """make_project(labels=1, size=(64, 48)) → slug. 업로드 API로 올리고 원본 변환이 끝날 때까지 기다린다.
+    images=[바이트, ...] 를 주면 그 이미지들을 올린다."""
+    def make(labels: int = 1, size=(64, 48), images=None) -> str:
+        r = client.post("/api/projects", json={"name": f"test-{uuid.uuid4().hex[:8]}"})
+        slug = r.get_json()["slug"]
+        images = images if images is not None else [noise_png(size, seed=i) for i in range(labels)]
+        if images:
+            files = [(io.BytesIO(data), f"{i}.png") for i, data in enumerate(images)]
+            r = client.post(f"/api/projects/{slug}/illustrations", data={"images": files},
+                            content_type="multipart/form-data")
+            assert r.status_code == 200, r.get_json()
+            wait_ingested(slug)
+        return slug
+    return make
+
+
+def wait_ingested(slug, timeout=30):
+    deadline = time.monotonic() + timeout
+    while any(storybook.ingest_pending(slug, L) for L in os.listdir(storybook.illustrations_path(slug))):
+        assert time.monotonic() < deadline, "upload ingest did not finish"
+        time.sleep(0.05)
+
+
+def unique_png(size=(32, 24)) -> bytes:
+    """다른 테스트와 바이트가 겹치지 않는 PNG (블롭 링크 수를 셀 때)"""
+    buf = io.BytesIO()
+    Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3)).save(buf, format="PNG")
+    return buf.getvalue()
@@ -0,0 +1,22 @@
+"""
+앱 팩토리 — import만으로는 앱을 만들지 않고, 시작 상태(인덱스 확인 등)는 앱마다 따로다.
+"""
+from tests.conftest import flask_app, storybook as A
+
+
+def test_import_does_not_build_an_app():
+    assert not hasattr(A, "app")
+    assert flask_app.extensions["storybook"]["started"] is True
+
+
+def test_each_app_runs_its_own_startup(monkeypatch):
+    calls = []
+    init_index = A.init_index
+    monkeypatch.setattr(A, "init_index", lambda: (calls.append(1), init_index())[1])
+    first, second = A.create_app(), A.create_app()
+    assert len(calls) == 2  # 두 번째 앱도 시작을 건너뛰지 않는다
+    for a in (first, second):
+        assert a.extensions["storybook"] == {"started": True, "data_dir": A.os.path.abspath(A.DATA_DIR)}
+    A.startup(first)  # 같은 앱에는 한 번만
+    assert len(calls) == 2
+    assert second.test_client().get("/healthz").status_code == 200
@@ -0,0 +1,103 @@
+"""
+일괄 편집 — 한 프롬프트를 여러 삽화로, 실패한 삽화가 있어도 나머지는 끝까지. 요약/SSE 종료 이벤트.
+후보 n개 — 같은 베이스에서 서로 다른 버전 n개, 상한 EDIT_MAX_CANDIDATES.
+"""
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from bench.stub_model import StubClient
+from tests.conftest import storybook as A
+
+
+class TextOnlyClient:
+    """이미지 없이 텍스트만 돌려주는 모델 — 편집 실패(400)"""
+    models = SimpleNamespace(generate_content=lambda **kw: SimpleNamespace(candidates=[], text="그릴 수 없습니다."))
+
+
+@pytest.fixture
+def failing(monkeypatch):
+    """편집 큐를 바꿔 끼운다 — 돌려준 집합에 넣은 삽화는 TextOnlyClient, 나머지는 스텁 모델로 실행"""
+    failing = set()
+    stub = StubClient(latency=0.01)
+
+    def runner(job):
+        return A.run_edit(job.slug, job.label, job.prompt, job.base_version,
+                          client=TextOnlyClient() if job.label in failing else stub,
+                          use_cache=job.use_cache, region=job.region, mask=job.mask, group=job.group)
+    monkeypatch.setattr(A, "edit_queue", A.EditQueue(runner, workers=4, max_depth=32))
+    return failing
+
+
+def wait_batch(client, batch_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = client.get(f"/api/batches/{batch_id}").get_json()["batch"]
+        if batch["finished"]:
+            return batch
+        assert time.monotonic() < deadline, batch
+        time.sleep(0.02)
+
+
+def read_selected(slug, label="A"):
+    return A.read_text(os.path.join(A.illustrations_path(slug), label, "selected.txt")).strip()
+
+
+def versions(client, slug):
+    return {i["label"]: i["version_files"] for i in client.get(f"/api/projects/{slug}").get_json()["illustrations"]}
+
+
+def test_batch_with_one_failing_label(client, make_project, failing):
+    slug = make_project(labels=3)
+    failing.add("B")
+    r = client.post(f"/api/projects/{slug}/batch_edit", json={"labels": ["A", "B", "C", "Z"], "prompt": "밤으로"})
+    assert r.status_code == 202
+    body = r.get_json()
+    assert sorted(body["jobs"]) == ["A", "B", "C"] and list(body["rejected"]) == ["Z"]  # 없는 삽화는 넣기 전에
+
+    batch = wait_batch(client, body["batch_id"])
+    assert (batch["total"], batch["done"], batch["failed"]) == (3, 2, 1)
+    failed = next(i for i in batch["items"] if i["label"] == "B")
+    assert failed["status"] == "error" and failed["error_status"] == 400
+    assert versions(client, slug) == {"A": ["A-1.png"], "B": [], "C": ["C-1.png"]}
+    chat = client.get(f"/api/projects/{slug}/illustrations/B/chat").get_json()["entries"]
+    assert chat[-1]["kind"] == "MODEL:TEXT"
+
+    # 끝난 묶음의 SSE는 각 작업 상태 뒤 end 요약으로 닫힌다
+    events = client.get(f"/api/batches/{body['batch_id']}/events").get_data(as_text=True).split("\n\n")
+    end = next(e for e in events if e.startswith("event: end"))
+    assert json.loads(end.split("data: ", 1)[1])["failed"] == 1
+
+    r = client.post(f"/api/projects/{slug}/batch_edit", json={"labels": ["Z"], "prompt": "p"})
+    assert r.status_code == 400 and "Z" in r.get_json()["rejected"]
+
+
+def test_n_candidates_are_distinct_versions_of_one_base(client, make_project, failing, monkeypatch):
+    slug = make_project()
+    A.run_edit(slug, "A", "first", client=StubClient(latency=0), use_cache=False)  # 최신본 = A-1
+    r = client.post(f"/api/projects/{slug}/edit", data={"label": "A", "prompt": "후보", "n": "3"})
+    assert r.status_code == 202
+    body = r.get_json()
+    assert len(body["job_ids"]) == 3 and body["base_version"] == "A-1.png"  # 요청 시점의 최신본으로 고정
+
+    batch = wait_batch(client, body["batch_id"])
+    assert batch["done"] == 3
+    made = sorted(i["result"]["version"] for i in batch["items"])
+    assert made == ["A-2.png", "A-3.png", "A-4.png"]
+    assert all(not i["result"]["cached"] for i in batch["items"])  # 후보마다 새로 생성
+    chat = client.get(f"/api/projects/{slug}/illustrations/A/chat").get_json()["entries"]
+    users = [e for e in chat if e["kind"] == "USER" and e.get("group") == body["batch_id"]]
+    assert len(users) == 3 and {e["base"].rsplit("/", 1)[-1] for e in users} == {"A-1.png"}
+    assert read_selected(slug) == "__ORIGINAL__"  # 자동으로 최종 선택하지 않는다
+
+    def post(n):
+        return client.post(f"/api/projects/{slug}/edit", data={"label": "A", "prompt": "p", "n": str(n)})
+    assert post(A.EDIT_MAX_CANDIDATES + 1).status_code == 400
+    assert post(0).status_code == 400
+    monkeypatch.setattr(A, "EDIT_MAX_CANDIDATES", 2)
+    r = post(3)
+    assert r.status_code == 400 and "1~2" in r.get_json()["error"]
+    assert versions(client, slug)["A"] == ["A-1.png", "A-2.png", "A-3.png", "A-4.png"]
@@ -0,0 +1,100 @@
+"""
+블롭 저장소 — 같은 바이트는 한 inode(참조 수 = 링크 수 - 1), 휴지통 수거 뒤 고아 블롭 수거,
+migrate_blobs 반복 실행, 재시작 뒤에도 다시 읽지 않는 내용 해시(ETag/썸네일 키).
+"""
+import hashlib
+import os
+import shutil
+import time
+
+import pytest
+
+from tests.conftest import storybook as A, unique_png
+
+
+def original(slug, label="A"):
+    return os.path.join(A.illustrations_path(slug), label, "original.png")
+
+
+def blob_of(path):
+    return A.blob_path(A.hash_file(path))
+
+
+def expire_trash(trash_id):
+    """이 항목만 보관 기간이 지난 것으로 → collect_trash가 지운다"""
+    p = os.path.join(A.TRASH_DIR, trash_id, "entry.json")
+    e = A.read_json(p)
+    e["deleted_ts"] = time.time() - A.TRASH_RETENTION_SEC - 1
+    A.write_json(p, e)
+    assert A.collect_trash() >= 1
+    assert not os.path.exists(os.path.join(A.TRASH_DIR, trash_id))
+
+
+def test_same_bytes_share_one_blob(make_project):
+    data = unique_png()
+    p1, p2 = original(make_project(images=[data])), original(make_project(images=[data]))
+    blob = blob_of(p1)
+    assert os.path.samefile(p1, p2) and os.path.samefile(p1, blob)
+    assert os.stat(blob).st_nlink - 1 == 2
+
+
+def test_blob_collected_after_last_reference_leaves_trash(client, make_project):
+    data = unique_png()
+    s1, s2 = make_project(images=[data]), make_project(images=[data])
+    blob = blob_of(original(s1))
+
+    t1 = client.delete(f"/api/projects/{s1}").get_json()["trash_id"]
+    assert os.stat(blob).st_nlink - 1 == 2  # 휴지통도 참조
+    expire_trash(t1)
+    assert os.stat(blob).st_nlink - 1 == 1
+    A.collect_blobs(now=time.time() + A.BLOB_GC_GRACE_SEC + 1)
+    assert os.path.exists(blob)  # s2가 아직 쓰는 블롭
+
+    t2 = client.delete(f"/api/projects/{s2}").get_json()["trash_id"]
+    expire_trash(t2)
+    assert os.stat(blob).st_nlink == 1
+    A.collect_blobs()  # 유예 기간 안 — 남긴다
+    assert os.path.exists(blob)
+    A.collect_blobs(now=time.time() + A.BLOB_GC_GRACE_SEC + 1)
+    assert not os.path.exists(blob)
+
+
+def test_migrate_blobs_is_idempotent(make_project):
+    slug = make_project(images=[unique_png()])
+    orig = original(slug)
+    # 블롭 이전의 배치: 독립된 파일 + 같은 내용의 버전 파일
+    copy = orig + ".copy"
+    shutil.copyfile(orig, copy)
+    os.replace(copy, orig)
+    version = os.path.join(A.illustrations_path(slug), "A", "versions", "A-1.png")
+    shutil.copyfile(orig, version)
+    assert os.stat(orig).st_nlink == 1
+    before = {p: hashlib.sha256(open(p, "rb").read()).hexdigest() for p in (orig, version)}
+
+    first = A.migrate_blobs()
+    assert first["linked"] >= 2
+    assert os.path.samefile(orig, version) and os.path.samefile(orig, blob_of(orig))
+    again = A.migrate_blobs()
+    assert again["linked"] == 0 and again["bytes_saved"] == 0
+    assert {p: hashlib.sha256(open(p, "rb").read()).hexdigest() for p in (orig, version)} == before
+
+
+def test_digest_survives_restart_without_rehashing(client, make_project, monkeypatch):
+    slug = make_project(images=[unique_png()])
+    p = original(slug)
+    digest = A.file_digest(p)
+    assert os.path.basename(blob_of(p)) == digest + ".png"
+    with A._digests_lock:
+        A._digests.clear()  # 새 워커 프로세스처럼
+
+    def no_hash(path):
+        raise AssertionError("re-hashed " + path)
+    monkeypatch.setattr(A, "hash_file", no_hash)
+    assert A.file_digest(p) == digest
+    r = client.get(f"/files/projects/{slug}/illustrations/A/original.png")
+    assert r.headers["ETag"].strip('"') == digest
+
+
+@pytest.fixture(autouse=True)
+def _no_background_gc(monkeypatch):
+    monkeypatch.setattr(A, "ensure_trash_collector", lambda: None)
@@ -0,0 +1,77 @@
+"""
+채팅 로그 — 예전 '[ts] [TAG] ...' .txt 로그 변환, seq 단조 증가와 since 페이지 넘김.
+"""
+import os
+import threading
+
+import pytest
+
+from bench.stub_model import StubClient
+from tests.conftest import storybook as A
+
+LEGACY = """\
+[2024-03-01T10:00:00] [INIT] Uploaded original for A
+[2024-03-01T10:01:00] [USER] base=/projects/{slug}/illustrations/A/original.png prompt=하늘을 더 푸르게
+그리고 구름 추가
+[2024-03-01T10:01:05] [MODEL] out=/projects/{slug}/illustrations/A/versions/A-1.png
+[2024-03-01T10:02:00] [USER] base=/projects/{slug}/illustrations/A/versions/A-1.png prompt=밤으로
+[2024-03-01T10:02:03] [MODEL:TEXT] 이미지 결과가 없습니다.
+[2024-03-01T10:03:00] [SELECT] A-1.png set as selected
+"""
+
+
+def chat(client, slug, label="A", **query):
+    r = client.get(f"/api/projects/{slug}/illustrations/{label}/chat", query_string=query)
+    assert r.status_code == 200
+    return r.get_json()
+
+
+@pytest.mark.parametrize("via", ["request", "reload"])
+def test_legacy_txt_log_is_converted(client, make_project, via):
+    slug = make_project()
+    A.run_edit(slug, "A", "p", client=StubClient(latency=0), use_cache=False)  # versions/A-1.png
+    cdir = A.chatlogs_path(slug)
+    os.remove(A.chat_log_path(slug, "A"))
+    with open(os.path.join(cdir, "A.txt"), "w", encoding="utf-8") as f:
+        f.write(LEGACY.format(slug=slug))
+    if via == "reload":
+        A.index_reload_project(slug)  # 시작 시 인덱스 재생성 경로
+
+    entries = chat(client, slug)["entries"]
+    assert [e["kind"] for e in entries] == ["INIT", "USER", "MODEL", "USER", "MODEL:TEXT", "SELECT"]
+    assert [e["seq"] for e in entries] == [1, 2, 3, 4, 5, 6]
+    assert entries[1]["prompt"] == "하늘을 더 푸르게\n그리고 구름 추가"
+    assert entries[1]["base"] == f"/projects/{slug}/illustrations/A/original.png"
+    assert entries[2]["version"] == "A-1.png" and entries[5]["version"] == "A-1.png"
+    assert entries[4]["text"] == "이미지 결과가 없습니다."
+    assert not os.path.exists(os.path.join(cdir, "A.txt")) and os.path.exists(os.path.join(cdir, "A.txt.bak"))
+
+    assert chat(client, slug, version="A-1")["entries"][0]["seq"] == 2  # 그 버전을 만든 요청부터
+    client.post(f"/api/projects/{slug}/select", json={"label": "A", "version": "__ORIGINAL__"})
+    assert [e["seq"] for e in chat(client, slug, since=6)["entries"]] == [7]  # 변환된 로그 뒤로 이어진다
+
+
+def test_seq_is_monotonic_and_pages_by_since(client, make_project):
+    slug = make_project()
+    threads = [threading.Thread(target=lambda i=i: [A.append_chat(slug, "A", "SELECT", version=f"t{i}-{k}")
+                                                    for k in range(10)])
+               for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    seen, since = [], 0
+    while True:
+        page = chat(client, slug, since=since, limit=7)
+        assert [e["seq"] for e in page["entries"]] == list(range(since + 1, since + 1 + len(page["entries"])))
+        seen += page["entries"]
+        since = page["next_since"]
+        if not page["has_more"]:
+            break
+    assert [e["seq"] for e in seen] == list(range(1, 62))  # INIT + 60
+    assert len({e["version"] for e in seen[1:]}) == 60  # 어떤 줄도 덮이거나 빠지지 않았다
+
+    end = chat(client, slug, since=61)
+    assert end["entries"] == [] and end["next_since"] == 61 and end["has_more"] is False
+    assert chat(client, slug, since=-5)["entries"][0]["seq"] == 1
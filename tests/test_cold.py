@@ -0,0 +1,91 @@
+"""
+cold 보관 — 오래된 비선택 버전을 .cold/로 옮기고, 썸네일은 미리보기로, /files 요청은 그 자리에서 되돌린다.
+버전 나이는 인덱스의 생성 시각이라 같은 블롭을 공유하는 버전/복제본이 서로의 나이를 바꾸지 않는다.
+"""
+import datetime
+import io
+import json
+import os
+
+from PIL import Image
+
+from bench.stub_model import StubClient
+from tests.conftest import storybook as A
+
+
+def vdir(slug, label="A"):
+    return os.path.join(A.illustrations_path(slug), label, "versions")
+
+
+def two_identical_versions(client, slug):
+    """결과 캐시 적중 → A-1, A-2가 같은 블롭. 원본을 최종 선택해 둘 다 비선택으로"""
+    cl = StubClient(latency=0)
+    A.run_edit(slug, "A", "same", base_version="__ORIGINAL__", client=cl)
+    assert A.run_edit(slug, "A", "same", base_version="__ORIGINAL__", client=cl)["cached"]
+    assert os.path.samefile(os.path.join(vdir(slug), "A-1.png"), os.path.join(vdir(slug), "A-2.png"))
+    client.post(f"/api/projects/{slug}/select", json={"label": "A", "version": "__ORIGINAL__"})
+
+
+def backdate_versions(slug, days):
+    """채팅 로그의 MODEL 기록 시각을 days일 전으로 → 인덱스 재생성"""
+    path = A.chat_log_path(slug, "A")
+    old = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat(timespec="seconds")
+    lines = [json.loads(raw) for raw in open(path, encoding="utf-8") if raw.strip()]
+    with open(path, "w", encoding="utf-8") as f:
+        for e in lines:
+            if e["kind"] == "MODEL":
+                e["ts"] = old
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+    A.index_reload_project(slug)
+
+
+def test_compact_moves_every_shared_version(client, make_project):
+    slug = make_project()
+    two_identical_versions(client, slug)
+    r = client.post(f"/api/projects/{slug}/compact", json={"min_age_days": 0})
+    assert r.get_json()["versions"] == 2
+    assert not os.path.exists(os.path.join(vdir(slug), "A-1.png"))
+    assert not os.path.exists(os.path.join(vdir(slug), "A-2.png"))
+    cold = sorted(os.listdir(os.path.join(vdir(slug), A.COLD_DIR)))
+    assert {"A-1.preview.webp", "A-2.preview.webp"} <= set(cold)
+    # 목록/상세에는 그대로 남는다
+    d = client.get(f"/api/projects/{slug}").get_json()
+    assert d["illustrations"][0]["version_files"] == ["A-1.png", "A-2.png"]
+
+
+def test_age_comes_from_version_creation_not_links(client, make_project):
+    slug = make_project()
+    two_identical_versions(client, slug)
+    assert client.post(f"/api/projects/{slug}/compact", json={"min_age_days": 1}).get_json()["versions"] == 0
+
+    backdate_versions(slug, 10)
+    fork = client.post(f"/api/projects/{slug}/fork", json={"name": f"{slug}-fork"}).get_json()["slug"]
+    # 복제가 같은 블롭에 링크를 더해도(ctime 갱신) 10일 된 버전은 그대로 10일
+    assert client.post(f"/api/projects/{fork}/compact", json={"min_age_days": 1}).get_json()["versions"] == 2
+    assert client.post(f"/api/projects/{slug}/compact", json={"min_age_days": 1}).get_json()["versions"] == 2
+
+
+def test_cold_thumb_uses_preview_and_files_restores(client, make_project):
+    slug = make_project(size=(400, 300))
+    A.run_edit(slug, "A", "p", base_version="__ORIGINAL__", client=StubClient(latency=0), use_cache=False)
+    client.post(f"/api/projects/{slug}/select", json={"label": "A", "version": "__ORIGINAL__"})
+    hot = os.path.join(vdir(slug), "A-1.png")
+    with Image.open(hot) as im:
+        pixels = im.convert("RGBA").tobytes()
+    client.post(f"/api/projects/{slug}/compact", json={"min_age_days": 0})
+    assert not os.path.exists(hot)
+
+    rel = f"projects/{slug}/illustrations/A/versions/A-1.png"
+    r = client.get(f"/thumbs/{rel}?w=160")
+    assert r.status_code == 200
+    with Image.open(io.BytesIO(r.data)) as im:
+        assert max(im.size) <= 160
+    assert not os.path.exists(hot)  # 썸네일은 되돌리지 않는다
+
+    r = client.get(f"/files/{rel}")
+    assert r.status_code == 200
+    with Image.open(io.BytesIO(r.data)) as im:
+        assert im.convert("RGBA").tobytes() == pixels  # 무손실
+    assert os.path.exists(hot)
+    assert not any(fn.startswith("A-1.") for fn in os.listdir(os.path.join(vdir(slug), A.COLD_DIR)))
+    assert client.get(f"/files/projects/{slug}/illustrations/A/versions/A-9.png").status_code == 404
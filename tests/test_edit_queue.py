@@ -0,0 +1,87 @@
+"""
+편집 작업 큐 — 프로젝트별 라운드로빈, 같은 삽화의 최신본 기준 작업 직렬화, 대기열 상한(429).
+"""
+import threading
+import time
+import uuid
+
+from tests.conftest import storybook as A
+
+
+class GatedRunner:
+    """gate가 열릴 때까지 작업을 붙잡아 두고, 실행 순서와 삽화별 동시 실행 수를 기록한다."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.order = []
+        self.running = {}
+        self.max_running = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, job):
+        key = (job.slug, job.label)
+        with self._lock:
+            self.order.append(job.slug)
+            self.running[key] = self.running.get(key, 0) + 1
+            self.max_running[key] = max(self.max_running.get(key, 0), self.running[key])
+        self.gate.wait(10)
+        time.sleep(0.01)
+        with self._lock:
+            self.running[key] -= 1
+        return {"version": "x"}
+
+
+def job(slug, label="A", base_version="__ORIGINAL__"):
+    return A.EditJob(id=uuid.uuid4().hex, slug=slug, label=label, prompt="p", base_version=base_version)
+
+
+def wait_all(queue, jobs, timeout=10):
+    for j in jobs:
+        queue.wait(j, "queued", timeout)
+        if j.status == "running":
+            queue.wait(j, "running", timeout)
+        assert j.status == "done", (j.id, j.status, j.error)
+
+
+def test_projects_take_turns():
+    runner = GatedRunner()
+    q = A.EditQueue(runner, workers=1, max_depth=16)
+    first = q.submit(job("p1"))
+    q.wait(first, "queued", 5)  # 워커가 첫 작업을 잡고 멈춰 있음
+    rest = q.submit_many([job("p1") for _ in range(3)]) + q.submit_many([job("p2") for _ in range(2)])
+    runner.gate.set()
+    wait_all(q, [first, *rest])
+    # p1이 먼저 3개를 더 넣었어도 p2가 번갈아 끼어든다
+    assert runner.order == ["p1", "p1", "p2", "p1", "p2", "p1"]
+
+
+def test_latest_base_jobs_on_one_label_run_one_at_a_time():
+    runner = GatedRunner()
+    runner.gate.set()
+    q = A.EditQueue(runner, workers=4, max_depth=16)
+    latest = q.submit_many([job("p3", base_version="") for _ in range(4)])
+    pinned = q.submit_many([job("p3", label="B") for _ in range(4)])
+    wait_all(q, latest + pinned)
+    assert runner.max_running[("p3", "A")] == 1
+
+
+def test_full_queue_returns_429(client, make_project, monkeypatch):
+    slug = make_project()
+    runner = GatedRunner()
+    q = A.EditQueue(runner, workers=1, max_depth=2)
+    monkeypatch.setattr(A, "edit_queue", q)
+    try:
+        def post(**form):
+            return client.post(f"/api/projects/{slug}/edit", data={"label": "A", "prompt": "p", **form})
+
+        r = post()
+        assert r.status_code == 202
+        q.wait(q.get(r.get_json()["job_id"]), "queued", 5)  # 실행 중 — 대기열에서 빠짐
+        assert post().status_code == 202
+        assert post().status_code == 202
+        r = post()
+        assert r.status_code == 429
+        assert r.get_json()["ok"] is False
+        assert post(n="2").status_code == 429  # 묶음은 전부 들어가거나 하나도 안 들어간다
+    finally:
+        runner.gate.set()
@@ -0,0 +1,180 @@
+"""
+내보내기/가져오기(tar) — 전체 왕복, rev 기준 증분, 증분 반영, 실패 시 되돌리기.
+"""
+import hashlib
+import io
+import json
+import os
+import tarfile
+
+import pytest
+from PIL import Image
+
+from bench.stub_model import StubClient
+from tests.conftest import storybook as A
+
+
+def export(client, slug, since=None):
+    r = client.get(f"/api/projects/{slug}/export", query_string={"since": since} if since is not None else {})
+    assert r.status_code == 200
+    tf = tarfile.open(fileobj=io.BytesIO(r.data))
+    names = tf.getnames()
+    assert names[0] == A.EXPORT_MANIFEST
+    return r.data, set(names[1:]), json.load(tf.extractfile(A.EXPORT_MANIFEST))
+
+
+def import_new(client, data, name):
+    r = client.post(f"/api/projects/import?name={name}", data=data, content_type="application/x-tar")
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()["slug"]
+
+
+def import_into(client, slug, data):
+    return client.post(f"/api/projects/{slug}/import", data=data, content_type="application/x-tar")
+
+
+def tree(slug):
+    """project.json, 채팅 로그를 뺀 파일 → sha256. 버전은 hot/cold 구분 없이 픽셀로 비교한다
+    (선택 때 되돌린 cold 버전은 보관 위치만 바뀐 것이라 증분에 실리지 않는다)."""
+    base = A.project_path(slug)
+    out = {}
+    for dirpath, _, fns in os.walk(os.path.join(base, "illustrations")):
+        for fn in fns:
+            p = os.path.join(dirpath, fn)
+            rel = os.path.relpath(p, base)
+            if os.path.basename(dirpath) == A.COLD_DIR:
+                if fn.endswith(".preview.webp"):
+                    continue
+                rel = os.path.join(os.path.dirname(os.path.dirname(rel)), os.path.splitext(fn)[0] + ".png")
+            if "/versions/" in rel:
+                with Image.open(p) as im:
+                    out[rel] = hashlib.sha256(im.convert("RGBA").tobytes()).hexdigest()
+            else:
+                out[rel] = hashlib.sha256(open(p, "rb").read()).hexdigest()
+    return out
+
+
+def chats(slug):
+    """채팅 로그 내용 (경로 안의 slug는 지운다)"""
+    cdir = A.chatlogs_path(slug)
+    return {fn: open(os.path.join(cdir, fn), encoding="utf-8").read().replace(f"/projects/{slug}/", "/projects/*/")
+            for fn in sorted(os.listdir(cdir))}
+
+
+def same_project(client, a, b):
+    assert tree(a) == tree(b)
+    assert chats(a) == chats(b)
+    da, db = client.get(f"/api/projects/{a}").get_json(), client.get(f"/api/projects/{b}").get_json()
+    strip = [(i["label"], i["selected"], i["version_files"]) for i in da["illustrations"]]
+    assert strip == [(i["label"], i["selected"], i["version_files"]) for i in db["illustrations"]]
+
+
+def edit(slug, label, prompt="p"):
+    return A.run_edit(slug, label, prompt, client=StubClient(latency=0), use_cache=False)["version"]
+
+
+@pytest.fixture
+def source(client, make_project):
+    """A(버전 2, A-2 선택, A-1 cold), B(버전 1, cold)"""
+    slug = make_project(labels=2)
+    edit(slug, "A")
+    edit(slug, "A")
+    edit(slug, "B")
+    client.post(f"/api/projects/{slug}/select", json={"label": "A", "version": "A-2.png"})
+    client.post(f"/api/projects/{slug}/select", json={"label": "B", "version": "__ORIGINAL__"})
+    assert client.post(f"/api/projects/{slug}/compact", json={"min_age_days": 0}).get_json()["versions"] == 2
+    return slug
+
+
+def test_full_round_trip(client, source):
+    data, names, manifest = export(client, source)
+    assert manifest["full"] is True and manifest["rev"] > 0
+    assert {"illustrations/A/versions/.cold/A-1.preview.webp", "illustrations/A/versions/A-2.png",
+            "chat_logs/A.jsonl", "project.json"} <= names
+    copy = import_new(client, data, f"{source}-copy")
+    same_project(client, source, copy)
+    assert f"/projects/{copy}/" in open(A.chat_log_path(copy, "A"), encoding="utf-8").read()
+    assert client.get(f"/files/projects/{copy}/illustrations/A/versions/A-1.png").status_code == 200  # cold 복구
+    assert client.post("/api/projects/import", data=data, content_type="application/x-tar").status_code == 409
+
+
+def test_incremental_export_is_rev_based(client, source, make_project):
+    data, _, manifest = export(client, source)
+    copy = import_new(client, data, f"{source}-inc")
+    rev = manifest["rev"]
+
+    # 같은 블롭에 링크를 더하고 빼는 다른 작업 — 파일 시각은 바뀌어도 변경분은 없다
+    client.post(f"/api/projects/{source}/fork", json={"name": f"{source}-fork"})
+    import_new(client, data, f"{source}-other")
+    _, names, m = export(client, source, since=rev)
+    assert m["full"] is False and m["since"] == rev
+    assert names == {"project.json"}
+
+    new = edit(source, "A")
+    client.post(f"/api/projects/{source}/select", json={"label": "B", "version": "B-1.png"})
+    inc, names, m = export(client, source, since=rev)
+    assert f"illustrations/A/versions/{new}" in names
+    assert {"illustrations/B/selected.txt", "chat_logs/A.jsonl", "chat_logs/B.jsonl"} <= names
+    assert not any(n.endswith("original.png") or "A-1" in n or "A-2" in n for n in names)
+    r = import_into(client, copy, inc)
+    assert r.status_code == 200 and r.get_json()["removed"] == []
+    same_project(client, source, copy)
+
+    # 삽화 삭제 → 목록에서 빠진 삽화는 받는 쪽에서도 휴지통으로
+    client.delete(f"/api/projects/{source}/illustrations/B")
+    inc, names, _ = export(client, source, since=m["rev"])
+    assert not any("/B/" in n for n in names)
+    assert import_into(client, copy, inc).get_json()["removed"] == ["B"]
+    same_project(client, source, copy)
+
+
+def test_unknown_since_falls_back_to_full(client, source):
+    _, names, m = export(client, source, since=1)
+    assert m["full"] is True and "illustrations/A/original.png" in names
+    assert client.get(f"/api/projects/{source}/export?since=abc").status_code == 400
+
+
+def test_import_replaces_stale_cold_copy(client, source):
+    data, _, _ = export(client, source)
+    copy = import_new(client, data, f"{source}-stale")
+    client.get(f"/files/projects/{source}/illustrations/A/versions/A-1.png")  # 원본 쪽은 다시 hot
+    data, _, _ = export(client, source)
+    assert import_into(client, copy, data).status_code == 200
+    vdir = os.path.join(A.illustrations_path(copy), "A", "versions")
+    assert os.path.exists(os.path.join(vdir, "A-1.png"))
+    assert not any(fn.startswith("A-1.") for fn in os.listdir(os.path.join(vdir, A.COLD_DIR)))
+
+
+def rewrite(data, name, body):
+    src, buf = tarfile.open(fileobj=io.BytesIO(data)), io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as out:
+        for m in src:
+            b = body if m.name == name else src.extractfile(m).read()
+            m.size = len(b)
+            out.addfile(m, io.BytesIO(b))
+    return buf.getvalue()
+
+
+def test_failed_import_changes_nothing(client, source, monkeypatch):
+    data, _, _ = export(client, source)
+    copy = import_new(client, data, f"{source}-rb")
+    edit(source, "A")
+    data, _, _ = export(client, source)
+    before, before_chats = tree(copy), chats(copy)
+
+    bad = rewrite(data, "chat_logs/A.jsonl", b'{"seq": 1}\n{not json\n')
+    r = import_into(client, copy, bad)
+    assert r.status_code == 400 and "chat_logs/A.jsonl" in r.get_json()["error"]
+    assert import_into(client, copy, rewrite(data, "illustrations/A/original.png", b"\x89PNG junk")).status_code == 400
+    assert tree(copy) == before and chats(copy) == before_chats
+
+    def boom(slug):
+        raise ValueError("boom")
+    monkeypatch.setattr(A, "index_reload_project", boom)
+    assert import_into(client, copy, data).status_code == 400  # 파일을 옮긴 뒤 실패 → 되돌림
+    assert tree(copy) == before and chats(copy) == before_chats
+    assert client.post("/api/projects/import?name=never", data=data,
+                       content_type="application/x-tar").status_code == 400
+    assert not os.path.exists(A.project_path("never")) and A.index_project_meta("never") is None
+    monkeypatch.undo()
+    assert len(client.get(f"/api/projects/{copy}").get_json()["illustrations"]) == 2
@@ -0,0 +1,73 @@
+"""
+SQLite 인덱스 — 목록/상세는 인덱스에서 읽고, 디스크를 직접 고친 뒤 rebuild-index 하면 디스크와 같아진다.
+"""
+import os
+import shutil
+import uuid
+
+from bench.stub_model import StubClient
+from tests.conftest import flask_app, storybook as A
+
+
+def disk_state(slug):
+    """디스크에서 직접 읽은 삽화별 (선택, 버전 파일 — cold 포함)"""
+    out = {}
+    illus = A.illustrations_path(slug)
+    for label in sorted(os.listdir(illus)):
+        vdir = os.path.join(illus, label, "versions")
+        names = {fn for fn in os.listdir(vdir) if fn.endswith(".png")}
+        cold = os.path.join(vdir, A.COLD_DIR)
+        if os.path.isdir(cold):
+            names |= {fn.split(".")[0] + ".png" for fn in os.listdir(cold) if not fn.endswith(".preview.webp")}
+        selected = A.read_text(os.path.join(illus, label, "selected.txt")).strip()
+        out[label] = (selected, sorted(names, key=lambda n: int(n[:-4].split("-")[1])))
+    return out
+
+
+def api_state(client, slug):
+    d = client.get(f"/api/projects/{slug}").get_json()
+    return {i["label"]: (i["selected"], i["version_files"]) for i in d["illustrations"]}
+
+
+def listed(client):
+    return {p["slug"]: p for p in client.get("/api/projects").get_json()["projects"]}
+
+
+def test_rebuild_matches_disk_after_out_of_band_changes(client, make_project):
+    slug = make_project(labels=3)
+    for _ in range(3):
+        A.run_edit(slug, "A", "p", client=StubClient(latency=0), use_cache=False)
+    client.post(f"/api/projects/{slug}/select", json={"label": "A", "version": "A-3.png"})
+    client.post(f"/api/projects/{slug}/compact", json={"min_age_days": 0})  # A-1, A-2 → cold
+    assert api_state(client, slug) == disk_state(slug)
+
+    # 인덱스를 거치지 않고 디스크를 바꾼다
+    illus = A.illustrations_path(slug)
+    shutil.rmtree(os.path.join(illus, "C"))
+    vdir = os.path.join(illus, "A", "versions")
+    shutil.copyfile(os.path.join(vdir, "A-3.png"), os.path.join(vdir, "A-4.png"))
+    A.write_text(os.path.join(illus, "A", "selected.txt"), "A-4.png")
+    copy = f"copied-{uuid.uuid4().hex[:8]}"
+    shutil.copytree(A.project_path(slug), A.project_path(copy))
+    A.write_json(os.path.join(A.project_path(copy), "project.json"), {"name": copy, "created_at": A.now_iso()})
+    assert copy not in listed(client) and "C" in api_state(client, slug)  # 목록/상세는 인덱스에서
+
+    result = flask_app.test_cli_runner().invoke(args=["rebuild-index"])
+    assert result.exit_code == 0 and "인덱스 재생성 완료" in result.output
+
+    for s in (slug, copy):
+        assert api_state(client, s) == disk_state(s)
+    assert api_state(client, slug) == {"A": ("A-4.png", ["A-1.png", "A-2.png", "A-3.png", "A-4.png"]),
+                                       "B": ("__ORIGINAL__", [])}
+    projects = listed(client)
+    assert projects[copy]["name"] == copy and projects[copy]["illustration_count"] == 2
+    # 재생성 뒤에도 새 버전 번호는 디스크의 최대값 다음
+    assert A.run_edit(slug, "A", "p", client=StubClient(latency=0), use_cache=False)["version"] == "A-5.png"
+
+
+def test_stale_schema_rebuilds_on_startup(client, make_project):
+    slug = make_project(labels=2)
+    A.db().execute("PRAGMA user_version=1")  # 예전 버전의 인덱스
+    A.create_app()
+    assert A.db().execute("PRAGMA user_version").fetchone()[0] == A.INDEX_SCHEMA_VERSION
+    assert api_state(client, slug) == disk_state(slug)
@@ -0,0 +1,85 @@
+"""
+계측 — /metrics 가 Prometheus 텍스트 형식(0.0.4)을 지키는지, 프로파일 요청의 Server-Timing/_profile.
+"""
+import re
+
+from tests.conftest import storybook as A
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse(text):
+    """→ {이름: 종류}, [(이름, {레이블}, 값)] — 형식이 틀리면 assert"""
+    assert text.endswith("\n")
+    types, samples, family = {}, [], None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            family = line.split(" ", 3)[2]
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert name == family and name not in types, line  # HELP 다음 TYPE, 이름마다 한 번
+            assert kind in ("counter", "gauge", "histogram", "untyped")
+            types[name] = kind
+            continue
+        m = SAMPLE.match(line)
+        assert m, line
+        name, labels, value = m.group(1), dict(LABEL.findall(m.group(2) or "")), float(m.group(3))
+        base = re.sub(r"_(bucket|sum|count)$", "", name) if types.get(family) == "histogram" else name
+        assert base == family, line  # 샘플은 자기 TYPE 아래에
+        samples.append((name, labels, value))
+    return types, samples
+
+
+def series(samples, name, **match):
+    return [(labels, v) for n, labels, v in samples if n == name and all(labels.get(k) == v for k, v in match.items())]
+
+
+def test_metrics_exposition_format(client, make_project):
+    slug = make_project()
+    for _ in range(3):
+        assert client.get(f"/api/projects/{slug}").status_code == 200
+    A.metrics.inc("http_requests_total", 0, method="GET", route='/odd "route"\\x', status=200)  # 이스케이프
+
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    types, samples = parse(r.get_data(as_text=True))
+    assert types["http_requests_total"] == "counter" and types["http_request_duration_seconds"] == "histogram"
+
+    route = "/api/projects/<slug>"
+    [(_, n)] = series(samples, "http_requests_total", method="GET", route=route, status="200")
+    assert n >= 3
+    assert series(samples, "http_requests_total", route='/odd \\"route\\"\\\\x')
+
+    buckets = series(samples, "http_request_duration_seconds_bucket", method="GET", route=route)
+    les = [float(labels["le"]) for labels, _ in buckets]
+    counts = [v for _, v in buckets]
+    assert les == sorted(les) and les[-1] == float("inf")
+    assert counts == sorted(counts)  # 누적
+    [(_, total)] = series(samples, "http_request_duration_seconds_count", method="GET", route=route)
+    assert counts[-1] == total >= 3
+
+    again = parse(client.get("/metrics").get_data(as_text=True))[1]
+    [(_, n2)] = series(again, "http_requests_total", method="GET", route=route, status="200")
+    assert n2 == n  # /metrics 조회는 자기 라우트로만 센다
+
+
+def test_profiled_request_gets_server_timing(client, make_project):
+    slug = make_project()
+    assert "Server-Timing" not in client.get(f"/api/projects/{slug}/illustrations/A/chat").headers
+
+    r = client.get(f"/api/projects/{slug}/illustrations/A/chat", headers={"X-Profile": "1"})
+    timing = r.headers["Server-Timing"]
+    entries = [e.strip() for e in timing.split(",")]
+    assert all(re.fullmatch(r"[\w.\-]+;dur=\d+(\.\d+)?", e) for e in entries), timing
+    names = [e.split(";")[0] for e in entries]
+    assert names[0] == "total" and "chat.read" in names
+    prof = r.get_json()["_profile"]
+    assert prof["route"] == "/api/projects/<slug>/illustrations/<label>/chat"
+    assert float(entries[0].split("=")[1]) >= max(sp["ms"] for sp in prof["spans"]) - 0.1
+
+    assert "Server-Timing" in client.get(f"/api/projects/{slug}?_profile=1").headers
+    # 스트리밍(zip)에는 헤더만, 본문은 건드리지 않는다
+    r = client.get(f"/api/projects/{slug}/download_selected", headers={"X-Profile": "1"})
+    assert r.headers["Server-Timing"].startswith("total;dur=") and r.data[:2] == b"PK"
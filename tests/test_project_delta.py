@@ -0,0 +1,97 @@
+"""
+프로젝트 상세의 리비전 — 바뀔 때마다 rev 증가, ETag/304, ?since=<rev> 변경분 응답.
+"""
+import io
+import time
+
+from bench.stub_model import StubClient
+from tests.conftest import noise_png, storybook as A
+
+
+def detail(client, slug, **params):
+    r = client.get(f"/api/projects/{slug}", query_string=params)
+    assert r.status_code == 200
+    return r.get_json()
+
+
+def labels(d):
+    return sorted(i["label"] for i in d["illustrations"])
+
+
+def test_etag_and_304(client, make_project):
+    slug = make_project()
+    r = client.get(f"/api/projects/{slug}")
+    etag = r.headers["ETag"]
+    assert etag.strip('"') == f"rev-{r.get_json()['rev']}"
+    assert client.get(f"/api/projects/{slug}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post(f"/api/projects/{slug}/select", json={"label": "A", "version": "__ORIGINAL__"})
+    r = client.get(f"/api/projects/{slug}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+
+
+def test_each_mutation_bumps_rev_and_since_returns_the_delta(client, make_project):
+    slug = make_project(labels=2)
+    rev = detail(client, slug)["rev"]
+
+    def step():
+        nonlocal rev
+        d = detail(client, slug, since=rev)
+        assert d["rev"] > rev
+        assert d["full"] is False
+        rev = d["rev"]
+        return d
+
+    # 편집 → 그 삽화만, 새 버전만
+    A.run_edit(slug, "A", "p", client=StubClient(latency=0), use_cache=False)
+    d = step()
+    assert labels(d) == ["A"]
+    assert d["illustrations"][0]["version_files"] == ["A-1.png"]
+    A.run_edit(slug, "A", "q", client=StubClient(latency=0), use_cache=False)
+    d = step()
+    assert d["illustrations"][0]["version_files"] == ["A-2.png"]
+    assert d["illustrations"][0]["version_count"] == 2
+
+    # 최종 선택
+    assert client.post(f"/api/projects/{slug}/select", json={"label": "B", "version": "__ORIGINAL__"}).status_code == 200
+    d = step()
+    assert labels(d) == ["B"]
+    assert d["illustrations"][0]["selected"] == "__ORIGINAL__"
+
+    # 이름 변경 → 삽화는 그대로, meta만
+    assert client.post(f"/api/projects/{slug}/rename", json={"name": f"{slug}-renamed"}).status_code == 200
+    d = step()
+    assert d["illustrations"] == [] and d["removed"] == []
+    assert d["meta"]["name"] == f"{slug}-renamed"
+
+    # 삽화 삭제 → removed
+    assert client.delete(f"/api/projects/{slug}/illustrations/A").status_code == 200
+    d = step()
+    assert d["removed"] == ["A"]
+    assert d["illustrations"] == []
+
+    # 업로드 → 새 삽화 (지운 라벨을 다시 쓰면 removed에서는 빠진다)
+    r = client.post(f"/api/projects/{slug}/illustrations", data={"images": [(io.BytesIO(noise_png()), "n.png")]},
+                    content_type="multipart/form-data")
+    assert r.status_code == 200
+    new = r.get_json()["labels"]
+    deadline = time.monotonic() + 30
+    while A.ingest_pending(slug, new[0]):  # 원본 변환이 끝나면 rev가 한 번 더 오른다
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    d = step()
+    assert labels(d) == new
+    assert d["removed"] == []
+
+    # 아무것도 안 바뀌면 빈 변경분, rev 그대로
+    d = detail(client, slug, since=rev)
+    assert d["rev"] == rev and d["illustrations"] == [] and d["removed"] == []
+
+
+def test_since_outside_known_revs_falls_back_to_full(client, make_project):
+    slug = make_project()
+    d = detail(client, slug)
+    assert detail(client, slug, since=0)["full"] is True          # 인덱스 재생성 전의 rev
+    assert detail(client, slug, since=d["rev"] + 1)["full"] is True  # 미래 rev
+    assert labels(detail(client, slug, since=0)) == ["A"]
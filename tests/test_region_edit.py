@@ -0,0 +1,69 @@
+"""
+부분 편집(region/mask) — 영역 밖 픽셀은 베이스와 똑같이 남아야 한다.
+"""
+import io
+import os
+
+from PIL import Image, ImageDraw
+
+from bench.stub_model import StubClient
+from tests.conftest import storybook as A
+
+SIZE = (96, 64)
+
+
+def pixels(slug, rel):
+    with Image.open(os.path.join(A.illustrations_path(slug), "A", rel)) as im:
+        return im.convert("RGBA").load()
+
+
+def diff(slug, version, inside):
+    """(영역 밖에서 바뀐 픽셀 수, 영역 안에서 바뀐 픽셀 수)"""
+    base, out = pixels(slug, "original.png"), pixels(slug, os.path.join("versions", version))
+    outside_changed = inside_changed = 0
+    for y in range(SIZE[1]):
+        for x in range(SIZE[0]):
+            if base[x, y] != out[x, y]:
+                if inside(x, y):
+                    inside_changed += 1
+                else:
+                    outside_changed += 1
+    return outside_changed, inside_changed
+
+
+def test_region_edit_keeps_outside_pixels(make_project):
+    slug = make_project(size=SIZE)
+    r = A.run_edit(slug, "A", "p", region=["10", "8", "30", "20"], client=StubClient(latency=0), use_cache=False)
+    outside, inside = diff(slug, r["version"], lambda x, y: 10 <= x < 40 and 8 <= y < 28)
+    assert outside == 0
+    assert inside > 0
+
+
+def test_mask_edit_keeps_pixels_outside_mask(make_project):
+    slug = make_project(size=SIZE)
+    mask = Image.new("L", SIZE, 0)
+    ImageDraw.Draw(mask).ellipse((40, 10, 80, 50), fill=255)
+    buf = io.BytesIO()
+    mask.save(buf, format="PNG")
+    r = A.run_edit(slug, "A", "p", mask=buf.getvalue(), client=StubClient(latency=0), use_cache=False)
+    outside, inside = diff(slug, r["version"], lambda x, y: mask.getpixel((x, y)) > 0)
+    assert outside == 0
+    assert inside > 0
+
+
+def test_region_edit_through_api(client, make_project, monkeypatch):
+    slug = make_project(size=SIZE)
+    monkeypatch.setattr(A, "_model_client", StubClient(latency=0))
+    r = client.post(f"/api/projects/{slug}/edit",
+                    data={"label": "A", "prompt": "p", "region": "50%,50%,25%,25%", "no_cache": "1"})
+    assert r.status_code == 202
+    job = A.edit_queue.get(r.get_json()["job_id"])
+    for status in ("queued", "running"):
+        if job.status == status:
+            A.edit_queue.wait(job, status, 10)
+    assert job.status == "done", job.error
+    outside, inside = diff(slug, job.result["version"], lambda x, y: 48 <= x < 72 and 32 <= y < 48)
+    assert outside == 0
+    assert inside > 0
+    assert client.post(f"/api/projects/{slug}/edit",
+                       data={"label": "A", "prompt": "p", "region": "1,2,3"}).status_code == 400
@@ -0,0 +1,143 @@
+"""
+ResilientModel(재시도/헤징/서킷 브레이커/마감) — bench/fake_gemini.py 서버를 띄워 실제 SDK 경로로 시험한다.
+"""
+import threading
+import time
+
+import pytest
+from google import genai
+from google.genai import types
+
+from bench.fake_gemini import serve
+from bench.stub_model import StubClient
+from tests.conftest import noise_png, storybook as A
+
+
+@pytest.fixture
+def fake():
+    server = serve(port=0, latency=0.01, jitter=0.0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def gemini(fake):
+    host, port = fake.server_address[:2]
+    return genai.Client(api_key="test", http_options=types.HttpOptions(base_url=f"http://{host}:{port}"))
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    monkeypatch.setattr(A, "MODEL_RETRIES", 2)
+    monkeypatch.setattr(A, "MODEL_BACKOFF_SEC", 0.1)
+    monkeypatch.setattr(A, "MODEL_DEADLINE_SEC", 10.0)
+    monkeypatch.setattr(A, "MODEL_ATTEMPT_TIMEOUT_SEC", 5.0)
+    model = A.ResilientModel(A.TokenBucket(0, 1), A.CircuitBreaker(2, 0.3), workers=4)
+    yield model
+    model._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def call(model, gemini):
+    return model.generate_content(gemini, model="fake-image", contents=[
+        types.Part.from_bytes(data=noise_png((16, 16)), mime_type="image/png"), "prompt"])
+
+
+@pytest.mark.parametrize("code", [503, 429])
+def test_transient_error_is_retried_with_backoff(fake, gemini, guard, monkeypatch, code):
+    fake.config.update(error_rate=1.0, error_codes=[code])
+    failure = guard.breaker.failure
+
+    def failure_then_recover():  # 첫 실패가 기록되면 서버가 회복된다
+        failure()
+        fake.config.update(error_rate=0.0)
+    monkeypatch.setattr(guard.breaker, "failure", failure_then_recover)
+
+    t0 = time.monotonic()
+    resp = call(guard, gemini)
+    assert resp.candidates[0].content.parts[0].inline_data.data
+    assert fake.config.requests == 2
+    assert guard.counters["retries"] == 1
+    assert time.monotonic() - t0 >= A.MODEL_BACKOFF_SEC * 0.5
+
+
+def test_retries_give_up_after_limit(fake, gemini, guard):
+    guard.breaker.failures = 10
+    fake.config.update(error_rate=1.0, error_codes=[503])
+    t0 = time.monotonic()
+    with pytest.raises(A.ModelUpstreamError):
+        call(guard, gemini)
+    assert fake.config.requests == A.MODEL_RETRIES + 1
+    assert guard.counters["retries"] == A.MODEL_RETRIES
+    assert time.monotonic() - t0 >= A.MODEL_BACKOFF_SEC * (1 + 2) * 0.5  # 1배, 2배 대기
+
+
+def test_hedged_request_beats_slow_primary(fake, gemini, guard, monkeypatch):
+    guard._latencies.extend([0.05] * A.MODEL_HEDGE_MIN_SAMPLES)  # 헤징 기준 50ms
+    fake.config.update(latency=3.0)
+
+    def hedge_fast():  # 헤지 요청을 보내기 직전 — 그 뒤 요청은 빠르게
+        fake.config.update(latency=0.01)
+        return True
+    monkeypatch.setattr(guard.limiter, "try_acquire", hedge_fast)
+
+    t0 = time.monotonic()
+    resp = call(guard, gemini)
+    assert resp.candidates
+    assert time.monotonic() - t0 < 2.0
+    assert guard.counters["hedges"] == 1
+    assert guard.counters["hedge_wins"] == 1
+
+
+def test_breaker_opens_then_half_opens(fake, gemini, guard, monkeypatch):
+    monkeypatch.setattr(A, "MODEL_RETRIES", 0)
+    fake.config.update(outage=True)
+    for _ in range(guard.breaker.failures):
+        with pytest.raises(A.ModelUpstreamError):
+            call(guard, gemini)
+    assert guard.breaker.state == "open"
+    sent = fake.config.requests
+    with pytest.raises(A.ModelUnavailable):
+        call(guard, gemini)
+    assert fake.config.requests == sent  # 열려 있으면 서버까지 가지 않는다
+
+    time.sleep(guard.breaker.reset_sec)
+    fake.config.update(outage=False, latency=0.5)
+    probe = threading.Thread(target=call, args=(guard, gemini))
+    probe.start()
+    deadline = time.monotonic() + 5
+    while fake.config.requests == sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert guard.breaker.state == "half_open"
+    with pytest.raises(A.ModelUnavailable):  # 시험 호출은 하나만
+        call(guard, gemini)
+    probe.join()
+    assert guard.breaker.state == "closed"
+
+
+def test_edit_past_deadline_is_504(fake, gemini, guard, monkeypatch, make_project):
+    slug = make_project()
+    monkeypatch.setattr(A, "model_guard", guard)
+    monkeypatch.setattr(A, "MODEL_DEADLINE_SEC", 0.5)
+    fake.config.update(latency=3.0)
+    t0 = time.monotonic()
+    with pytest.raises(A.EditError) as e:
+        A.run_edit(slug, "A", "too slow", client=gemini, use_cache=False)
+    assert e.value.status == 504
+    assert time.monotonic() - t0 < 2.0
+
+
+def test_unexpected_edit_failure_is_500_and_logged(make_project, monkeypatch, caplog):
+    slug = make_project()
+
+    def broken(img, base):
+        raise RuntimeError("/srv/secret/path exploded")
+    monkeypatch.setattr(A, "force_same_size", broken)
+    with pytest.raises(A.EditError) as e:
+        A.run_edit(slug, "A", "p", client=StubClient(latency=0), use_cache=False)
+    assert e.value.status == 500 and "secret" not in e.value.message  # 내부 메시지는 응답에 싣지 않는다
+    assert any(r.exc_info and "exploded" in str(r.exc_info[1]) for r in caplog.records)
+
+    with pytest.raises(A.EditError) as e:  # 입력 오류는 그대로 400
+        A.run_edit(slug, "A", "p", region=["0", "0", "0", "0"], client=StubClient(latency=0), use_cache=False)
+    assert e.value.status == 400
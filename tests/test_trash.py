@@ -0,0 +1,110 @@
+"""
+휴지통 — 삽화/프로젝트 복구, 이름이 다시 쓰였으면 409, 보관 기간(TRASH_RETENTION_HOURS)이 지난 항목 수거와
+그 뒤 블롭 참조 수.
+"""
+import io
+import os
+import time
+
+import pytest
+
+from bench.stub_model import StubClient
+from tests.conftest import storybook as A, unique_png, wait_ingested
+
+
+def detail(client, slug):
+    return client.get(f"/api/projects/{slug}").get_json()
+
+
+def labels(client, slug):
+    return [i["label"] for i in detail(client, slug)["illustrations"]]
+
+
+def restore(client, trash_id):
+    return client.post(f"/api/trash/{trash_id}/restore")
+
+
+def test_restore_illustration_with_versions_and_chat(client, make_project):
+    slug = make_project(labels=2)
+    A.run_edit(slug, "A", "p", client=StubClient(latency=0), use_cache=False)
+    orig = open(os.path.join(A.illustrations_path(slug), "A", "original.png"), "rb").read()
+
+    trash_id = client.delete(f"/api/projects/{slug}/illustrations/A").get_json()["trash_id"]
+    assert labels(client, slug) == ["B"]
+    assert not os.path.exists(A.chat_log_path(slug, "A"))
+    items = client.get(f"/api/trash?slug={slug}").get_json()["items"]
+    assert [(e["id"], e["kind"], e["label"]) for e in items] == [(trash_id, "illustration", "A")]
+
+    r = restore(client, trash_id)
+    assert r.status_code == 200 and r.get_json()["label"] == "A"
+    assert labels(client, slug) == ["A", "B"]
+    assert detail(client, slug)["illustrations"][0]["version_files"] == ["A-1.png"]
+    assert open(os.path.join(A.illustrations_path(slug), "A", "original.png"), "rb").read() == orig
+    chat = client.get(f"/api/projects/{slug}/illustrations/A/chat").get_json()["entries"]
+    assert "MODEL" in [e["kind"] for e in chat]
+    assert client.get(f"/api/trash?slug={slug}").get_json()["items"] == []
+    assert restore(client, trash_id).status_code == 404
+
+
+def test_restore_project(client, make_project):
+    slug = make_project(labels=2)
+    trash_id = client.delete(f"/api/projects/{slug}").get_json()["trash_id"]
+    assert client.get(f"/api/projects/{slug}").status_code == 404
+    assert slug not in [p["slug"] for p in client.get("/api/projects").get_json()["projects"]]
+
+    assert restore(client, trash_id).status_code == 200
+    assert labels(client, slug) == ["A", "B"]
+    assert slug in [p["slug"] for p in client.get("/api/projects").get_json()["projects"]]
+
+
+def test_restore_conflicts_return_409(client, make_project):
+    slug = make_project(labels=1)
+    trash_id = client.delete(f"/api/projects/{slug}/illustrations/A").get_json()["trash_id"]
+    # 새 업로드가 비어 있는 A를 다시 쓴다
+    r = client.post(f"/api/projects/{slug}/illustrations", data={"images": [(io.BytesIO(unique_png()), "n.png")]},
+                    content_type="multipart/form-data")
+    assert r.get_json()["labels"] == ["A"]
+    wait_ingested(slug)
+    r = restore(client, trash_id)
+    assert r.status_code == 409 and r.get_json()["ok"] is False
+    assert [e["id"] for e in client.get(f"/api/trash?slug={slug}").get_json()["items"]] == [trash_id]  # 그대로 남는다
+
+    # 프로젝트가 먼저 지워졌으면 삽화는 복구할 곳이 없다
+    name = detail(client, slug)["meta"]["name"]
+    project_trash = client.delete(f"/api/projects/{slug}").get_json()["trash_id"]
+    assert restore(client, trash_id).status_code == 409
+    # 같은 이름으로 새 프로젝트를 만들었으면 프로젝트 복구도 409
+    assert client.post("/api/projects", json={"name": name}).status_code == 200
+    assert restore(client, project_trash).status_code == 409
+
+
+def test_collect_after_retention_then_blobs(client, make_project):
+    slug = make_project(images=[unique_png(), unique_png()])
+    blob = A.blob_path(A.hash_file(os.path.join(A.illustrations_path(slug), "A", "original.png")))
+    assert os.stat(blob).st_nlink == 2
+
+    trash_id = client.delete(f"/api/projects/{slug}/illustrations/A").get_json()["trash_id"]
+    entry = os.path.join(A.TRASH_DIR, trash_id)
+    deleted = A.read_json(os.path.join(entry, "entry.json"))["deleted_ts"]
+
+    A.collect_trash(now=deleted + A.TRASH_RETENTION_SEC - 60)  # 아직 보관 기간 안
+    assert os.path.isdir(entry)
+    assert os.stat(blob).st_nlink == 2  # 휴지통 안의 original.png가 참조
+    A.collect_blobs(now=time.time() + A.BLOB_GC_GRACE_SEC + 1)
+    assert os.path.exists(blob)
+
+    assert A.collect_trash(now=deleted + A.TRASH_RETENTION_SEC + 1) >= 1
+    assert not os.path.exists(entry)
+    assert restore(client, trash_id).status_code == 404
+    assert os.stat(blob).st_nlink == 1  # 이제 아무도 쓰지 않는다
+    A.collect_blobs()  # 유예 기간 안 — 남긴다
+    assert os.path.exists(blob)
+    A.collect_blobs(now=time.time() + A.BLOB_GC_GRACE_SEC + 1)
+    assert not os.path.exists(blob)
+    assert labels(client, slug) == ["B"]  # 남은 삽화의 블롭은 그대로
+    assert client.get(f"/files/projects/{slug}/illustrations/B/original.png").status_code == 200
+
+
+@pytest.fixture(autouse=True)
+def _no_background_gc(monkeypatch):
+    monkeypatch.setattr(A, "ensure_trash_collector", lambda: None)
@@ -0,0 +1,91 @@
+"""
+업로드 파이프라인 — 인코딩 전에 응답, 처리 중 → 완료, 변환 실패 표시(.upload.failed),
+죽은 프로세스가 남긴 업로드를 시작 시 다시 맡기(recover_pending_uploads).
+"""
+import fcntl
+import io
+import os
+import uuid
+
+from tests import upload_gate
+from tests.conftest import noise_png, storybook as A, wait_ingested
+
+
+def new_project(client):
+    return client.post("/api/projects", json={"name": f"up-{uuid.uuid4().hex[:8]}"}).get_json()["slug"]
+
+
+def upload(client, slug, *images):
+    files = [(io.BytesIO(data), f"{i}.png") for i, data in enumerate(images)]
+    r = client.post(f"/api/projects/{slug}/illustrations", data={"images": files},
+                    content_type="multipart/form-data")
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()["labels"]
+
+
+def item(client, slug, label):
+    d = client.get(f"/api/projects/{slug}").get_json()
+    return next(i for i in d["illustrations"] if i["label"] == label)
+
+
+def ldir(slug, label):
+    return os.path.join(A.illustrations_path(slug), label)
+
+
+def test_upload_answers_before_encoding(client, monkeypatch):
+    monkeypatch.setattr(A, "encode_original", upload_gate.gated_encode)
+    slug = new_project(client)
+    labels = upload(client, slug, noise_png(seed=1), noise_png(seed=2))
+    assert labels == ["A", "B"]
+
+    # 인코더는 아직 게이트에서 기다리는 중 — 레이블은 이미 있고 처리 중으로 보인다
+    for L in labels:
+        it = item(client, slug, L)
+        assert it["pending"] is True and it["failed"] is False
+        assert not os.path.exists(os.path.join(ldir(slug, L), "original.png"))
+
+    for L in labels:
+        open(os.path.join(ldir(slug, L), upload_gate.GATE), "w").close()
+    wait_ingested(slug)
+    for L in labels:
+        assert item(client, slug, L)["pending"] is False
+        assert os.path.exists(os.path.join(ldir(slug, L), "original.png"))
+        assert not os.path.exists(os.path.join(ldir(slug, L), A.UPLOAD_OWNER))
+        chat = client.get(f"/api/projects/{slug}/illustrations/{L}/chat").get_json()["entries"]
+        assert [e["kind"] for e in chat] == ["INIT"]
+
+
+def test_failed_encode_marks_label(client):
+    slug = new_project(client)
+    good = noise_png(seed=3)
+    [label] = upload(client, slug, good[: len(good) // 2])  # 헤더는 멀쩡, 본문이 잘림
+    wait_ingested(slug)
+    it = item(client, slug, label)
+    assert it["failed"] is True and it["pending"] is False
+    assert os.path.exists(os.path.join(ldir(slug, label), A.UPLOAD_FAILED))
+    assert not os.path.exists(os.path.join(ldir(slug, label), "original.png"))
+
+    r = client.post(f"/api/projects/{slug}/illustrations", data={"images": [(io.BytesIO(b"not an image"), "x.png")]},
+                    content_type="multipart/form-data")
+    assert r.status_code == 400  # 헤더부터 못 읽으면 레이블을 만들지 않는다
+
+
+def test_recover_reclaims_orphaned_upload(client, monkeypatch):
+    slug = new_project(client)
+    monkeypatch.setattr(A, "submit_ingest", lambda slug, label: None)  # 제출 전에 프로세스가 죽은 것처럼
+    [label] = upload(client, slug, noise_png(seed=4))
+    monkeypatch.undo()
+    owner_path = os.path.join(ldir(slug, label), A.UPLOAD_OWNER)
+    open(owner_path, "w").close()  # 죽은 프로세스가 남긴 (잠기지 않은) owner 파일
+    assert A.ingest_pending(slug, label)
+
+    # 살아 있는 다른 워커가 잠그고 있으면 건드리지 않는다
+    with open(owner_path, "a") as held:
+        fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        A.recover_pending_uploads()
+        assert A.ingest_pending(slug, label) and (slug, label) not in A._ingesting
+
+    assert A.recover_pending_uploads() >= 1
+    wait_ingested(slug)
+    assert os.path.exists(os.path.join(ldir(slug, label), "original.png"))
+    assert item(client, slug, label)["pending"] is False
@@ -0,0 +1,93 @@
+"""
+버전 번호 할당 — 동시 편집(스레드/프로세스)에도 번호가 겹치거나 빠지지 않고, 최신본 기준 편집은 차례로 이어진다.
+이름 단위 잠금(file_lock)은 아무도 쓰지 않으면 버린다.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bench.stub_model import StubClient
+from tests.conftest import ROOT, storybook as A
+
+
+@pytest.fixture(autouse=True)
+def _no_model_rate_limit(monkeypatch):
+    monkeypatch.setattr(A.model_guard, "limiter", A.TokenBucket(0, 1))  # 스텁 상대로는 속도 제한 없이
+
+
+def edit(slug, base_version, prompt="p"):
+    return A.run_edit(slug, "A", prompt, base_version, client=StubClient(latency=0.01), use_cache=False)["version"]
+
+
+def chat(client, slug):
+    return client.get(f"/api/projects/{slug}/illustrations/A/chat?limit=500").get_json()["entries"]
+
+
+def test_concurrent_pinned_edits_get_distinct_versions(client, make_project):
+    slug = make_project()
+    with ThreadPoolExecutor(12) as pool:
+        made = list(pool.map(lambda i: edit(slug, "__ORIGINAL__", f"p{i}"), range(12)))
+    assert sorted(made, key=lambda v: int(v[2:-4])) == [f"A-{n}.png" for n in range(1, 13)]
+    d = client.get(f"/api/projects/{slug}").get_json()["illustrations"][0]
+    assert d["version_count"] == 12
+    assert sorted(e["version"] for e in chat(client, slug) if e["kind"] == "MODEL") == sorted(made)
+
+
+def test_latest_base_edits_chain(client, make_project):
+    slug = make_project()
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(lambda i: edit(slug, ""), range(6)))
+    # 최신본 기준 편집은 하나씩 — 각 요청의 베이스는 바로 앞에서 만든 버전
+    bases = [e["base"].rsplit("/", 1)[-1] for e in chat(client, slug) if e["kind"] == "USER"]
+    assert bases == ["original.png"] + [f"A-{n}.png" for n in range(1, 6)]
+
+
+ALLOC = """
+import sys
+sys.path.insert(0, {root!r})
+import app
+print(" ".join(str(app.index_allocate_version({slug!r}, "A")) for _ in range(25)))
+"""
+
+
+def test_allocation_is_atomic_across_processes(make_project):
+    slug = make_project()
+    procs = [subprocess.Popen([sys.executable, "-c", ALLOC.format(root=ROOT, slug=slug)],
+                              stdout=subprocess.PIPE, text=True, env={**os.environ, "DATA_DIR": A.DATA_DIR})
+             for _ in range(3)]
+    got = []
+    for p in procs:
+        out, _ = p.communicate(timeout=60)
+        assert p.returncode == 0
+        got += [int(n) for n in out.split()]
+    assert sorted(got) == list(range(1, 76))
+
+
+def test_file_lock_excludes_and_forgets_idle_names():
+    name = f"test-{time.monotonic_ns()}"
+    inside, overlap = [], []
+
+    def worker():
+        with A.file_lock(name):
+            inside.append(1)
+            overlap.append(len(inside))
+            time.sleep(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert overlap == [1] * 8
+    assert name not in A._path_locks
+
+    with A.file_lock(name):  # 중첩된 다른 이름은 따로
+        with A.file_lock(name + "-inner"):
+            assert {name, name + "-inner"} <= set(A._path_locks)
+    assert name not in A._path_locks and name + "-inner" not in A._path_locks
@@ -0,0 +1,71 @@
+"""
+ZIP 스트리밍 — zipfile로 열리는지, 이름(UTF-8/ASCII 대체), Content-Length, ZIP64 경계.
+"""
+import io
+import os
+import uuid
+import zipfile
+
+from bench.stub_model import StubClient
+from tests.conftest import noise_png, storybook as A, wait_ingested
+
+
+def korean_project(client, labels=2):
+    name = f"동화책-{uuid.uuid4().hex[:6]}"
+    slug = client.post("/api/projects", json={"name": name}).get_json()["slug"]
+    files = [(io.BytesIO(noise_png(seed=i)), f"{i}.png") for i in range(labels)]
+    assert client.post(f"/api/projects/{slug}/illustrations", data={"images": files},
+                       content_type="multipart/form-data").status_code == 200
+    wait_ingested(slug)
+    return slug, name
+
+
+def open_zip(r):
+    assert r.status_code == 200
+    assert int(r.headers["Content-Length"]) == len(r.data)
+    zf = zipfile.ZipFile(io.BytesIO(r.data))
+    assert zf.testzip() is None  # CRC가 맞다
+    return zf
+
+
+def test_download_selected_opens_with_zipfile(client):
+    slug, name = korean_project(client)
+    A.run_edit(slug, "A", "p", client=StubClient(latency=0), use_cache=False)
+    client.post(f"/api/projects/{slug}/select", json={"label": "A", "version": "A-1.png"})
+    illus = A.illustrations_path(slug)
+
+    zf = open_zip(client.get(f"/api/projects/{slug}/download_selected"))
+    assert zf.namelist() == ["A-1.png", "B.png"]
+    assert zf.read("B.png") == open(os.path.join(illus, "B", "original.png"), "rb").read()
+
+    r = client.get(f"/api/projects/{slug}/download_selected_numbered")
+    assert open_zip(r).namelist() == ["1.png", "2.png"]
+    cd = r.headers["Content-Disposition"]
+    assert f'filename="{name[len("동화책"):]}.zip"' in cd  # ASCII로 남는 부분만
+    assert "filename*=UTF-8''" + A.quote(f"{name}.zip") in cd
+    assert 'filename="download.zip"' in A.content_disposition("동화책.zip")  # 남는 게 없으면 대체 이름
+
+
+def test_utf8_names_and_zip64_records(monkeypatch, tmp_path):
+    a, b = tmp_path / "a.png", tmp_path / "b.png"
+    a.write_bytes(noise_png(seed=1))
+    b.write_bytes(noise_png(seed=2))
+    entries = [(str(a), "그림/첫째.png"), (str(b), "b.png"), (str(tmp_path / "gone.png"), "gone.png")]
+
+    def check():
+        stream = A.StoredZipStream(entries)
+        data = b"".join(stream)
+        assert len(data) == stream.size
+        zf = zipfile.ZipFile(io.BytesIO(data))
+        assert zf.testzip() is None
+        assert zf.namelist() == ["그림/첫째.png", "b.png"]  # 없는 파일은 건너뛴다
+        first, second = zf.infolist()
+        assert first.flag_bits & 0x800 and not second.flag_bits & 0x800
+        assert zf.read("그림/첫째.png") == a.read_bytes() and zf.read("b.png") == b.read_bytes()
+        return data
+
+    assert b"PK\x06\x06" not in check()
+    # 경계를 낮춰 4GB/65535개를 넘긴 아카이브처럼 ZIP64 레코드를 쓰게 한다
+    monkeypatch.setattr(A, "ZIP64_LIMIT", 64)
+    monkeypatch.setattr(A, "ZIP_MAX_ENTRIES", 1)
+    assert b"PK\x06\x06" in check()
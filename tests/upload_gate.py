@@ -0,0 +1,18 @@
+"""
+업로드 풀(spawn) 자식에서 실행되는 인코더 — 자식이 이 모듈만 import하도록 app/conftest를 불러오지 않는다.
+삽화 폴더에 GATE 파일이 생길 때까지 기다렸다가 진짜 인코더를 부른다.
+"""
+import os
+import time
+
+from upload_worker import encode_original
+
+GATE = ".go"
+
+
+def gated_encode(src, tmp, compress_level, max_pixels):
+    gate = os.path.join(os.path.dirname(src), GATE)
+    deadline = time.monotonic() + 20
+    while not os.path.exists(gate) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    encode_original(src, tmp, compress_level, max_pixels)
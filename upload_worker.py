@@ -0,0 +1,15 @@
+"""
+업로드 원본 변환 — app.py의 업로드 프로세스 풀(spawn)에서 실행된다.
+
+app을 import하지 않는다. 자식 프로세스는 PIL로 디코드/인코드만 하고,
+결과를 블롭 저장소에 넣어 original.png로 링크하는 일과 인덱스 갱신은 부모 프로세스가 한다.
+"""
+from PIL import Image
+
+
+def encode_original(src: str, tmp: str, compress_level: int, max_pixels: int):
+    """업로드 원본 → RGBA PNG. 부모가 만들어 준 임시 파일(tmp)에 쓴다."""
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(src) as im:
+        img = im.convert("RGBA")
+    img.save(tmp, format="PNG", compress_level=compress_level)